@@ -0,0 +1,152 @@
+"""Benchmark for modules/aggregator/dedup.py.
+
+Generates synthetic businesses with known identities, adds noisy duplicate
+listings (renamed, reformatted phones, www/https variants, missing fields)
+and chain locations that must NOT be merged, then reports pairwise precision,
+recall and clustering runtime.
+
+    python benchmarks/bench_dedup.py --entities 200000 --dup-rate 0.3
+"""
+import argparse
+import random
+import sys
+import os
+import time
+from collections import Counter
+
+# Add project root to path
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '../')))
+
+from modules.aggregator.dedup import DedupRecord, find_clusters
+
+WORDS = ["golden", "river", "oak", "summit", "blue", "harbor", "maple", "urban", "lucky", "bright",
+         "north", "silver", "pine", "coastal", "royal", "green", "stone", "cedar", "sunset", "prime",
+         "metro", "liberty", "eagle", "valley", "crystal", "iron", "red", "alpine", "star", "willow"]
+KINDS = ["pizza", "dental", "plumbing", "bakery", "auto repair", "law firm", "fitness", "cafe",
+         "salon", "hardware", "pharmacy", "florist", "roofing", "accounting", "yoga studio"]
+SUFFIXES = ["", "", "", " Inc", " LLC", " Co"]
+SHARED_HOSTS = ["wixsite.com", "business.site", "square.site"]
+
+
+def make_entity(rng, index):
+    words = rng.sample(WORDS, rng.choice([1, 2])) + [rng.choice(KINDS), str(index)]
+    name = " ".join(w.title() for w in words) + rng.choice(SUFFIXES)
+    slug = "".join(w for w in words if w.isalpha())[:20] + str(index)
+    if rng.random() < 0.1:
+        website = f"https://{slug}.{rng.choice(SHARED_HOSTS)}/"
+    elif rng.random() < 0.8:
+        website = f"https://www.{slug}.com/"
+    else:
+        website = None
+    return {
+        "name": name,
+        "phone": f"+1 {rng.randint(200, 999)}-{rng.randint(200, 999)}-{rng.randint(0, 9999):04d}",
+        "website": website,
+        "place": f"0x{rng.getrandbits(48):x}:0x{rng.getrandbits(48):x}",
+    }
+
+
+def vary_name(rng, name):
+    variant = name
+    for old, new in ((" Inc", ""), (" LLC", ", LLC"), ("And", "&")):
+        if old in variant and rng.random() < 0.5:
+            variant = variant.replace(old, new)
+    if rng.random() < 0.3:
+        variant = variant.upper()
+    if rng.random() < 0.3:
+        variant = "The " + variant
+    return variant
+
+
+def vary_phone(rng, phone):
+    digits = "".join(c for c in phone if c.isdigit())[-10:]
+    return rng.choice([
+        phone,
+        f"({digits[:3]}) {digits[3:6]}-{digits[6:]}",
+        f"{digits[:3]}.{digits[3:6]}.{digits[6:]}",
+        None,
+    ])
+
+
+def vary_website(rng, website):
+    if not website or rng.random() < 0.15:
+        return None
+    return rng.choice([website, website.replace("https://www.", "http://"), website.rstrip("/") + "/contact"])
+
+
+def maps_url(place, name):
+    return f"https://www.google.com/maps/place/{name.replace(' ', '+')}/data=!4m2!3m1!1s{place}"
+
+
+def generate(entities, dup_rate, chain_rate, seed):
+    """Returns (records, truth) where truth maps record id -> entity id."""
+    rng = random.Random(seed)
+    records, truth = [], {}
+
+    def add(entity_id, name, phone, website, source_url):
+        record_id = len(records) + 1
+        records.append(DedupRecord(record_id, name, phone, website, source_url, rng.random() < 0.4))
+        truth[record_id] = entity_id
+
+    for entity_id in range(entities):
+        entity = make_entity(rng, entity_id)
+        add(entity_id, entity["name"], entity["phone"], entity["website"], maps_url(entity["place"], entity["name"]))
+
+        if rng.random() < dup_rate:
+            for _ in range(rng.choice([1, 1, 2])):
+                # Same place listed twice keeps the place id half the time.
+                place = entity["place"] if rng.random() < 0.5 else f"0x{rng.getrandbits(48):x}:0x{rng.getrandbits(48):x}"
+                name = vary_name(rng, entity["name"])
+                add(entity_id, name, vary_phone(rng, entity["phone"]), vary_website(rng, entity["website"]), maps_url(place, name))
+
+        if rng.random() < chain_rate:
+            # Another location of the same chain: same name and website, different phone and place.
+            other = make_entity(rng, entity_id)
+            add(f"{entity_id}-branch", entity["name"], other["phone"], entity["website"], maps_url(other["place"], entity["name"]))
+
+    # Shuffle so duplicates aren't adjacent ids, then renumber.
+    rng.shuffle(records)
+    truth = {i + 1: truth[r.id] for i, r in enumerate(records)}
+    records = [r._replace(id=i + 1) for i, r in enumerate(records)]
+    return records, truth
+
+
+def pairs(n):
+    return n * (n - 1) // 2
+
+
+def score(records, truth, clusters):
+    true_pairs = sum(pairs(c) for c in Counter(truth.values()).values())
+    predicted_pairs = sum(pairs(len(ids)) for ids in clusters)
+    true_positive = sum(
+        pairs(c) for ids in clusters for c in Counter(truth[i] for i in ids).values()
+    )
+    precision = true_positive / predicted_pairs if predicted_pairs else 1.0
+    recall = true_positive / true_pairs if true_pairs else 1.0
+    return precision, recall
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--entities", type=int, default=100000)
+    parser.add_argument("--dup-rate", type=float, default=0.3)
+    parser.add_argument("--chain-rate", type=float, default=0.05)
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args()
+
+    records, truth = generate(args.entities, args.dup_rate, args.chain_rate, args.seed)
+
+    start = time.perf_counter()
+    clusters = find_clusters(records)
+    elapsed = time.perf_counter() - start
+
+    precision, recall = score(records, truth, clusters)
+    print(f"records:    {len(records)}")
+    print(f"clusters:   {len(clusters)}")
+    print(f"precision:  {precision:.4f}")
+    print(f"recall:     {recall:.4f}")
+    print(f"runtime:    {elapsed:.2f}s ({len(records) / elapsed:,.0f} records/s)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,148 @@
+"""Micro-benchmark for modules/enrichment/contact_extractor.py.
+
+Runs the single-pass extractor and the previous approach (re.findall over the
+HTML plus a substring loop over every href) over a corpus of saved HTML
+files. Reports throughput and what each found. Pass --generate N to write a
+synthetic corpus first: landing pages with mailto links, obfuscated
+addresses, retina asset names, tracking ids, share buttons and large script
+bundles.
+
+    python benchmarks/bench_extractor.py --corpus /tmp/html_corpus --generate 500
+    python benchmarks/bench_extractor.py --corpus saved_pages/ --repeat 3
+"""
+import argparse
+import asyncio
+import random
+import re
+import sys
+import os
+import tempfile
+import time
+
+# Add project root to path
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '../')))
+
+from modules.enrichment.contact_extractor import extract_candidates, extract_candidates_async
+from modules.enrichment.http_fetcher import extract_links
+
+LEGACY_EMAIL_REGEX = r'[a-zA-Z0-9._%+-]+@[a-zA-Z0-9.-]+\.[a-zA-Z]{2,}'
+
+WORDS = ["bakery", "dental", "plumbing", "salon", "studio", "garage", "florist", "cafe", "law", "fitness"]
+FILLER = "<p>" + "Fresh bread and friendly service every day of the week. " * 8 + "</p>\n"
+
+
+def legacy_extract(html, base_url="https://site.test/"):
+    """What enrichment did before: regex over the full HTML, then a substring check per href."""
+    emails = [e for e in re.findall(LEGACY_EMAIL_REGEX, html)
+              if not e.endswith('.png') and not e.endswith('.jpg') and 'example.com' not in e]
+    found = {"email": emails[0] if emails else None, "facebook": None, "instagram": None, "linkedin": None}
+    for link in extract_links(html, base_url):
+        for network in ("facebook", "instagram", "linkedin"):
+            if not found[network] and f"{network}.com" in link:
+                found[network] = link
+    return found
+
+
+def make_page(rng, index):
+    name = f"{rng.choice(WORDS)}{index}"
+    parts = ["<html><head>"]
+    for _ in range(rng.randint(1, 6)):
+        parts.append(f'<link rel="icon" href="/img/logo-{rng.randint(1, 99)}@2x.png">')
+    # Minified bundles dominate the size of real pages.
+    bundle = "".join(f"var a{i}=function(e){{return e*{i}}};" for i in range(rng.randint(200, 4000)))
+    parts.append(f"<script>{bundle}</script>")
+    parts.append(f'<script>Sentry.init({{dsn:"https://{rng.getrandbits(128):032x}@o{rng.randint(1000, 99999)}.ingest.sentry.io/1"}})</script>')
+    parts.append("</head><body>")
+    parts.extend(FILLER for _ in range(rng.randint(5, 60)))
+    parts.append('<a href="https://www.facebook.com/sharer/sharer.php?u=https://site.test">Share</a>')
+
+    style = rng.random()
+    if style < 0.35:
+        parts.append(f'<a href="mailto:info@{name}.com?subject=Hello">Email us</a>')
+    elif style < 0.5:
+        parts.append(f"<p>Write to hello [at] {name} [dot] com</p>")
+    elif style < 0.6:
+        parts.append(f"<p>contact&#64;{name}.com</p>")
+    elif style < 0.8:
+        parts.append(f"<p>Email: office@{name}.co.uk</p>")
+    parts.append("<p>Your email: you@example.com</p>")
+
+    if rng.random() < 0.6:
+        parts.append(f'<a href="https://www.facebook.com/{name}/">Facebook</a>')
+    if rng.random() < 0.5:
+        parts.append(f'<a href="//instagram.com/{name}">Instagram</a>')
+    if rng.random() < 0.3:
+        parts.append(f'<a href="https://www.linkedin.com/company/{name}">LinkedIn</a>')
+    parts.append("</body></html>")
+    return "\n".join(parts)
+
+
+def generate_corpus(directory, count, seed):
+    rng = random.Random(seed)
+    os.makedirs(directory, exist_ok=True)
+    for i in range(count):
+        with open(os.path.join(directory, f"page_{i:05d}.html"), "w", encoding="utf-8") as f:
+            f.write(make_page(rng, i))
+
+
+def load_corpus(directory):
+    pages = []
+    for root, _, files in os.walk(directory):
+        for name in sorted(files):
+            if name.endswith((".html", ".htm")):
+                with open(os.path.join(root, name), "r", encoding="utf-8", errors="replace") as f:
+                    pages.append(f.read())
+    return pages
+
+
+def run(label, fn, pages, repeat):
+    best = None
+    for _ in range(repeat):
+        started = time.perf_counter()
+        results = [fn(html) for html in pages]
+        elapsed = time.perf_counter() - started
+        best = elapsed if best is None else min(best, elapsed)
+    megabytes = sum(len(html) for html in pages) / 1e6
+    print(f"{label:<12} {best:8.3f}s  {len(pages) / best:9.1f} pages/s  {megabytes / best:7.1f} MB/s")
+    return results
+
+
+async def run_offloaded(pages):
+    started = time.perf_counter()
+    await asyncio.gather(*[extract_candidates_async(html, offload_chars=0) for html in pages])
+    elapsed = time.perf_counter() - started
+    print(f"{'pool':<12} {elapsed:8.3f}s  {len(pages) / elapsed:9.1f} pages/s  (process pool, event loop free)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--corpus", help="Directory of saved .html files (default: a temporary synthetic corpus).")
+    parser.add_argument("--generate", type=int, default=0, help="Write this many synthetic pages into --corpus first.")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--pool", action="store_true", help="Also time the process-pool path.")
+    args = parser.parse_args()
+
+    corpus = args.corpus or tempfile.mkdtemp(prefix="html_corpus_")
+    if args.generate or not args.corpus:
+        generate_corpus(corpus, args.generate or 300, args.seed)
+    pages = load_corpus(corpus)
+    if not pages:
+        parser.error(f"No .html files under {corpus}.")
+    print(f"{len(pages)} pages, {sum(len(p) for p in pages) / 1e6:.1f} MB from {corpus}")
+
+    legacy = run("legacy", legacy_extract, pages, args.repeat)
+    single = run("single-pass", extract_candidates, pages, args.repeat)
+    if args.pool:
+        asyncio.run(run_offloaded(pages))
+
+    for field, index in (("email", 0), ("facebook", 1), ("instagram", 2), ("linkedin", 3)):
+        old_hits = sum(1 for r in legacy if r[field])
+        new_hits = sum(1 for r in single if r[index])
+        print(f"{field:<10} legacy {old_hits:5d}   single-pass {new_hits:5d}")
+    bogus = sum(1 for r in legacy if r["email"] and ("sentry" in r["email"] or r["email"].endswith((".png", ".svg"))))
+    print(f"legacy emails that are assets or tracking ids: {bogus}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,310 @@
+"""End-to-end benchmark: harvester, enrichment and aggregator against the local fixture web.
+
+Starts benchmarks/fixture_server.py in a child process, points the harvester
+at its fake Maps page and enrichment at its synthetic sites, and runs the
+chosen stages in a scratch directory, so nothing touches the network or the
+real databases. For each stage it reports items, wall time, throughput,
+latency percentiles from common.metrics and peak RSS (this process, and with
+its children such as Chromium). Enrichment is also scored against the emails
+the fixture planted.
+
+Without Chromium, drop the harvest stage: the raw leads the fake Maps would
+have returned are written directly, and --no-browser keeps enrichment on the
+HTTP tier.
+
+    python benchmarks/bench_pipeline.py --queries 20 --sites 5000
+    python benchmarks/bench_pipeline.py --stages enrich,aggregate --queries 100 --no-browser --output bench.json
+"""
+import argparse
+import asyncio
+import json
+import multiprocessing
+import socket
+import sqlite3
+import sys
+import os
+import tempfile
+import threading
+import time
+from functools import partial
+from urllib.parse import urlparse
+
+import psutil
+from aiohttp.abc import AbstractResolver
+
+# Add project root to path
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '../')))
+
+from benchmarks.fixture_server import (
+    MAPS_HOST, RESULTS_PER_QUERY, SEED, SITES, expected_email, search_results, serve, site_index, site_spec, site_url,
+)
+from common.host_scheduler import load_scheduler
+from common.logging_config import configure_logging
+from common.metrics import METRICS
+from common.page_cache import PageCache
+from modules.aggregator import aggregator
+from modules.enrichment import enrichment
+from modules.enrichment.domain_screen import REASON_NXDOMAIN, DomainScreen
+from modules.enrichment.http_fetcher import create_http_session
+from modules.harvester import batch, harvester
+
+STAGES = ("harvest", "enrich", "aggregate")
+# Sample interval for the RSS high-water mark.
+RSS_INTERVAL_S = 0.1
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def wait_for_port(port, timeout=15.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            socket.create_connection(("127.0.0.1", port), timeout=0.5).close()
+            return
+        except OSError:
+            time.sleep(0.05)
+    raise RuntimeError(f"Fixture server did not come up on port {port}.")
+
+
+def is_fixture_host(host):
+    return site_index(host) is not None or host == MAPS_HOST
+
+
+async def fixture_resolve(host, timeout=None):
+    """DomainScreen resolver: fixture hosts live on loopback, gone<N> hosts don't exist."""
+    if not is_fixture_host(host) or host.startswith("gone"):
+        return [], REASON_NXDOMAIN
+    return ["127.0.0.1"], None
+
+
+class FixtureResolver(AbstractResolver):
+    """aiohttp resolver with the same answers as fixture_resolve()."""
+
+    async def resolve(self, host, port=0, family=socket.AF_INET):
+        addresses, reason = await fixture_resolve(host)
+        if reason:
+            raise OSError(f"{host}: {reason}")
+        return [{"hostname": host, "host": address, "port": port, "family": socket.AF_INET, "proto": 0, "flags": 0}
+                for address in addresses]
+
+    async def close(self):
+        pass
+
+
+class PeakRSS:
+    """Samples resident memory in a thread: peak of this process, and of it plus its children."""
+
+    def __init__(self, exclude=()):
+        self.exclude = set(exclude)
+        self.own = 0
+        self.total = 0
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def _sample(self):
+        process = psutil.Process()
+        own = process.memory_info().rss
+        total = own
+        for child in process.children(recursive=True):
+            if child.pid in self.exclude:
+                continue
+            try:
+                total += child.memory_info().rss
+            except psutil.Error:
+                pass
+        self.own = max(self.own, own)
+        self.total = max(self.total, total)
+
+    def _run(self):
+        while not self._stop.is_set():
+            self._sample()
+            self._stop.wait(RSS_INTERVAL_S)
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        self._thread.join()
+        self._sample()
+
+
+def run_stage(name, fn, server_pid):
+    """Runs one stage with fresh metrics; returns (result, report dict)."""
+    METRICS.reset()
+    with PeakRSS(exclude=[server_pid]) as rss:
+        started = time.perf_counter()
+        result = fn()
+        elapsed = time.perf_counter() - started
+    report = {
+        "stage": name,
+        "wall_s": round(elapsed, 3),
+        "peak_rss_mb": round(rss.own / 2 ** 20, 1),
+        "peak_rss_with_children_mb": round(rss.total / 2 ** 20, 1),
+        "metrics": METRICS.snapshot(),
+    }
+    return result, report
+
+
+def count_rows(db_path, table):
+    if not os.path.exists(db_path):
+        return 0
+    with sqlite3.connect(db_path) as conn:
+        return conn.execute(f"SELECT COUNT(*) FROM {table}").fetchone()[0]
+
+
+def seed_raw_leads(queries, port, closed_port, sites, per_query, max_leads, seed):
+    """What the harvest stage would have saved, written straight to raw_leads.db."""
+    leads = []
+    for query in queries:
+        for index in search_results(query, sites, per_query)[:max_leads]:
+            spec = site_spec(index, seed)
+            leads.append({
+                "name": spec["name"], "phone": spec["phone"], "website": site_url(spec, port, closed_port),
+                "address": spec["address"], "category": spec["category"],
+                "google_maps_url": f"http://{MAPS_HOST}:{port}/maps/place/{spec['name'].replace(' ', '+')}"
+                                   f"/data=!4m2!3m1!1s0x{index:x}:0x{seed:x}",
+            })
+    with harvester.open_lead_writer() as writer:
+        for lead in leads:
+            writer.write(harvester.lead_params(lead), None, None)
+
+
+def score_emails(seed, browser):
+    """(found, expected, wrong): planted emails recovered, planted emails reachable, and emails that don't match."""
+    with sqlite3.connect(enrichment.ENRICHED_DB_PATH) as conn:
+        conn.execute("ATTACH DATABASE ? AS raw", (enrichment.RAW_DB_PATH,))
+        rows = conn.execute(f'''
+            SELECT r.website, e.email FROM raw.{enrichment.RAW_SCHEMA} r
+            LEFT JOIN {enrichment.ENRICHED_SCHEMA} e ON e.lead_id = r.id
+            WHERE r.website IS NOT NULL
+        ''').fetchall()
+    found = expected = wrong = 0
+    for website, email in rows:
+        index = site_index(urlparse(website).hostname or "")
+        planted = expected_email(site_spec(index, seed), browser) if index is not None else None
+        expected += planted is not None
+        if email:
+            if email.lower() == (planted or "").lower():
+                found += 1
+            else:
+                wrong += 1
+    return found, expected, wrong
+
+
+def print_report(report, items, unit):
+    wall = report["wall_s"]
+    print(f"\n== {report['stage']}: {items} {unit} in {wall:.1f}s ({items / wall if wall else 0:.1f} {unit}/s), "
+          f"peak RSS {report['peak_rss_mb']:.0f} MB ({report['peak_rss_with_children_mb']:.0f} MB with children)")
+    for name, series in sorted(report["metrics"]["histograms"].items()):
+        for entry in series:
+            labels = ",".join(f"{k}={v}" for k, v in sorted(entry["labels"].items()))
+            series_name = f"{name}{{{labels}}}" if labels else name
+            print(f"   {series_name:<52} n={entry['count']:<6} "
+                  f"p50={entry['p50']:.3f} p95={entry['p95']:.3f} p99={entry['p99']:.3f} max={entry['max']:.3f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--stages", default=",".join(STAGES), help="Comma-separated subset of harvest,enrich,aggregate.")
+    parser.add_argument("--sites", type=int, default=SITES, help="Synthetic sites served by the fixture.")
+    parser.add_argument("--queries", type=int, default=10)
+    parser.add_argument("--results-per-query", type=int, default=RESULTS_PER_QUERY)
+    parser.add_argument("--max-leads", type=int, default=None, help="Leads per query (default: all results).")
+    parser.add_argument("--contexts", type=int, default=batch.CONTEXTS, help="Concurrent harvest contexts.")
+    parser.add_argument("--browsers", type=int, default=1)
+    parser.add_argument("--maps-rate", type=float, default=50.0,
+                        help="Requests/s allowed to the fake Maps host (production paces Google far lower).")
+    parser.add_argument("--concurrency", type=int, default=enrichment.CONCURRENCY, help="Enrichment workers.")
+    parser.add_argument("--no-browser", action="store_true", help="Enrich with the HTTP tier only.")
+    parser.add_argument("--no-screen", action="store_true", help="Skip the dead-domain pre-screen.")
+    parser.add_argument("--cache", action="store_true", help="Enrich through a page cache in the scratch directory.")
+    parser.add_argument("--delay-scale", type=float, default=1.0, help="Multiplies the sites' response delays.")
+    parser.add_argument("--seed", type=int, default=SEED)
+    parser.add_argument("--workdir", help="Scratch directory for the databases (default: a new temporary one).")
+    parser.add_argument("--output", help="Also write the full report, with metric snapshots, to this JSON file.")
+    parser.add_argument("--verbose", action="store_true", help="Echo the pipeline's logs to stdout.")
+    args = parser.parse_args()
+
+    stages = [stage.strip() for stage in args.stages.split(",") if stage.strip()]
+    unknown = set(stages) - set(STAGES)
+    if unknown:
+        parser.error(f"Unknown stages: {', '.join(sorted(unknown))}")
+    max_leads = args.max_leads or args.results_per_query
+    queries = [f"bench query {i}" for i in range(args.queries)]
+    output = os.path.abspath(args.output) if args.output else None
+
+    configure_logging(console=args.verbose)
+    port, closed_port = free_port(), free_port()
+    server = multiprocessing.get_context('spawn').Process(
+        target=serve, args=(port, closed_port),
+        kwargs={"sites": args.sites, "per_query": args.results_per_query, "seed": args.seed,
+                "delay_scale": args.delay_scale},
+        daemon=True,
+    )
+    server.start()
+    workdir = args.workdir or tempfile.mkdtemp(prefix="bench_pipeline_")
+    os.makedirs(workdir, exist_ok=True)
+    os.chdir(workdir)
+    print(f"Fixture: {args.sites} sites on port {port}; scratch directory {workdir}")
+
+    # Aim the stages at the fixture: Maps URL and pacing, and name resolution for *.localhost.
+    harvester.MAPS_URL = f"http://{MAPS_HOST}:{port}/maps"
+    harvester.SCHEDULER = load_scheduler('harvester')
+    harvester.SCHEDULER.rate = args.maps_rate
+    harvester.SCHEDULER.burst = max(1, int(args.maps_rate))
+    enrichment.create_http_session = partial(create_http_session, resolver=FixtureResolver())
+    enrichment.DomainScreen = partial(DomainScreen, resolver=fixture_resolve)
+
+    reports = []
+    try:
+        wait_for_port(port)
+
+        if "harvest" in stages:
+            results, report = run_stage("harvest", lambda: asyncio.run(
+                batch.run_batch(queries, args.contexts, max_leads, args.browsers)), server.pid)
+            leads = sum(stats[2] for stats in results)
+            report["items"] = leads
+            print_report(report, leads, "leads")
+            reports.append(report)
+        elif "enrich" in stages or "aggregate" in stages:
+            seed_raw_leads(queries, port, closed_port, args.sites, args.results_per_query, max_leads, args.seed)
+
+        if "enrich" in stages:
+            cache = PageCache(os.path.join(workdir, "page_cache.db")) if args.cache else None
+            _, report = run_stage("enrich", lambda: asyncio.run(enrichment.process_leads(
+                concurrency=args.concurrency, incremental=False, cache=cache,
+                screen_domains=not args.no_screen, use_browser=not args.no_browser)), server.pid)
+            if cache is not None:
+                cache.close()
+            sites = count_rows(enrichment.ENRICHED_DB_PATH, enrichment.ENRICHED_SCHEMA)
+            found, expected, wrong = score_emails(args.seed, not args.no_browser)
+            report.update(items=sites, emails_found=found, emails_expected=expected, emails_wrong=wrong)
+            print_report(report, sites, "sites")
+            print(f"   emails: {found}/{expected} planted emails found ({found / expected if expected else 0:.0%}), "
+                  f"{wrong} wrong")
+            reports.append(report)
+
+        if "aggregate" in stages:
+            _, report = run_stage("aggregate", aggregator.aggregate_data, server.pid)
+            report["items"] = count_rows(enrichment.RAW_DB_PATH, enrichment.RAW_SCHEMA)
+            report["master_rows"] = count_rows(aggregator.MASTER_DB_PATH, aggregator.MASTER_SCHEMA)
+            print_report(report, report["items"], "leads")
+            reports.append(report)
+    finally:
+        server.terminate()
+        server.join()
+
+    if output:
+        with open(output, "w") as f:
+            json.dump({"args": vars(args), "stages": reports}, f, indent=2)
+        print(f"\nReport written to {output}")
+
+
+if __name__ == "__main__":
+    main()
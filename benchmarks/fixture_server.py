@@ -0,0 +1,335 @@
+"""Local fixture web for the offline benchmarks.
+
+One aiohttp server answers for thousands of synthetic business sites and for
+an imitation of Google Maps, telling them apart by the Host header:
+
+    http://s<N>.localhost:<port>/     site N (landing, /about, /services, /contact ...)
+    http://maps.localhost:<port>/maps the Maps search page, feed and details panel
+
+Every site is derived from (seed, N) by site_spec(), so the benchmark knows
+what each one should yield without asking the server. Sites vary in size and
+response time; some are slow past the HTTP tier's timeout, some are dead
+(unresolvable gone<N> hosts, refused ports, 404/500 landing pages), some
+only render with JavaScript, and most hide their email on a contact page.
+Chromium resolves *.localhost to loopback by itself; other clients need a
+resolver that does (see FixtureResolver in bench_pipeline.py).
+
+    python benchmarks/fixture_server.py --sites 5000 --port 8765
+"""
+import argparse
+import asyncio
+import hashlib
+import json
+import random
+import re
+import zlib
+from functools import lru_cache
+
+from aiohttp import web
+
+FIXTURE_DOMAIN = 'localhost'
+MAPS_HOST = f'maps.{FIXTURE_DOMAIN}'
+SITE_HOST_REGEX = re.compile(r'^(?:s|gone)(\d+)\.')
+
+SITES = 5000
+RESULTS_PER_QUERY = 60
+SEED = 7
+
+# Feed page size and the simulated latency of Maps' own requests.
+FEED_PAGE_SIZE = 20
+SCROLL_DELAY_MS = 300
+DETAILS_DELAY_MS = 150
+
+# Share of sites per fate; the rest are ordinary sites.
+FRACTIONS = {
+    'nxdomain': 0.05,
+    'refused': 0.03,
+    'not_found': 0.03,
+    'server_error': 0.02,
+    'timeout': 0.01,
+    'spa': 0.08,
+}
+SLOW_FRACTION = 0.10
+LARGE_FRACTION = 0.04
+NO_EMAIL_FRACTION = 0.25
+
+# Response delays in seconds: ordinary, slow, and past the HTTP tier's 10s timeout.
+FAST_DELAY = (0.02, 0.2)
+SLOW_DELAY = (1.0, 4.0)
+TIMEOUT_DELAY = 12.0
+
+WORDS = ["golden", "river", "oak", "summit", "blue", "harbor", "maple", "urban", "lucky", "bright",
+         "north", "silver", "pine", "coastal", "royal", "green", "stone", "cedar", "sunset", "prime"]
+KINDS = ["pizza", "dental", "plumbing", "bakery", "auto repair", "law firm", "fitness", "cafe",
+         "salon", "hardware", "pharmacy", "florist", "roofing", "accounting", "yoga studio"]
+FILLER = ("<p>Family owned and serving the neighbourhood since 1998. Call us for a free quote, "
+          "or drop by the shop any day of the week. Friendly service, fair prices.</p>\n")
+CONTACT_PATHS = ["/contact", "/contact-us", "/about"]
+
+
+def site_host(index, fate=None):
+    return f"{'gone' if fate == 'nxdomain' else 's'}{index}.{FIXTURE_DOMAIN}"
+
+
+def site_spec(index, seed=SEED):
+    """Everything about site `index`: fate, response delay, size, and where (if anywhere) its email is."""
+    rng = random.Random(seed * 1_000_003 + index)
+    roll, fate = rng.random(), 'ok'
+    for name, share in FRACTIONS.items():
+        if roll < share:
+            fate = name
+            break
+        roll -= share
+    words = [rng.choice(WORDS), rng.choice(KINDS)]
+    slug = "".join(w for w in "".join(words) if w.isalpha())
+    if fate == 'timeout':
+        delay = TIMEOUT_DELAY
+    elif rng.random() < SLOW_FRACTION:
+        delay = rng.uniform(*SLOW_DELAY)
+    else:
+        delay = rng.uniform(*FAST_DELAY)
+    has_email = rng.random() >= NO_EMAIL_FRACTION
+    return {
+        "index": index,
+        "fate": fate,
+        "name": f"{' '.join(w.title() for w in words)} {index}",
+        "category": words[1].title(),
+        "host": site_host(index, fate),
+        "phone": f"(555) {200 + index // 10000 % 800:03d}-{index % 10000:04d}",
+        "address": f"{rng.randint(1, 9999)} {rng.choice(WORDS).title()} St",
+        "delay": round(delay, 3),
+        "size": rng.randint(1_000_000, 3_000_000) if rng.random() < LARGE_FRACTION else int(rng.lognormvariate(10.8, 0.8)),
+        "email": f"{rng.choice(['info', 'hello', 'office', 'contact'])}@{slug}{index}.com" if has_email else None,
+        "email_page": rng.choice(["/", "/contact", "/contact", "/contact-us", "/about"]) if has_email else None,
+        "obfuscated": rng.random() < 0.2,
+        "facebook": f"https://www.facebook.com/{slug}{index}" if rng.random() < 0.6 else None,
+        "card_phone": rng.random() < 0.8,
+        "card_website": rng.random() < 0.7,
+    }
+
+
+def site_index(host):
+    """Site number of a fixture hostname, or None."""
+    match = SITE_HOST_REGEX.match(host)
+    return int(match.group(1)) if match else None
+
+
+def site_url(spec, port, closed_port):
+    return f"http://{spec['host']}:{closed_port if spec['fate'] == 'refused' else port}/"
+
+
+def search_results(query, sites=SITES, per_query=RESULTS_PER_QUERY):
+    """Site indexes a query returns, in feed order. Queries overlap, as real ones do."""
+    start = zlib.crc32(query.strip().lower().encode()) % sites
+    return [(start + i) % sites for i in range(min(per_query, sites))]
+
+
+def expected_email(spec, browser=True):
+    """The email a perfect enrichment run would find for this site, or None."""
+    if spec["fate"] in ('nxdomain', 'refused', 'not_found', 'server_error', 'timeout'):
+        return None
+    if spec["fate"] == 'spa' and not browser:
+        return None
+    return spec["email"]
+
+
+def _email_html(spec):
+    if spec["obfuscated"]:
+        user, domain = spec["email"].split("@")
+        return f"<p>Write to {user} [at] {domain.replace('.', ' [dot] ')}</p>"
+    return f'<p>Email: <a href="mailto:{spec["email"]}?subject=Hello">{spec["email"]}</a></p>'
+
+
+@lru_cache(maxsize=1024)
+def render_page(index, path, seed):
+    """(status, html) for one path of a site."""
+    spec = site_spec(index, seed)
+    if spec["fate"] == 'not_found' and path == "/":
+        return 404, "<html><body><h1>Not Found</h1></body></html>"
+    if spec["fate"] == 'server_error':
+        return 500, "<html><body><h1>Internal Server Error</h1></body></html>"
+    if path not in ("/", "/services", *CONTACT_PATHS):
+        return 404, "<html><body><h1>Not Found</h1></body></html>"
+    if spec["fate"] == 'spa':
+        body = f'<a href="/contact">Contact</a>{_email_html(spec)}' if spec["email"] else '<p>Welcome</p>'
+        return 200, (f'<html><head><title>{spec["name"]}</title></head><body><div id="root"></div>'
+                     f'<script>document.getElementById("root").innerHTML = {json.dumps(body)};</script></body></html>')
+
+    parts = [f'<html><head><title>{spec["name"]}</title>',
+             '<link rel="icon" href="/img/logo@2x.png"></head><body>',
+             '<nav><a href="/">Home</a> <a href="/services">Services</a> <a href="/about">About us</a> '
+             f'<a href="{"/contact-us" if spec["email_page"] == "/contact-us" else "/contact"}">Contact</a></nav>',
+             f'<h1>{spec["name"]}</h1>']
+    if spec["email"] and spec["email_page"] == path:
+        parts.append(_email_html(spec))
+    if path in CONTACT_PATHS:
+        parts.append('<form><input name="email" placeholder="you@example.com"><button>Send</button></form>')
+    if spec["facebook"] and path == "/":
+        parts.append(f'<a href="{spec["facebook"]}">Facebook</a>')
+    # Landing pages carry the size; scripts and filler like real pages.
+    target = spec["size"] if path == "/" else spec["size"] // 8
+    bundle = "".join(f"var a{i}=function(e){{return e*{i}}};" for i in range(max(1, target // 40)))
+    parts.append(f"<script>{bundle}</script>")
+    parts.extend(FILLER for _ in range(max(3, target // 4 // len(FILLER))))
+    parts.append("<footer>&copy; 2024</footer></body></html>")
+    return 200, "\n".join(parts)
+
+
+MAPS_PAGE = """<!doctype html>
+<html><head><title>Google Maps</title>
+<style>
+  div[role=feed] { height: 600px; overflow-y: auto; width: 400px; float: left; }
+  div.Nv2PK { height: 110px; border-bottom: 1px solid #ddd; }
+  #details { float: left; margin-left: 20px; }
+</style></head>
+<body>
+<input id="searchboxinput" name="q" autocomplete="off">
+<div id="results"></div><div id="details"></div>
+<script>
+const PAGE = __PAGE__, SCROLL_MS = __SCROLL__, DETAILS_MS = __DETAILS__;
+let query = null, offset = 0, loading = false, done = false, places = {};
+const esc = s => String(s).replace(/[&<>"]/g, c => ({'&': '&amp;', '<': '&lt;', '>': '&gt;', '"': '&quot;'}[c]));
+
+function card(p) {
+  places[p.url] = p;
+  return `<div class="Nv2PK"><a href="${p.url}" aria-label="${esc(p.name)}">
+      <div class="fontHeadlineSmall">${esc(p.name)}</div></a>
+    <span class="MW4etd">${p.rating}</span>
+    <div class="W4Efsd"><div class="W4Efsd">${esc(p.category)} · ${esc(p.address)}</div></div>
+    ${p.card_phone ? `<span class="UsdlK">${esc(p.phone)}</span>` : ''}
+    ${p.card_website ? `<a data-value="Website" href="${p.website}">Website</a>` : ''}</div>`;
+}
+
+async function more(feed) {
+  if (loading || done) return;
+  loading = true;
+  const r = await fetch(`/maps/api/search?q=${encodeURIComponent(query)}&offset=${offset}&limit=${PAGE}`);
+  const data = await r.json();
+  await new Promise(ok => setTimeout(ok, SCROLL_MS));
+  feed.insertAdjacentHTML('beforeend', data.results.map(card).join(''));
+  offset += data.results.length;
+  if (offset >= data.total) {
+    done = true;
+    feed.insertAdjacentHTML('beforeend', '<span class="HlvSq">You\\'ve reached the end of the list.</span>');
+  }
+  loading = false;
+}
+
+function details(p) {
+  document.getElementById('details').innerHTML = `<h1 class="DUwDvf">${esc(p.name)}</h1>
+    <button data-item-id="address" aria-label="Address: ${esc(p.address)}">${esc(p.address)}</button>
+    <button data-item-id="phone:tel:${p.phone.replace(/\\D/g, '')}" aria-label="Phone: ${esc(p.phone)}">${esc(p.phone)}</button>
+    <a data-item-id="authority" href="${p.website}">${esc(p.website)}</a>`;
+}
+
+document.getElementById('searchboxinput').addEventListener('keydown', e => {
+  if (e.key !== 'Enter') return;
+  query = e.target.value; offset = 0; done = false; places = {};
+  document.getElementById('results').innerHTML = '<div role="feed"></div>';
+  const feed = document.querySelector('div[role=feed]');
+  feed.addEventListener('scroll', () => {
+    if (feed.scrollTop + feed.clientHeight >= feed.scrollHeight - 50) more(feed);
+  });
+  feed.addEventListener('click', ev => {
+    const link = ev.target.closest("a[href*='/maps/place/']");
+    if (!link) return;
+    ev.preventDefault();
+    history.pushState({}, '', link.getAttribute('href'));
+    document.getElementById('details').innerHTML = '';
+    setTimeout(() => details(places[link.getAttribute('href')]), DETAILS_MS);
+  });
+  more(feed);
+});
+</script></body></html>"""
+
+
+class FixtureWeb:
+    """The aiohttp application behind the fixture server."""
+
+    def __init__(self, port, closed_port, sites=SITES, per_query=RESULTS_PER_QUERY, seed=SEED,
+                 scroll_delay_ms=SCROLL_DELAY_MS, details_delay_ms=DETAILS_DELAY_MS, delay_scale=1.0):
+        self.port = port
+        self.closed_port = closed_port
+        self.sites = sites
+        self.per_query = per_query
+        self.seed = seed
+        self.delay_scale = delay_scale
+        self.maps_page = (MAPS_PAGE.replace("__PAGE__", str(FEED_PAGE_SIZE))
+                          .replace("__SCROLL__", str(scroll_delay_ms))
+                          .replace("__DETAILS__", str(details_delay_ms)))
+
+    def place(self, index):
+        spec = site_spec(index, self.seed)
+        name = spec["name"]
+        return {
+            "url": f"/maps/place/{name.replace(' ', '+')}/data=!4m2!3m1!1s0x{index:x}:0x{self.seed:x}",
+            "name": name,
+            "category": spec["category"],
+            "address": spec["address"],
+            "phone": spec["phone"],
+            "website": site_url(spec, self.port, self.closed_port),
+            "rating": round(3 + (index % 20) / 10, 1),
+            "card_phone": spec["card_phone"],
+            "card_website": spec["card_website"],
+        }
+
+    async def maps(self, request):
+        path = request.path
+        if path == "/maps" or path.startswith("/maps/place/"):
+            return web.Response(text=self.maps_page, content_type="text/html")
+        if path == "/maps/api/search":
+            indexes = search_results(request.query.get("q", ""), self.sites, self.per_query)
+            offset = int(request.query.get("offset", 0))
+            limit = int(request.query.get("limit", FEED_PAGE_SIZE))
+            return web.json_response({"total": len(indexes),
+                                      "results": [self.place(i) for i in indexes[offset:offset + limit]]})
+        return web.Response(status=404)
+
+    async def site(self, request, host):
+        index = site_index(host)
+        if index is None:
+            return web.Response(status=404)
+        spec = site_spec(index, self.seed)
+        # Hung sites stay hung at any scale.
+        await asyncio.sleep(spec["delay"] if spec["fate"] == 'timeout' else spec["delay"] * self.delay_scale)
+        status, html = render_page(index, request.path.rstrip("/") or "/", self.seed)
+        etag = '"' + hashlib.md5(html.encode()).hexdigest()[:16] + '"'
+        if status == 200 and request.headers.get("If-None-Match") == etag:
+            return web.Response(status=304, headers={"ETag": etag})
+        return web.Response(text=html, status=status, content_type="text/html",
+                            headers={"ETag": etag} if status == 200 else None)
+
+    async def handle(self, request):
+        host = (request.host or "").split(":")[0].lower()
+        if host == MAPS_HOST:
+            return await self.maps(request)
+        if host.endswith("." + FIXTURE_DOMAIN):
+            return await self.site(request, host)
+        return web.Response(status=404)
+
+    def app(self):
+        app = web.Application()
+        app.router.add_route("GET", "/{tail:.*}", self.handle)
+        return app
+
+
+def serve(port, closed_port=None, **options):
+    """Runs the fixture server in this process until it is killed."""
+    web.run_app(FixtureWeb(port, closed_port or port + 1, **options).app(), host="127.0.0.1", port=port,
+                print=None, access_log=None)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--sites", type=int, default=SITES)
+    parser.add_argument("--results-per-query", type=int, default=RESULTS_PER_QUERY)
+    parser.add_argument("--seed", type=int, default=SEED)
+    parser.add_argument("--delay-scale", type=float, default=1.0, help="Multiplies the sites' response delays.")
+    args = parser.parse_args()
+    print(f"Serving {args.sites} sites and http://{MAPS_HOST}:{args.port}/maps")
+    serve(args.port, sites=args.sites, per_query=args.results_per_query, seed=args.seed, delay_scale=args.delay_scale)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,183 @@
+import queue
+import sqlite3
+import threading
+import time
+from .db_factory import DBFactory
+from .logging_config import setup_logger
+from .metrics import METRICS
+
+logger = setup_logger('batch_writer', '.jules_state/batch_writer.log')
+
+BATCH_SIZE = 500
+FLUSH_INTERVAL = 1.0
+# How often a blocked flush() checks that the writer thread is still alive.
+LIVENESS_CHECK_SECONDS = 0.5
+
+_STOP = object()
+
+
+def executemany_in_batches(conn, sql, rows, batch_size=BATCH_SIZE):
+    """Runs `sql` over `rows` with executemany, `batch_size` rows at a time. The caller commits."""
+    batch = []
+    for row in rows:
+        batch.append(row)
+        if len(batch) >= batch_size:
+            conn.executemany(sql, batch)
+            batch = []
+    if batch:
+        conn.executemany(sql, batch)
+
+
+class BatchWriter:
+    """Buffers rows and writes them to SQLite from a dedicated thread.
+
+    A writer is built for a fixed list of statements. Each write() supplies one
+    parameter tuple per statement (None skips that statement for the row). On
+    flush every statement is run with executemany over the buffered rows, in
+    list order, and the whole batch is committed at once. Flushes happen every
+    `batch_size` rows or `flush_interval` seconds, whichever comes first.
+
+    write() only enqueues, so it is safe to call from the asyncio event loop.
+    """
+
+    def __init__(self, db_path, statements, batch_size=BATCH_SIZE, flush_interval=FLUSH_INTERVAL, setup=None, name=None,
+                 profile='bulk_load'):
+        self.db_path = db_path
+        self.profile = profile
+        self.statements = list(statements)
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.setup = setup
+        self.name = name or db_path
+        self.rows_written = 0
+        self.batches_written = 0
+        self.rows_failed = 0
+        self._queue = queue.Queue()
+        self._thread = None
+        self._ready = threading.Event()
+        self._startup_error = None
+        self._error = None
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+    def start(self):
+        if self._thread is not None:
+            return
+        self._thread = threading.Thread(target=self._run, name=f"batch-writer:{self.name}", daemon=True)
+        self._thread.start()
+        self._ready.wait()
+        if self._startup_error is not None:
+            self._thread.join()
+            self._thread = None
+            raise self._startup_error
+
+    def write(self, *params):
+        if len(params) != len(self.statements):
+            raise ValueError(f"Expected {len(self.statements)} parameter tuples, got {len(params)}.")
+        self._queue.put(params)
+
+    def flush(self):
+        """Blocks until everything written so far is committed.
+
+        Raises the error that killed the writer thread (or RuntimeError if it
+        isn't running) instead of waiting on it forever."""
+        self._check_alive()
+        done = threading.Event()
+        self._queue.put(done)
+        while not done.wait(LIVENESS_CHECK_SECONDS):
+            self._check_alive()
+
+    def _check_alive(self):
+        thread = self._thread
+        if thread is None or not thread.is_alive():
+            raise self._error or RuntimeError(f"[{self.name}] Writer thread is not running.")
+
+    def close(self):
+        if self._thread is None:
+            return
+        self._queue.put(_STOP)
+        self._thread.join()
+        self._thread = None
+        logger.info(f"[{self.name}] Wrote {self.rows_written} rows in {self.batches_written} batches ({self.rows_failed} failed).")
+
+    def _run(self):
+        try:
+            conn = DBFactory(self.db_path, profile=self.profile).get_connection()
+            if self.setup:
+                self.setup(conn)
+        except Exception as e:
+            logger.error(f"[{self.name}] Writer failed to open {self.db_path}: {e}")
+            self._startup_error = e
+            self._ready.set()
+            return
+        self._ready.set()
+
+        pending = []
+        deadline = time.monotonic() + self.flush_interval
+        try:
+            while True:
+                try:
+                    item = self._queue.get(timeout=max(0.0, deadline - time.monotonic()))
+                except queue.Empty:
+                    item = None
+
+                if item is _STOP:
+                    break
+                if isinstance(item, threading.Event):
+                    self._write_batch(conn, pending)
+                    pending = []
+                    deadline = time.monotonic() + self.flush_interval
+                    item.set()
+                    continue
+                if item is not None:
+                    pending.append(item)
+
+                if len(pending) >= self.batch_size or time.monotonic() >= deadline:
+                    self._write_batch(conn, pending)
+                    pending = []
+                    deadline = time.monotonic() + self.flush_interval
+            self._write_batch(conn, pending)
+        except Exception as e:
+            # Kept for flush() to raise; rows still queued are lost.
+            self._error = e
+            logger.error(f"[{self.name}] Writer thread died: {e!r}")
+        finally:
+            conn.close()
+
+    def _write_batch(self, conn, rows):
+        if not rows:
+            return
+        started = time.perf_counter()
+        try:
+            for index, sql in enumerate(self.statements):
+                params = [row[index] for row in rows if row[index] is not None]
+                if params:
+                    conn.executemany(sql, params)
+            conn.commit()
+            self.rows_written += len(rows)
+            self.batches_written += 1
+            METRICS.observe('db_batch_seconds', time.perf_counter() - started, writer=self.name)
+            METRICS.inc('db_rows_written_total', len(rows), writer=self.name)
+        except sqlite3.Error as e:
+            conn.rollback()
+            logger.warning(f"[{self.name}] Batch of {len(rows)} failed ({e}); retrying row by row.")
+            self._write_rows_individually(conn, rows)
+
+    def _write_rows_individually(self, conn, rows):
+        for row in rows:
+            try:
+                for sql, params in zip(self.statements, row):
+                    if params is not None:
+                        conn.execute(sql, params)
+                conn.commit()
+                self.rows_written += 1
+            except sqlite3.Error as e:
+                conn.rollback()
+                self.rows_failed += 1
+                METRICS.inc('db_rows_failed_total', writer=self.name)
+                logger.error(f"[{self.name}] Failed to write row {row}: {e}")
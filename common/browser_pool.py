@@ -0,0 +1,228 @@
+import asyncio
+import itertools
+import psutil
+from contextlib import asynccontextmanager
+from playwright.async_api import async_playwright
+from .logging_config import setup_logger
+
+logger = setup_logger('browser_pool', '.jules_state/browser_pool.log')
+
+# A browser is retired (and replaced) once it has served this many page loads
+# or its process tree grows past this much resident memory.
+MAX_PAGES_PER_BROWSER = 500
+MAX_BROWSER_MEMORY_MB = 1500
+# psutil scans are not free; only re-check memory every N released leases.
+MEMORY_CHECK_INTERVAL = 5
+
+# Unknown switches are ignored by Chromium but show up in the process cmdline,
+# which lets us find each browser's process tree for memory accounting.
+POOL_TAG_ARG = '--scraper-browser-pool-id'
+
+
+class PooledBrowser:
+    """Bookkeeping for one warm Chromium instance."""
+
+    def __init__(self, browser, pool_id):
+        self.browser = browser
+        self.pool_id = pool_id
+        self.pages_served = 0
+        self.active_leases = 0
+        self.releases = 0
+        self.retiring = False
+
+    def memory_mb(self):
+        """Resident memory of this browser's process tree, or None if it can't be found."""
+        tag = f"{POOL_TAG_ARG}={self.pool_id}"
+        for proc in psutil.process_iter(['cmdline']):
+            try:
+                if tag in (proc.info['cmdline'] or []):
+                    tree = [proc] + proc.children(recursive=True)
+                    return sum(p.memory_info().rss for p in tree) / (1024 * 1024)
+            except (psutil.NoSuchProcess, psutil.AccessDenied):
+                continue
+        return None
+
+
+class Lease:
+    """A browser context handed out by the pool. Counts the page loads made in it."""
+
+    def __init__(self, pooled, context):
+        self.pooled = pooled
+        self.context = context
+        self.pages_loaded = 0
+        context.on("page", self._watch_page)
+
+    def _watch_page(self, page):
+        page.on("domcontentloaded", self._count_load)
+
+    def _count_load(self, _page):
+        self.pages_loaded += 1
+
+
+class BrowserPool:
+    """Keeps `size` Chromium instances warm and hands out leased contexts.
+
+    Usage:
+        async with BrowserPool() as pool:
+            async with pool.lease(user_agent=...) as context:
+                page = await context.new_page()
+    """
+
+    def __init__(self, size=1, max_pages_per_browser=MAX_PAGES_PER_BROWSER,
+                 max_memory_mb=MAX_BROWSER_MEMORY_MB, headless=True):
+        self.size = size
+        self.max_pages_per_browser = max_pages_per_browser
+        self.max_memory_mb = max_memory_mb
+        self.headless = headless
+        self._playwright = None
+        self._browsers = []
+        self._ids = itertools.count(1)
+        self._lock = asyncio.Lock()
+        self._retired = []
+        self._closing = set()
+        self._launching = set()
+
+    async def __aenter__(self):
+        await self.start()
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        await self.close()
+
+    async def start(self):
+        if self._playwright is not None:
+            return
+        self._playwright = await async_playwright().start()
+        for _ in range(self.size):
+            self._browsers.append(await self._launch())
+        logger.info(f"Browser pool started with {self.size} browser(s).")
+
+    async def close(self):
+        if self._playwright is None:
+            return
+        if self._launching:
+            await asyncio.gather(*self._launching, return_exceptions=True)
+        if self._closing:
+            await asyncio.gather(*self._closing, return_exceptions=True)
+        for pooled in self._browsers + self._retired:
+            await self._close_browser(pooled)
+        self._browsers = []
+        self._retired = []
+        await self._playwright.stop()
+        self._playwright = None
+        logger.info("Browser pool shut down.")
+
+    async def _launch(self):
+        pool_id = next(self._ids)
+        browser = await self._playwright.chromium.launch(
+            headless=self.headless,
+            args=[f"{POOL_TAG_ARG}={pool_id}"],
+        )
+        logger.info(f"Launched browser #{pool_id}.")
+        return PooledBrowser(browser, pool_id)
+
+    def _top_up(self):
+        """Starts background launches until live plus launching browsers reach `size`. Call with the lock held."""
+        while len(self._browsers) + len(self._launching) < self.size:
+            task = asyncio.create_task(self._replace())
+            self._launching.add(task)
+            task.add_done_callback(self._launching.discard)
+
+    async def _replace(self):
+        """Launches one browser into the pool. Returns whether it launched."""
+        # Launched without the lock, so acquires keep using the other browsers meanwhile.
+        try:
+            pooled = await self._launch()
+        except Exception as e:
+            logger.error(f"Failed to launch a replacement browser: {e}")
+            return False
+        async with self._lock:
+            self._browsers.append(pooled)
+        return True
+
+    def _retire(self, pooled):
+        """Takes `pooled` out of rotation; it is closed once its last lease is released. Call with the lock held."""
+        pooled.retiring = True
+        if pooled in self._browsers:
+            self._browsers.remove(pooled)
+            self._retired.append(pooled)
+        if pooled.active_leases == 0 and pooled in self._retired:
+            self._retired.remove(pooled)
+            task = asyncio.create_task(self._close_browser(pooled))
+            self._closing.add(task)
+            task.add_done_callback(self._closing.discard)
+        if self._playwright is not None:
+            self._top_up()
+
+    async def _close_browser(self, pooled):
+        try:
+            await pooled.browser.close()
+            logger.info(f"Closed browser #{pooled.pool_id} after {pooled.pages_served} pages.")
+        except Exception as e:
+            logger.warning(f"Failed to close browser #{pooled.pool_id}: {e}")
+
+    async def acquire(self, **context_options):
+        """Leases a new context on the least busy healthy browser.
+
+        Browsers that crashed or disconnected are retired and replaced in the
+        background; if none is left, this waits for a replacement."""
+        while True:
+            async with self._lock:
+                if self._playwright is None:
+                    raise RuntimeError("BrowserPool is not started.")
+                for pooled in [b for b in self._browsers if not b.browser.is_connected()]:
+                    logger.warning(f"Browser #{pooled.pool_id} is disconnected; replacing it.")
+                    self._retire(pooled)
+                if self._browsers:
+                    pooled = min(self._browsers, key=lambda b: b.active_leases)
+                    pooled.active_leases += 1
+                    break
+                self._top_up()
+                launching = list(self._launching)
+            await asyncio.wait(launching)
+            if not any(task.result() for task in launching):
+                raise RuntimeError("BrowserPool could not launch a browser.")
+        try:
+            context = await pooled.browser.new_context(**context_options)
+        except Exception:
+            pooled.active_leases -= 1
+            raise
+        return Lease(pooled, context)
+
+    async def release(self, lease):
+        """Closes the leased context and recycles its browser if it is worn out."""
+        pooled = lease.pooled
+        try:
+            await lease.context.close()
+        except Exception as e:
+            logger.warning(f"Failed to close leased context: {e}")
+
+        async with self._lock:
+            pooled.active_leases -= 1
+            pooled.pages_served += lease.pages_loaded
+            pooled.releases += 1
+
+            if not pooled.retiring and (not pooled.browser.is_connected() or self._should_retire(pooled)):
+                # The replacement launches in the background, not under the lock.
+                self._retire(pooled)
+            elif pooled.retiring and pooled.active_leases == 0 and pooled in self._retired:
+                self._retire(pooled)
+
+    def _should_retire(self, pooled):
+        if pooled.pages_served >= self.max_pages_per_browser:
+            logger.info(f"Recycling browser #{pooled.pool_id}: served {pooled.pages_served} pages.")
+            return True
+        if self.max_memory_mb and pooled.releases % MEMORY_CHECK_INTERVAL == 0:
+            memory = pooled.memory_mb()
+            if memory is not None and memory >= self.max_memory_mb:
+                logger.info(f"Recycling browser #{pooled.pool_id}: using {memory:.0f} MB.")
+                return True
+        return False
+
+    @asynccontextmanager
+    async def lease(self, **context_options):
+        lease = await self.acquire(**context_options)
+        try:
+            yield lease.context
+        finally:
+            await self.release(lease)
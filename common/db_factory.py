@@ -1,12 +1,51 @@
+import atexit
 import sqlite3
 import os
+import threading
+from contextlib import contextmanager
 from .logging_config import setup_logger
 
 logger = setup_logger('db_factory', '.jules_state/db_factory.log')
 
+# Named PRAGMA profiles applied to every new connection.
+# WAL lets readers run alongside the single writer instead of blocking on it.
+PROFILES = {
+    'default': {
+        'journal_mode': 'WAL',
+        'synchronous': 'NORMAL',
+        'busy_timeout': 5000,
+    },
+    'bulk_load': {
+        'journal_mode': 'WAL',
+        'synchronous': 'NORMAL',
+        'busy_timeout': 10000,
+        'cache_size': -256 * 1024,        # KiB -> 256 MB
+        'mmap_size': 1024 * 1024 * 1024,  # 1 GB
+        'temp_store': 'MEMORY',
+    },
+    'read_only': {
+        'query_only': 1,
+        'busy_timeout': 5000,
+        'cache_size': -128 * 1024,
+        'mmap_size': 1024 * 1024 * 1024,
+        'temp_store': 'MEMORY',
+    },
+}
+
+# Profiles opened with SQLite's read-only URI mode (never creates the file).
+READ_ONLY_PROFILES = {'read_only'}
+
+# Per-process connection cache: (abs path, profile, thread id) -> connection.
+# sqlite3 connections are bound to the thread that created them.
+_cache = {}
+_cache_lock = threading.Lock()
+
 class DBFactory:
-    def __init__(self, db_path):
+    def __init__(self, db_path, profile='default'):
+        if profile not in PROFILES:
+            raise ValueError(f"Unknown DB profile '{profile}'.")
         self.db_path = db_path
+        self.profile = profile
         self._ensure_db_dir()
 
     def _ensure_db_dir(self):
@@ -19,11 +58,57 @@ class DBFactory:
                 logger.error(f"Failed to create database directory {db_dir}: {e}")
                 raise
 
-    def get_connection(self):
+    def get_connection(self, profile=None):
+        """Opens a new connection with the profile's PRAGMAs applied. The caller closes it."""
+        profile = profile or self.profile
         try:
-            conn = sqlite3.connect(self.db_path)
-            logger.info(f"Connected to database: {self.db_path}")
+            if profile in READ_ONLY_PROFILES:
+                conn = sqlite3.connect(f"file:{os.path.abspath(self.db_path)}?mode=ro", uri=True)
+            else:
+                conn = sqlite3.connect(self.db_path)
+            for pragma, value in PROFILES[profile].items():
+                conn.execute(f"PRAGMA {pragma} = {value}")
+            logger.debug(f"Connected to database: {self.db_path} ({profile})")
             return conn
         except sqlite3.Error as e:
             logger.error(f"Failed to connect to database {self.db_path}: {e}")
             raise
+
+    @contextmanager
+    def connection(self, profile=None):
+        """Yields this thread's cached connection for (path, profile).
+
+        Commits on a clean exit and rolls back on error, but leaves the
+        connection open for the next caller. close_all() closes the cache.
+        """
+        profile = profile or self.profile
+        key = (os.path.abspath(self.db_path), profile, threading.get_ident())
+        with _cache_lock:
+            conn = _cache.get(key)
+        if conn is None:
+            conn = self.get_connection(profile)
+            with _cache_lock:
+                _cache[key] = conn
+
+        try:
+            yield conn
+            if conn.in_transaction:
+                conn.commit()
+        except Exception:
+            if conn.in_transaction:
+                conn.rollback()
+            raise
+
+def close_all():
+    """Closes every cached connection. Runs automatically at interpreter exit."""
+    with _cache_lock:
+        items = list(_cache.items())
+        _cache.clear()
+    for (path, profile, thread_id), conn in items:
+        try:
+            conn.close()
+        except sqlite3.ProgrammingError:
+            # Created in another, possibly finished, thread; SQLite frees it with the thread.
+            pass
+
+atexit.register(close_all)
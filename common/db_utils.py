@@ -1,23 +1,90 @@
 import json
 import os
 import sqlite3
+from functools import lru_cache
 from .logging_config import setup_logger
 
 logger = setup_logger('db_utils', '.jules_state/db_utils.log')
 
-def load_schema(schema_name):
-    """Loads the schema definition for a given module from the registry."""
-    registry_path = os.path.join(os.path.dirname(__file__), 'schema_registry.json')
+REGISTRY_PATH = os.path.join(os.path.dirname(__file__), 'schema_registry.json')
+
+# Bookkeeping table recording which registry version each table is at.
+VERSIONS_TABLE = 'schema_versions'
+
+# (database file, schema name) pairs already brought up to date in this process.
+# A hit is only trusted while the table is still there: the file may have been
+# deleted and recreated since.
+_initialized = set()
+
+@lru_cache(maxsize=None)
+def load_registry():
+    """Parses schema_registry.json once per process."""
     try:
-        with open(registry_path, 'r') as f:
-            registry = json.load(f)
-        return registry.get(schema_name)
+        with open(REGISTRY_PATH, 'r') as f:
+            return json.load(f)
     except Exception as e:
         logger.error(f"Failed to load schema registry: {e}")
         raise
 
+def load_schema(schema_name):
+    """Loads the schema definition for a given module from the registry."""
+    return load_registry().get(schema_name)
+
+def _database_file(connection):
+    for _, name, path in connection.execute("PRAGMA database_list"):
+        if name == 'main':
+            return path or ':memory:'
+    return ':memory:'
+
+def _table_exists(cursor, table_name):
+    cursor.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?", (table_name,))
+    return cursor.fetchone() is not None
+
+def _existing_columns(cursor, table_name):
+    cursor.execute(f"PRAGMA table_info({table_name})")
+    return {info[1] for info in cursor.fetchall()}
+
+def _stored_version(cursor, table_name):
+    cursor.execute(f"CREATE TABLE IF NOT EXISTS {VERSIONS_TABLE} (table_name TEXT PRIMARY KEY, version INTEGER NOT NULL)")
+    cursor.execute(f"SELECT version FROM {VERSIONS_TABLE} WHERE table_name = ?", (table_name,))
+    row = cursor.fetchone()
+    return row[0] if row else None
+
+def _set_version(cursor, table_name, version):
+    cursor.execute(f'''
+        INSERT INTO {VERSIONS_TABLE} (table_name, version) VALUES (?, ?)
+        ON CONFLICT(table_name) DO UPDATE SET version = excluded.version
+    ''', (table_name, version))
+
+def _add_missing_columns(cursor, table_name, schema):
+    existing = _existing_columns(cursor, table_name)
+    for col in schema['columns']:
+        if col['name'] not in existing:
+            cursor.execute(f"ALTER TABLE {table_name} ADD COLUMN {col['name']} {col['type']}")
+            logger.info(f"Added column '{col['name']}' to '{table_name}'.")
+
+def _apply_migrations(cursor, table_name, schema, from_version):
+    """Runs the registry migrations newer than `from_version`, oldest first."""
+    for migration in sorted(schema.get('migrations', []), key=lambda m: m['version']):
+        if migration['version'] <= from_version:
+            continue
+        for statement in migration.get('sql', []):
+            cursor.execute(statement)
+        _set_version(cursor, table_name, migration['version'])
+        logger.info(f"Migrated '{table_name}' to version {migration['version']}.")
+
+def _create_indexes(cursor, table_name, schema):
+    for index in schema.get('indexes', []):
+        unique = "UNIQUE " if index.get('unique') else ""
+        cursor.execute(f"CREATE {unique}INDEX IF NOT EXISTS {index['name']} ON {table_name} ({', '.join(index['columns'])})")
+
 def init_db(connection, schema_name):
-    """Initializes the database table based on the schema name."""
+    """Creates or upgrades a table to match its registry entry.
+
+    Idempotent: creates the table if missing, adds columns that were added to
+    the registry, runs pending versioned migrations, then creates indexes
+    (including composite unique keys).
+    """
     schema = load_schema(schema_name)
     if not schema:
         logger.error(f"Schema '{schema_name}' not found in registry.")
@@ -28,6 +95,12 @@ def init_db(connection, schema_name):
     # Looking at schema_registry.json: "lead_harvest", "enrichment", "master_leads".
     # I'll use these as table names.
 
+    cache_key = (_database_file(connection), schema_name)
+    if cache_key[0] != ':memory:' and cache_key in _initialized and _table_exists(connection.cursor(), table_name):
+        return
+
+    target_version = schema.get('version', 1)
+
     columns_def = []
     for col in schema['columns']:
         columns_def.append(f"{col['name']} {col['type']}")
@@ -36,9 +109,24 @@ def init_db(connection, schema_name):
 
     try:
         cursor = connection.cursor()
+        is_new = not _table_exists(cursor, table_name)
         cursor.execute(create_statement)
+
+        stored_version = _stored_version(cursor, table_name)
+        if is_new:
+            # A fresh table already has the latest shape; nothing to migrate.
+            _set_version(cursor, table_name, target_version)
+        else:
+            _add_missing_columns(cursor, table_name, schema)
+            _apply_migrations(cursor, table_name, schema, stored_version or 1)
+            if (stored_version or 1) < target_version:
+                _set_version(cursor, table_name, target_version)
+
+        _create_indexes(cursor, table_name, schema)
         connection.commit()
+        _initialized.add(cache_key)
         logger.info(f"Initialized table '{schema_name}' successfully.")
     except sqlite3.Error as e:
+        connection.rollback()
         logger.error(f"Failed to initialize table '{schema_name}': {e}")
         raise
@@ -0,0 +1,176 @@
+import asyncio
+import time
+from contextlib import asynccontextmanager
+from urllib.parse import urlparse
+from .logging_config import setup_logger
+from .metrics import METRICS
+from .request_policy import load_policies
+
+logger = setup_logger('host_scheduler', '.jules_state/host_scheduler.log')
+
+# Responses that mean "slow down".
+THROTTLE_STATUSES = (429, 503)
+
+# Multiplicative decrease on a throttle signal, additive recovery (this
+# fraction of the configured rate) on each success.
+DECREASE_FACTOR = 0.5
+RECOVERY_STEP = 0.1
+
+# Pause after a throttle signal without Retry-After: doubles with each
+# consecutive signal from the host, up to MAX_COOLDOWN_S.
+BASE_COOLDOWN_S = 2.0
+MAX_COOLDOWN_S = 120.0
+
+# Idle, full buckets are dropped once this many hosts are tracked.
+MAX_BUCKETS = 10000
+
+
+def host_of(url):
+    """Bucket key for a URL or bare host: lowercase hostname without www."""
+    host = (urlparse(url if "://" in url else "//" + url).hostname or url).lower()
+    return host[4:] if host.startswith("www.") else host
+
+
+def retry_after_seconds(value):
+    """Parses a numeric Retry-After header; HTTP dates and junk give None."""
+    try:
+        return max(0.0, float(value))
+    except (TypeError, ValueError):
+        return None
+
+
+class HostBucket:
+    """Token bucket for one host. Tokens may go negative: that is the queue of granted reservations."""
+
+    def __init__(self, rate, burst, min_rate):
+        self.base_rate = rate
+        self.rate = rate
+        self.burst = burst
+        self.min_rate = min_rate
+        self.tokens = float(burst)
+        self.updated = time.monotonic()
+        self.strikes = 0
+
+    def _refill(self, now):
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def reserve(self, now):
+        """Takes a token now and returns how long the caller must wait before using it."""
+        self._refill(now)
+        self.tokens -= 1
+        return -self.tokens / self.rate if self.tokens < 0 else 0.0
+
+    def throttled(self, now, retry_after=None):
+        self._refill(now)
+        self.strikes += 1
+        self.rate = max(self.min_rate, self.rate * DECREASE_FACTOR)
+        cooldown = retry_after if retry_after is not None else min(MAX_COOLDOWN_S, BASE_COOLDOWN_S * 2 ** (self.strikes - 1))
+        # Push every later reservation back by the cooldown.
+        self.tokens = min(self.tokens, 0.0) - cooldown * self.rate
+        return cooldown
+
+    def succeeded(self):
+        self.strikes = 0
+        self.rate = min(self.base_rate, self.rate + self.base_rate * RECOVERY_STEP)
+
+    def idle(self, now):
+        return self.strikes == 0 and self.rate == self.base_rate and self.tokens + (now - self.updated) * self.rate >= self.burst
+
+
+class Lease:
+    """One granted request slot. Call report() with what the host answered."""
+
+    def __init__(self, scheduler, host):
+        self.scheduler = scheduler
+        self.host = host
+
+    def report(self, status=None, captcha=False, retry_after=None):
+        self.scheduler.report(self.host, status, captcha, retry_after)
+
+
+class HostScheduler:
+    """Grants request slots per host at up to `rate` per second (bursts of `burst`),
+    with at most `max_concurrency` requests in flight across all hosts.
+
+    A slot is reserved from the host's bucket and the caller sleeps exactly
+    until its token is due, so each host runs at the highest rate it allows
+    instead of behind a fixed pause. A 429/503 or captcha reported for a host
+    halves its rate (down to `min_rate`) and holds it for Retry-After or a
+    growing cooldown; successes bring the rate back up gradually.
+    """
+
+    def __init__(self, rate=1.0, burst=1, min_rate=0.05, max_concurrency=32, name='default'):
+        self.name = name
+        self.rate = rate
+        self.burst = burst
+        self.min_rate = min_rate
+        self.max_concurrency = max_concurrency
+        self.stats = {"leases": 0, "waited_s": 0.0, "throttled": 0}
+        self._buckets = {}
+        self._loop = None
+        self._slots = None
+
+    def _bucket(self, host):
+        bucket = self._buckets.get(host)
+        if bucket is None:
+            if len(self._buckets) >= MAX_BUCKETS:
+                now = time.monotonic()
+                self._buckets = {h: b for h, b in self._buckets.items() if not b.idle(now)}
+            bucket = self._buckets[host] = HostBucket(self.rate, self.burst, self.min_rate)
+        return bucket
+
+    def _semaphore(self):
+        # One semaphore per event loop: batch shards and scripts may call asyncio.run more than once.
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop:
+            self._loop = loop
+            self._slots = asyncio.Semaphore(self.max_concurrency)
+        return self._slots
+
+    @asynccontextmanager
+    async def lease(self, url):
+        """Waits until `url`'s host may be hit and a global slot is free, and holds the slot."""
+        host = host_of(url)
+        wait = self._bucket(host).reserve(time.monotonic())
+        METRICS.observe('scheduler_wait_seconds', wait, stage=self.name)
+        if wait > 0:
+            self.stats["waited_s"] += wait
+            await asyncio.sleep(wait)
+        async with self._semaphore():
+            self.stats["leases"] += 1
+            yield Lease(self, host)
+
+    def report(self, host, status=None, captcha=False, retry_after=None):
+        """Feeds a response back into the host's rate: slow down on throttling, recover on success.
+
+        status=None means the action completed without an HTTP status to show (a click, a scroll).
+        """
+        host = host_of(host)
+        bucket = self._bucket(host)
+        if captcha or status in THROTTLE_STATUSES:
+            self.stats["throttled"] += 1
+            METRICS.inc('scheduler_throttled_total', stage=self.name)
+            cooldown = bucket.throttled(time.monotonic(), retry_after)
+            logger.warning(f"{host} is throttling ({'captcha' if captcha else status}); "
+                           f"rate now {bucket.rate:.2f}/s after a {cooldown:.0f}s pause.")
+        elif status is None or status < 400:
+            bucket.succeeded()
+
+    def summary(self):
+        return (f"{self.stats['leases']} leases, {self.stats['waited_s']:.1f}s spent waiting, "
+                f"{self.stats['throttled']} throttle signals")
+
+
+def load_scheduler(stage):
+    """Builds the HostScheduler for a stage from its 'scheduler' entry, layered over 'default'."""
+    policies = load_policies()
+    config = dict(policies.get("default", {}).get("scheduler", {}))
+    config.update(policies.get(stage, {}).get("scheduler", {}))
+    return HostScheduler(
+        rate=config.get("rate_per_s", 1.0),
+        burst=config.get("burst", 1),
+        min_rate=config.get("min_rate_per_s", 0.05),
+        max_concurrency=config.get("max_concurrency", 32),
+        name=stage,
+    )
@@ -1,26 +1,202 @@
+"""Logging backend shared by every module.
+
+setup_logger() gives a logger a QueueHandler only, so a log call costs a
+queue put on the calling thread (usually the event loop). A single
+QueueListener thread per process writes the records to their log files and
+to stdout. Calling setup_logger() again for the same name returns the logger
+unchanged instead of stacking handlers.
+
+High-volume per-lead messages pass extra={"sample": "<key>"} and are rate
+limited per key (SAMPLE_PER_SECOND, bursts of SAMPLE_BURST); the next
+message let through for a key says how many were dropped. Warnings and
+errors are never dropped. configure_logging(json_lines=True) switches the
+log files to one JSON object per line.
+"""
+import atexit
+import copy
+import json
 import logging
+import logging.handlers
 import os
+import queue
 import sys
+import threading
+import time
 
-def setup_logger(name, log_file, level=logging.INFO):
-    """Function to setup as many loggers as you want"""
+FORMAT = '%(asctime)s %(levelname)s %(message)s'
+
+# Sampled messages allowed per key per second, and the burst allowed after a quiet spell.
+SAMPLE_PER_SECOND = 5.0
+SAMPLE_BURST = 20
+
+# Attributes every LogRecord has; anything else came in through extra= and goes into the JSON line.
+_RECORD_FIELDS = set(vars(logging.LogRecord('', 0, '', 0, '', (), None))) | {'message', 'asctime', 'log_file'}
+
+_lock = threading.Lock()
+_queue = queue.SimpleQueue()
+_TRACEBACKS = logging.Formatter()
+_listener = None
+_router = None
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per record: time, level, logger, message and any extra= fields."""
+
+    def format(self, record):
+        entry = {
+            "time": self.formatTime(record),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+        for key, value in vars(record).items():
+            if key not in _RECORD_FIELDS:
+                entry[key] = value if isinstance(value, (str, int, float, bool, type(None))) else str(value)
+        if record.exc_text:
+            entry["exception"] = record.exc_text
+        return json.dumps(entry, ensure_ascii=False)
+
+
+class SampleFilter(logging.Filter):
+    """Token bucket per `sample` key; records without the key, and warnings and above, always pass."""
+
+    def __init__(self, per_second=SAMPLE_PER_SECOND, burst=SAMPLE_BURST):
+        super().__init__()
+        self.per_second = per_second
+        self.burst = burst
+        self._buckets = {}
+        self._lock = threading.Lock()
+
+    def filter(self, record):
+        key = getattr(record, 'sample', None)
+        if key is None or record.levelno >= logging.WARNING or self.per_second <= 0:
+            return True
+        now = time.monotonic()
+        with self._lock:
+            tokens, updated, dropped = self._buckets.get(key, (self.burst, now, 0))
+            tokens = min(self.burst, tokens + (now - updated) * self.per_second)
+            if tokens < 1:
+                self._buckets[key] = (tokens, now, dropped + 1)
+                return False
+            self._buckets[key] = (tokens - 1, now, 0)
+        if dropped:
+            record.msg = f"{record.getMessage()} ({dropped} similar '{key}' messages dropped)"
+            record.args = ()
+        return True
+
+
+class RoutingHandler(logging.Handler):
+    """Runs on the listener thread: writes each record to its logger's file and to stdout."""
 
-    formatter = logging.Formatter('%(asctime)s %(levelname)s %(message)s')
+    def __init__(self):
+        super().__init__()
+        self.text = logging.Formatter(FORMAT)
+        self.json = JsonFormatter()
+        self.json_lines = False
+        self.console = sys.stdout
+        self._files = {}
 
-    # Check if the log directory exists, if not create it
-    log_dir = os.path.dirname(log_file)
-    if not os.path.exists(log_dir):
-        os.makedirs(log_dir)
+    def _file(self, path):
+        stream = self._files.get(path)
+        if stream is None:
+            stream = self._files[path] = open(path, 'a', encoding='utf-8')
+        return stream
 
-    handler = logging.FileHandler(log_file)
-    handler.setFormatter(formatter)
+    def emit(self, record):
+        try:
+            line = self.text.format(record)
+            path = getattr(record, 'log_file', None)
+            if path:
+                stream = self._file(path)
+                stream.write((self.json.format(record) if self.json_lines else line) + '\n')
+                stream.flush()
+            if self.console is not None:
+                self.console.write(line + '\n')
+                self.console.flush()
+        except Exception:
+            self.handleError(record)
 
-    console_handler = logging.StreamHandler(sys.stdout)
-    console_handler.setFormatter(formatter)
+    def close(self):
+        for stream in self._files.values():
+            stream.close()
+        self._files.clear()
+        super().close()
 
+
+class FileQueueHandler(logging.handlers.QueueHandler):
+    """Tags each record with the file it belongs in before queueing it."""
+
+    def __init__(self, log_file):
+        super().__init__(_queue)
+        # Files are opened lazily on the listener thread; pin the path in case the process chdirs first.
+        self.log_file = os.path.abspath(log_file)
+
+    def prepare(self, record):
+        # QueueHandler.prepare would fold the traceback into the message and drop
+        # exc_text; keep it apart so text lines show it once and JSON lines as "exception".
+        record = copy.copy(record)
+        record.message = record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = record.exc_text or _TRACEBACKS.formatException(record.exc_info)
+            record.exc_info = None
+        record.log_file = self.log_file
+        return record
+
+
+def _start_listener():
+    global _listener, _router
+    if _listener is None:
+        _router = RoutingHandler()
+        _listener = logging.handlers.QueueListener(_queue, _router, respect_handler_level=True)
+        _listener.start()
+        atexit.register(stop_logging)
+
+
+def stop_logging():
+    """Writes out everything still queued and stops the listener thread. Logging restarts on the next setup_logger()."""
+    global _listener, _router
+    with _lock:
+        if _listener is None:
+            return
+        _listener.stop()
+        _router.close()
+        _listener = None
+        _router = None
+
+
+def configure_logging(json_lines=None, sample_per_second=None, sample_burst=None, console=None):
+    """Process-wide settings; takes effect for loggers that already exist too. console=False stops the stdout echo."""
+    with _lock:
+        _start_listener()
+        if json_lines is not None:
+            _router.json_lines = json_lines
+        if console is not None:
+            _router.console = sys.stdout if console else None
+        if sample_per_second is not None:
+            _SAMPLER.per_second = sample_per_second
+        if sample_burst is not None:
+            _SAMPLER.burst = sample_burst
+
+
+_SAMPLER = SampleFilter()
+
+
+def setup_logger(name, log_file, level=logging.INFO):
+    """Function to setup as many loggers as you want"""
     logger = logging.getLogger(name)
-    logger.setLevel(level)
-    logger.addHandler(handler)
-    logger.addHandler(console_handler)
+    with _lock:
+        _start_listener()
+        if any(isinstance(handler, FileQueueHandler) for handler in logger.handlers):
+            return logger
+
+        # Check if the log directory exists, if not create it
+        log_dir = os.path.dirname(log_file)
+        if log_dir and not os.path.exists(log_dir):
+            os.makedirs(log_dir, exist_ok=True)
 
+        handler = FileQueueHandler(log_file)
+        handler.addFilter(_SAMPLER)
+        logger.setLevel(level)
+        logger.addHandler(handler)
     return logger
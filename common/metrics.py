@@ -0,0 +1,187 @@
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+from .logging_config import setup_logger
+
+logger = setup_logger('metrics', '.jules_state/metrics.log')
+
+METRICS_PATH = 'logs/metrics.json'
+
+# Histogram bucket upper bounds, in seconds unless a metric says otherwise.
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 20.0, 60.0)
+
+
+def _label_key(labels):
+    return tuple(sorted(labels.items())) if labels else ()
+
+
+def _label_text(key):
+    if not key:
+        return ""
+    return "{" + ",".join(f'{name}="{value}"' for name, value in key) + "}"
+
+
+class Histogram:
+    """Cumulative-bucket histogram (Prometheus layout) with sum, count and max."""
+
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self.bounds = tuple(buckets)
+        self.counts = [0] * (len(self.bounds) + 1)
+        self.sum = 0.0
+        self.count = 0
+        self.max = 0.0
+
+    def observe(self, value):
+        index = 0
+        while index < len(self.bounds) and value > self.bounds[index]:
+            index += 1
+        self.counts[index] += 1
+        self.sum += value
+        self.count += 1
+        self.max = max(self.max, value)
+
+    def quantile(self, q):
+        """Estimate by linear interpolation inside the bucket that holds the q-th observation."""
+        if not self.count:
+            return 0.0
+        rank = q * self.count
+        seen = 0
+        for index, bucket_count in enumerate(self.counts):
+            if seen + bucket_count >= rank and bucket_count:
+                lower = self.bounds[index - 1] if index > 0 else 0.0
+                upper = self.bounds[index] if index < len(self.bounds) else self.max
+                return min(self.max, lower + (upper - lower) * (rank - seen) / bucket_count)
+            seen += bucket_count
+        return self.max
+
+
+class Metrics:
+    """Process-wide counters, gauges and histograms, safe to update from any thread.
+
+    Each metric may carry labels, e.g. inc('enrichment_leads_total', tier='http').
+    snapshot() returns plain data; write_snapshot() saves it as JSON or, for a
+    .prom path, in the Prometheus text format; summary() is the end-of-run report.
+    """
+
+    def __init__(self):
+        self.started = time.time()
+        self._lock = threading.Lock()
+        self._counters = {}
+        self._gauges = {}
+        self._histograms = {}
+
+    def inc(self, name, value=1, **labels):
+        key = (name, _label_key(labels))
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + value
+
+    def gauge(self, name, value, **labels):
+        with self._lock:
+            self._gauges[(name, _label_key(labels))] = value
+
+    def observe(self, name, value, buckets=DEFAULT_BUCKETS, **labels):
+        key = (name, _label_key(labels))
+        with self._lock:
+            histogram = self._histograms.get(key)
+            if histogram is None:
+                histogram = self._histograms[key] = Histogram(buckets)
+            histogram.observe(value)
+
+    @contextmanager
+    def timer(self, name, **labels):
+        """Observes the wall time of the block into histogram `name` (seconds), also on error."""
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - started, **labels)
+
+    def reset(self):
+        with self._lock:
+            self._counters.clear()
+            self._gauges.clear()
+            self._histograms.clear()
+        self.started = time.time()
+
+    def snapshot(self):
+        with self._lock:
+            histograms = {}
+            for (name, key), h in self._histograms.items():
+                histograms.setdefault(name, []).append({
+                    "labels": dict(key), "count": h.count, "sum": round(h.sum, 6), "max": round(h.max, 6),
+                    "p50": round(h.quantile(0.5), 6), "p95": round(h.quantile(0.95), 6), "p99": round(h.quantile(0.99), 6),
+                    "buckets": dict(zip([str(b) for b in h.bounds] + ["+Inf"], h.counts)),
+                })
+            counters, gauges = {}, {}
+            for (name, key), value in self._counters.items():
+                counters.setdefault(name, []).append({"labels": dict(key), "value": value})
+            for (name, key), value in self._gauges.items():
+                gauges.setdefault(name, []).append({"labels": dict(key), "value": value})
+        return {
+            "started_at": self.started,
+            "elapsed_s": round(time.time() - self.started, 3),
+            "counters": counters,
+            "gauges": gauges,
+            "histograms": histograms,
+        }
+
+    def prometheus_text(self):
+        lines = []
+        with self._lock:
+            for kind, metrics in (("counter", self._counters), ("gauge", self._gauges)):
+                for name in sorted({name for name, _ in metrics}):
+                    lines.append(f"# TYPE {name} {kind}")
+                    for (metric, key), value in sorted(metrics.items()):
+                        if metric == name:
+                            lines.append(f"{name}{_label_text(key)} {value}")
+            for name in sorted({name for name, _ in self._histograms}):
+                lines.append(f"# TYPE {name} histogram")
+                for (metric, key), h in sorted(self._histograms.items(), key=lambda item: item[0]):
+                    if metric != name:
+                        continue
+                    cumulative = 0
+                    for bound, count in zip([str(b) for b in h.bounds] + ["+Inf"], h.counts):
+                        cumulative += count
+                        lines.append(f"{name}_bucket{_label_text(key + (('le', bound),))} {cumulative}")
+                    lines.append(f"{name}_sum{_label_text(key)} {h.sum}")
+                    lines.append(f"{name}_count{_label_text(key)} {h.count}")
+        return "\n".join(lines) + "\n"
+
+    def write_snapshot(self, path=METRICS_PATH):
+        """Writes the current values to `path`, atomically; Prometheus text if it ends in .prom."""
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        content = self.prometheus_text() if path.endswith(".prom") else json.dumps(self.snapshot(), indent=2)
+        temp_path = f"{path}.tmp"
+        with open(temp_path, "w") as f:
+            f.write(content)
+        os.replace(temp_path, path)
+        return path
+
+    def summary(self):
+        """Human-readable end-of-run report: counters with per-second rates, then latency percentiles."""
+        elapsed = max(time.time() - self.started, 1e-9)
+        lines = [f"Metrics after {elapsed:.1f}s:"]
+        with self._lock:
+            for (name, key), value in sorted(self._counters.items()):
+                lines.append(f"  {name}{_label_text(key)} = {value} ({value / elapsed:.2f}/s)")
+            for (name, key), value in sorted(self._gauges.items()):
+                lines.append(f"  {name}{_label_text(key)} = {value}")
+            for (name, key), h in sorted(self._histograms.items(), key=lambda item: item[0]):
+                lines.append(f"  {name}{_label_text(key)}: n={h.count} total={h.sum:.2f} mean={h.sum / h.count:.3f} "
+                             f"p50={h.quantile(0.5):.3f} p95={h.quantile(0.95):.3f} max={h.max:.3f}")
+        return "\n".join(lines)
+
+    def report(self, path=METRICS_PATH):
+        """Logs summary() and writes the snapshot file. Call once at the end of a run."""
+        logger.info(self.summary())
+        try:
+            logger.info(f"Metrics snapshot written to {self.write_snapshot(path)}.")
+        except OSError as e:
+            logger.warning(f"Could not write metrics snapshot to {path}: {e}")
+
+
+METRICS = Metrics()
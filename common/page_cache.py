@@ -0,0 +1,192 @@
+import asyncio
+import hashlib
+import time
+import zlib
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlsplit, urlunsplit
+from .db_factory import DBFactory
+from .db_utils import init_db
+from .logging_config import setup_logger
+
+logger = setup_logger('page_cache', '.jules_state/page_cache.log')
+
+CACHE_DB_PATH = 'cache/page_cache.db'
+PAGES_SCHEMA = 'page_cache'
+BODIES_SCHEMA = 'page_cache_bodies'
+
+TTL_SECONDS = 7 * 24 * 3600
+MAX_BYTES = 2 * 1024 ** 3  # compressed bodies
+# Eviction frees down to this fraction of MAX_BYTES so it doesn't run on every put.
+EVICT_TO = 0.9
+# last_access updates are buffered and written this many at a time.
+TOUCH_BATCH = 256
+COMPRESSION_LEVEL = 6
+
+CachedPage = namedtuple('CachedPage', 'url_key final_url status etag last_modified body fetched_at')
+
+
+def cache_key(url):
+    """Normalized form of an already clean_url()-ed URL: lowercase scheme/host, no fragment or default port."""
+    parts = urlsplit(url.strip())
+    scheme = parts.scheme.lower() or "http"
+    host = (parts.hostname or "").lower()
+    if parts.port and not ((scheme == "http" and parts.port == 80) or (scheme == "https" and parts.port == 443)):
+        host = f"{host}:{parts.port}"
+    return urlunsplit((scheme, host, parts.path or "/", parts.query, ""))
+
+
+def is_fresh(page, ttl=TTL_SECONDS):
+    return time.time() - page.fetched_at < ttl
+
+
+def validators(page):
+    """Conditional request headers for revalidating a stale entry."""
+    headers = {}
+    if page.etag:
+        headers["If-None-Match"] = page.etag
+    if page.last_modified:
+        headers["If-Modified-Since"] = page.last_modified
+    return headers
+
+
+class PageCache:
+    """On-disk page cache keyed by normalized URL, with content-addressed bodies.
+
+    Bodies are zlib-compressed and stored once per SHA-256, so the many parked
+    and templated pages that share a body cost one row. Entries older than
+    `ttl` are stale (revalidate with validators()). When compressed bodies
+    exceed `max_bytes` the least recently used entries are evicted. In
+    `offline` (replay) mode callers must serve from the cache only.
+
+    Uses the calling thread's cached connection, like the rest of the repo.
+    Async callers use get_async/put_async/refresh_async, which run the SQLite
+    and zlib work on one dedicated thread so the event loop never blocks on
+    it and the cache's counters are only ever touched from that thread.
+    """
+
+    def __init__(self, db_path=CACHE_DB_PATH, ttl=TTL_SECONDS, max_bytes=MAX_BYTES, offline=False):
+        self.db_path = db_path
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self.offline = offline
+        self.hits = 0
+        self.misses = 0
+        self._factory = DBFactory(db_path)
+        self._touched = {}
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='page-cache')
+        with self._factory.connection() as conn:
+            init_db(conn, PAGES_SCHEMA)
+            init_db(conn, BODIES_SCHEMA)
+            self.total_bytes = conn.execute(f"SELECT COALESCE(SUM(size), 0) FROM {BODIES_SCHEMA}").fetchone()[0]
+
+    def get(self, url):
+        """Returns the CachedPage for `url` (fresh or stale), or None."""
+        key = cache_key(url)
+        with self._factory.connection() as conn:
+            row = conn.execute(f'''
+                SELECT p.final_url, p.status, p.etag, p.last_modified, b.body, p.fetched_at
+                FROM {PAGES_SCHEMA} p JOIN {BODIES_SCHEMA} b ON b.hash = p.body_hash
+                WHERE p.url_key = ?
+            ''', (key,)).fetchone()
+        if row is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        self._touch(key)
+        final_url, status, etag, last_modified, body, fetched_at = row
+        return CachedPage(key, final_url, status, etag, last_modified, zlib.decompress(body), fetched_at)
+
+    def put(self, url, final_url, status, body, etag=None, last_modified=None):
+        key = cache_key(url)
+        digest = hashlib.sha256(body).hexdigest()
+        now = time.time()
+        with self._factory.connection() as conn:
+            if conn.execute(f"SELECT 1 FROM {BODIES_SCHEMA} WHERE hash = ?", (digest,)).fetchone() is None:
+                compressed = zlib.compress(body, COMPRESSION_LEVEL)
+                conn.execute(f"INSERT INTO {BODIES_SCHEMA} (hash, body, size) VALUES (?, ?, ?)", (digest, compressed, len(compressed)))
+                self.total_bytes += len(compressed)
+            conn.execute(f'''
+                INSERT INTO {PAGES_SCHEMA} (url_key, final_url, status, etag, last_modified, body_hash, fetched_at, last_access)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+                ON CONFLICT(url_key) DO UPDATE SET
+                    final_url = excluded.final_url,
+                    status = excluded.status,
+                    etag = excluded.etag,
+                    last_modified = excluded.last_modified,
+                    body_hash = excluded.body_hash,
+                    fetched_at = excluded.fetched_at,
+                    last_access = excluded.last_access
+            ''', (key, final_url, status, etag, last_modified, digest, now, now))
+        if self.total_bytes > self.max_bytes:
+            self.evict()
+
+    def refresh(self, url):
+        """Marks a revalidated (304) entry as freshly fetched."""
+        now = time.time()
+        with self._factory.connection() as conn:
+            conn.execute(f"UPDATE {PAGES_SCHEMA} SET fetched_at = ?, last_access = ? WHERE url_key = ?", (now, now, cache_key(url)))
+
+    async def _run(self, method, *args):
+        return await asyncio.get_running_loop().run_in_executor(self._executor, method, *args)
+
+    async def get_async(self, url):
+        return await self._run(self.get, url)
+
+    async def put_async(self, url, final_url, status, body, etag=None, last_modified=None):
+        return await self._run(self.put, url, final_url, status, body, etag, last_modified)
+
+    async def refresh_async(self, url):
+        return await self._run(self.refresh, url)
+
+    def _touch(self, key):
+        self._touched[key] = time.time()
+        if len(self._touched) >= TOUCH_BATCH:
+            self.flush()
+
+    def flush(self):
+        if not self._touched:
+            return
+        rows = [(at, key) for key, at in self._touched.items()]
+        self._touched = {}
+        with self._factory.connection() as conn:
+            conn.executemany(f"UPDATE {PAGES_SCHEMA} SET last_access = MAX(last_access, ?) WHERE url_key = ?", rows)
+
+    def evict(self):
+        """Drops least recently used entries until bodies fit in EVICT_TO * max_bytes."""
+        self.flush()
+        target = int(self.max_bytes * EVICT_TO)
+        removed = 0
+        with self._factory.connection() as conn:
+            while self.total_bytes > target:
+                # Oldest entries until their bodies cover the excess; shared bodies may free less, so loop.
+                keys, freeing = [], 0
+                for key, size in conn.execute(f'''
+                    SELECT p.url_key, b.size FROM {PAGES_SCHEMA} p JOIN {BODIES_SCHEMA} b ON b.hash = p.body_hash
+                    ORDER BY p.last_access LIMIT 500
+                '''):
+                    keys.append(key)
+                    freeing += size
+                    if self.total_bytes - freeing <= target:
+                        break
+                if not keys:
+                    break
+                placeholders = ", ".join("?" * len(keys))
+                conn.execute(f"DELETE FROM {PAGES_SCHEMA} WHERE url_key IN ({placeholders})", keys)
+                # Bodies still shared with surviving entries stay.
+                conn.execute(f'''
+                    DELETE FROM {BODIES_SCHEMA}
+                    WHERE hash NOT IN (SELECT body_hash FROM {PAGES_SCHEMA})
+                ''')
+                removed += len(keys)
+                self.total_bytes = conn.execute(f"SELECT COALESCE(SUM(size), 0) FROM {BODIES_SCHEMA}").fetchone()[0]
+        logger.info(f"Evicted {removed} cached pages; {self.total_bytes // (1024 * 1024)} MB left.")
+
+    def close(self):
+        # Flushed on the cache thread, after anything async callers still have queued there.
+        self._executor.submit(self.flush).result()
+        self._executor.shutdown(wait=True)
+        total = self.hits + self.misses
+        if total:
+            logger.info(f"Page cache: {self.hits}/{total} hits ({self.hits / total:.0%}), "
+                        f"{self.total_bytes // (1024 * 1024)} MB stored.")
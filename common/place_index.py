@@ -0,0 +1,109 @@
+import hashlib
+import math
+import os
+import re
+from urllib.parse import urlparse
+from .db_factory import DBFactory
+from .logging_config import setup_logger
+
+logger = setup_logger('place_index', '.jules_state/place_index.log')
+
+# Google place ids as they appear in Maps URLs: the ChIJ... id, or the hex feature id.
+PLACE_ID_REGEX = re.compile(r'!19s(ChIJ[\w-]+)|!1s(0x[0-9a-f]+:0x[0-9a-f]+)', re.IGNORECASE)
+
+# Above this many known places a Bloom filter replaces the exact set.
+BLOOM_THRESHOLD = 2_000_000
+BLOOM_ERROR_RATE = 0.001
+
+
+def place_id(url):
+    if not url:
+        return None
+    match = PLACE_ID_REGEX.search(url)
+    if not match:
+        return None
+    return (match.group(1) or match.group(2)).lower()
+
+
+def place_key(url):
+    """Stable identifier for a Maps place URL: its place id, else the URL without query or viewport."""
+    if not url:
+        return None
+    key = place_id(url)
+    if key:
+        return key
+    path = urlparse(url).path
+    # /maps/place/<name>/@lat,lng,zoom/... -> the viewport changes between visits.
+    return path.split('/@')[0].rstrip('/').lower() or url
+
+
+class BloomFilter:
+    """Fixed-size Bloom filter over strings (double hashing over one blake2b digest)."""
+
+    def __init__(self, capacity, error_rate=BLOOM_ERROR_RATE):
+        capacity = max(1, capacity)
+        self.size = max(8, int(-capacity * math.log(error_rate) / (math.log(2) ** 2)))
+        self.hashes = max(1, round(self.size / capacity * math.log(2)))
+        self.bits = bytearray((self.size + 7) // 8)
+
+    def _positions(self, key):
+        digest = hashlib.blake2b(key.encode('utf-8'), digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], 'little')
+        h2 = int.from_bytes(digest[8:], 'little') | 1
+        return ((h1 + i * h2) % self.size for i in range(self.hashes))
+
+    def add(self, key):
+        for pos in self._positions(key):
+            self.bits[pos >> 3] |= 1 << (pos & 7)
+
+    def __contains__(self, key):
+        return all(self.bits[pos >> 3] & (1 << (pos & 7)) for pos in self._positions(key))
+
+
+class KnownPlaces:
+    """Place keys seen before, checked by Maps URL.
+
+    Exact (a set) for normal databases. Past BLOOM_THRESHOLD rows it switches
+    to a Bloom filter sized for twice the loaded count; a false positive then
+    skips a new place with probability about BLOOM_ERROR_RATE.
+    """
+
+    def __init__(self, expected=0, bloom_threshold=BLOOM_THRESHOLD):
+        if expected > bloom_threshold:
+            self._keys = BloomFilter(expected * 2)
+            self.exact = False
+        else:
+            self._keys = set()
+            self.exact = True
+        self.count = 0
+
+    def add(self, url):
+        key = place_key(url)
+        if key:
+            self._keys.add(key)
+            self.count += 1
+
+    def __contains__(self, url):
+        key = place_key(url)
+        return key is not None and key in self._keys
+
+    def __len__(self):
+        return self.count
+
+
+def load_known_places(db_path, schema, column='google_maps_url', bloom_threshold=BLOOM_THRESHOLD):
+    """Loads every place URL already stored in `db_path`. A missing DB gives an empty index."""
+    if not os.path.exists(db_path):
+        return KnownPlaces()
+
+    with DBFactory(db_path, profile='read_only').connection() as conn:
+        exists = conn.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?", (schema,)).fetchone()
+        if not exists:
+            return KnownPlaces()
+        total = conn.execute(f"SELECT COUNT(*) FROM {schema}").fetchone()[0]
+        known = KnownPlaces(total, bloom_threshold)
+        for (url,) in conn.execute(f"SELECT {column} FROM {schema} WHERE {column} IS NOT NULL"):
+            known.add(url)
+
+    logger.info(f"Loaded {len(known)} known places from {db_path} ({'set' if known.exact else 'Bloom filter'}).")
+    return known
@@ -0,0 +1,118 @@
+import json
+import os
+from fnmatch import fnmatch
+from functools import lru_cache
+from urllib.parse import urlparse
+from .logging_config import setup_logger
+
+logger = setup_logger('request_policy', '.jules_state/request_policy.log')
+
+POLICY_PATH = os.path.join(os.path.dirname(__file__), 'request_policies.json')
+
+# Aborted requests never report a size, so savings are estimated from typical
+# transfer sizes per resource type.
+ESTIMATED_BYTES = {
+    "image": 60 * 1024,
+    "media": 500 * 1024,
+    "font": 40 * 1024,
+    "stylesheet": 30 * 1024,
+    "script": 50 * 1024,
+}
+DEFAULT_ESTIMATED_BYTES = 10 * 1024
+
+
+class RouteStats:
+    """Per-page counters of what the policy let through and what it blocked."""
+
+    def __init__(self):
+        self.reset()
+
+    def reset(self):
+        self.allowed_requests = 0
+        self.blocked_requests = 0
+        self.blocked_bytes_est = 0
+        self.blocked_by_type = {}
+
+    def record_block(self, resource_type):
+        self.blocked_requests += 1
+        self.blocked_bytes_est += ESTIMATED_BYTES.get(resource_type, DEFAULT_ESTIMATED_BYTES)
+        self.blocked_by_type[resource_type] = self.blocked_by_type.get(resource_type, 0) + 1
+
+    def summary(self):
+        return (f"allowed {self.allowed_requests}, blocked {self.blocked_requests} requests "
+                f"(~{self.blocked_bytes_est // 1024} KB saved)")
+
+
+class RequestPolicy:
+    """Decides which requests a page may make.
+
+    Requests are aborted if their resource type is blocked (optionally
+    overridden for hosts matching a glob) or their host is blocklisted.
+    """
+
+    def __init__(self, block_resource_types=(), block_hosts=(), domain_overrides=()):
+        self.block_resource_types = frozenset(block_resource_types)
+        self.block_hosts = tuple(h.lower() for h in block_hosts)
+        self.domain_overrides = [
+            (rule["match"].lower(), frozenset(rule["block_resource_types"]))
+            for rule in domain_overrides
+        ]
+
+    def _host_blocked(self, host):
+        return any(host == h or host.endswith("." + h) for h in self.block_hosts)
+
+    def _blocked_types_for(self, host):
+        for pattern, types in self.domain_overrides:
+            if fnmatch(host, pattern):
+                return types
+        return self.block_resource_types
+
+    def should_block(self, resource_type, url):
+        host = (urlparse(url).hostname or "").lower()
+        if self._host_blocked(host):
+            return True
+        return resource_type in self._blocked_types_for(host)
+
+    async def install(self, page):
+        """Routes every request of `page` through the policy. Returns its RouteStats."""
+        stats = RouteStats()
+
+        async def handle(route):
+            request = route.request
+            try:
+                if self.should_block(request.resource_type, request.url):
+                    stats.record_block(request.resource_type)
+                    await route.abort("blockedbyclient")
+                else:
+                    stats.allowed_requests += 1
+                    await route.continue_()
+            except Exception as e:
+                # The page may have navigated away or closed under us.
+                logger.debug(f"Route handling failed for {request.url}: {e}")
+
+        await page.route("**/*", handle)
+        return stats
+
+
+@lru_cache(maxsize=None)
+def load_policies():
+    with open(POLICY_PATH, 'r') as f:
+        return json.load(f)
+
+
+def load_policy(stage):
+    """Builds the RequestPolicy for a stage, layered over the 'default' entry."""
+    try:
+        policies = load_policies()
+    except Exception as e:
+        logger.error(f"Failed to load request policies: {e}")
+        raise
+
+    config = dict(policies.get("default", {}))
+    config.update(policies.get(stage, {}))
+    return RequestPolicy(
+        block_resource_types=config.get("block_resource_types", ()),
+        block_hosts=config.get("block_hosts", ()),
+        domain_overrides=config.get("domain_overrides", ()),
+    )
+
@@ -0,0 +1,173 @@
+"""Streaming pipeline: harvest -> enrich -> aggregate as connected async stages.
+
+Each lead flows to enrichment as soon as it is harvested and into the master
+DB as soon as it is enriched. Bounded queues between the stages provide
+backpressure. raw_leads.db and enriched_data.db are still written as each
+lead passes through, so the batch scripts can replay any stage.
+
+    python main.py "dentists in Austin" "plumbers in Austin" --max-leads 50
+"""
+import argparse
+import asyncio
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+# Add project root to path
+sys.path.append(os.path.abspath(os.path.dirname(__file__)))
+
+from common.batch_writer import BatchWriter
+from common.browser_pool import BrowserPool
+from common.db_factory import DBFactory
+from common.db_utils import init_db
+from common.logging_config import configure_logging, setup_logger
+from common.metrics import METRICS
+from common.page_cache import PageCache
+from common.place_index import load_known_places
+from modules.aggregator.aggregator import (
+    ALIASES_SCHEMA, MASTER_DB_PATH, MASTER_SCHEMA, UPSERT_MASTER_SQL, init_master_db, master_row,
+)
+from modules.aggregator.dedup import dedupe_master
+from modules.enrichment.domain_screen import DomainScreen
+from modules.enrichment.enrichment import (
+    CONCURRENCY, ENRICHED_DB_PATH, ENRICHED_SCHEMA, PAGES_PER_CONTEXT, SAVE_STATEMENTS, USER_AGENT, enrichment_worker,
+)
+from modules.enrichment.freshness import init_freshness_tables
+from modules.enrichment.http_fetcher import create_http_session
+from modules.harvester.harvester import DB_PATH as RAW_DB_PATH, SCHEMA_NAME as RAW_SCHEMA, scrape_google_maps, store_lead
+
+logger = setup_logger('pipeline', 'logs/pipeline.log')
+
+# How far each stage may run ahead of the next one.
+LEAD_QUEUE_SIZE = 100
+MERGE_QUEUE_SIZE = 100
+
+
+def init_enriched_db(conn):
+    init_db(conn, ENRICHED_SCHEMA)
+    init_freshness_tables(conn)
+
+
+async def gather_or_cancel(*aws):
+    """Like asyncio.gather, but once one awaitable fails the rest are cancelled rather than left blocked on a queue."""
+    tasks = [asyncio.ensure_future(aw) for aw in aws]
+    try:
+        return await asyncio.gather(*tasks)
+    finally:
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+
+async def run_pipeline(queries, max_leads=10, concurrency=CONCURRENCY, browsers=1, cache=None):
+    started = time.monotonic()
+    stats = {"harvested": 0, "merged": 0, "first_lead_s": None}
+    tier_counts = {}
+
+    lead_queue = asyncio.Queue(maxsize=LEAD_QUEUE_SIZE)
+    merge_queue = asyncio.Queue(maxsize=MERGE_QUEUE_SIZE)
+
+    loop = asyncio.get_running_loop()
+    known = load_known_places(RAW_DB_PATH, RAW_SCHEMA)
+    # Leads arrive one at a time, so each site is screened as it is dequeued;
+    # hosts already in the negative cache are skipped without a probe.
+    screen = DomainScreen(ENRICHED_DB_PATH)
+    # Raw inserts must return the lead id, so they run one at a time on a
+    # single dedicated thread instead of going through a batch writer.
+    raw_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='raw-leads')
+    enriched_writer = BatchWriter(ENRICHED_DB_PATH, SAVE_STATEMENTS, setup=init_enriched_db, name='enrichment')
+    master_writer = BatchWriter(MASTER_DB_PATH, [UPSERT_MASTER_SQL], setup=init_master_db, name='master')
+    enriched_writer.start()
+    master_writer.start()
+
+    async def on_lead(lead):
+        lead_id = await loop.run_in_executor(raw_executor, store_lead, lead)
+        stats["harvested"] += 1
+        if lead_id is None:
+            return
+        if lead.get('website'):
+            await lead_queue.put((lead_id, lead['website'], lead))
+        else:
+            await merge_queue.put((lead, None))
+        METRICS.gauge('pipeline_queue_depth', lead_queue.qsize(), queue='enrich')
+        METRICS.gauge('pipeline_queue_depth', merge_queue.qsize(), queue='merge')
+
+    async def on_enriched(item, contacts):
+        await merge_queue.put((item[2], contacts))
+
+    # The end-of-stream sentinels are only sent when a stage finishes cleanly;
+    # if a stage fails, gather_or_cancel stops the others instead.
+    async def harvest(pool):
+        for query in queries:
+            logger.info(f"Harvesting: {query}")
+            await scrape_google_maps(query, max_leads, pool, on_lead=on_lead, known=known)
+        for _ in range(concurrency):
+            await lead_queue.put(None)
+
+    async def enrich(pool, session):
+        await gather_or_cancel(*[
+            enrichment_worker(i, pool, session, lead_queue, enriched_writer, PAGES_PER_CONTEXT, tier_counts,
+                              on_result=on_enriched, cache=cache, screen=screen)
+            for i in range(concurrency)
+        ])
+        await merge_queue.put(None)
+
+    async def merge():
+        while True:
+            item = await merge_queue.get()
+            if item is None:
+                break
+            lead, contacts = item
+            master_writer.write(master_row(lead, contacts))
+            stats["merged"] += 1
+            if stats["first_lead_s"] is None:
+                stats["first_lead_s"] = time.monotonic() - started
+                METRICS.gauge('pipeline_first_lead_seconds', round(stats["first_lead_s"], 3))
+                logger.info(f"First lead merged after {stats['first_lead_s']:.1f}s.")
+
+    session = create_http_session(concurrency, USER_AGENT)
+    try:
+        async with BrowserPool(size=browsers) as pool:
+            await gather_or_cancel(harvest(pool), enrich(pool, session), merge())
+    finally:
+        await session.close()
+        await screen.flush_async()
+        await asyncio.to_thread(enriched_writer.close)
+        await asyncio.to_thread(master_writer.close)
+        raw_executor.shutdown(wait=True)
+
+    # Fuzzy dedup needs the whole table, so it runs once at the end.
+    with DBFactory(MASTER_DB_PATH, profile='bulk_load').connection() as conn:
+        dedupe_master(conn, MASTER_SCHEMA, ALIASES_SCHEMA)
+
+    elapsed = time.monotonic() - started
+    METRICS.inc('pipeline_leads_merged_total', stats["merged"])
+    served = ", ".join(f"{tier}={count}" for tier, count in sorted(tier_counts.items(), key=lambda kv: str(kv[0])))
+    logger.info(f"Pipeline finished in {elapsed:.1f}s: harvested {stats['harvested']}, merged {stats['merged']}, "
+                f"fetch tiers: {served or 'none'}.")
+    return stats
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run harvest, enrichment and aggregation as one streaming pipeline.")
+    parser.add_argument("queries", nargs="*", default=["software companies in San Francisco"])
+    parser.add_argument("--max-leads", type=int, default=10)
+    parser.add_argument("--concurrency", type=int, default=CONCURRENCY)
+    parser.add_argument("--browsers", type=int, default=1)
+    parser.add_argument("--cache", action="store_true", help="Keep HTTP-tier pages in the on-disk page cache.")
+    parser.add_argument("--log-json", action="store_true", help="Write log files as JSON lines.")
+    args = parser.parse_args()
+    configure_logging(json_lines=args.log_json)
+
+    cache = PageCache() if args.cache else None
+    try:
+        asyncio.run(run_pipeline(args.queries, args.max_leads, args.concurrency, args.browsers, cache))
+    finally:
+        if cache is not None:
+            cache.close()
+        METRICS.report()
+
+
+if __name__ == "__main__":
+    main()
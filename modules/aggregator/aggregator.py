@@ -1,5 +1,5 @@
-import sqlite3
 import os
+import re
 import sys
 
 # Add project root to path
@@ -8,6 +8,8 @@ sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '../../'
 from common.db_factory import DBFactory
 from common.db_utils import init_db
 from common.logging_config import setup_logger
+from common.metrics import METRICS
+from modules.aggregator.dedup import dedupe_master
 
 logger = setup_logger('aggregator', 'modules/aggregator/aggregator.log')
 
@@ -15,6 +17,8 @@ RAW_DB_PATH = 'modules/harvester/raw_leads.db'
 ENRICHED_DB_PATH = 'modules/enrichment/enriched_data.db'
 MASTER_DB_PATH = 'final_delivery/master_leads.db'
 MASTER_SCHEMA = 'master_leads'
+# business_name of every row dedup merged away -> id of the row it was merged into.
+ALIASES_SCHEMA = 'master_aliases'
 
 def normalize_phone(phone):
     if not phone:
@@ -22,96 +26,141 @@ def normalize_phone(phone):
     # Basic normalization: Keep digits and +, remove spaces, parenthesis, dashes
     # If using E.164, we'd need phonenumbers lib, but keeping it simple as per "Zero Touch" constraint
     # to avoid complex dependency issues unless necessary.
-    import re
     cleaned = re.sub(r'[^\d+]', '', phone)
     return cleaned
 
+MASTER_COLUMNS = "business_name, phone_number, website, email, facebook_url, instagram_url, linkedin_url, address, source_url"
+
+# Shared by the batch merge and the streaming upsert: an existing master row
+# is only replaced when it has no email and the incoming one does.
+MASTER_CONFLICT_SQL = f'''
+    ON CONFLICT(business_name) DO UPDATE SET
+        phone_number = excluded.phone_number,
+        website = excluded.website,
+        email = excluded.email,
+        facebook_url = excluded.facebook_url,
+        instagram_url = excluded.instagram_url,
+        linkedin_url = excluded.linkedin_url,
+        address = excluded.address,
+        source_url = excluded.source_url
+    WHERE {MASTER_SCHEMA}.email IS NULL AND excluded.email IS NOT NULL
+'''
+
+# Latest enrichment per lead, joined onto raw leads. Within one business_name the
+# survivor is the first lead (by id) that has an email, else the first lead -
+# the same "prefer the record with an email" rule as the old row-by-row merge.
+# The conflict target is the unique business_name index from schema_registry.json.
+# Names dedup already merged into another row resolve to that row's name, so
+# they land on it through the usual conflict update (e.g. an email found
+# later) instead of being re-inserted only for dedup to remove them again.
+MERGE_SQL = f'''
+    WITH latest_enrichment AS (
+        SELECT lead_id, email, facebook, instagram, linkedin,
+               ROW_NUMBER() OVER (PARTITION BY lead_id ORDER BY id DESC) AS rn
+        FROM enriched.enrichment
+    ),
+    resolved AS (
+        SELECT l.*, COALESCE(m.business_name, l.name) AS business_name
+        FROM raw.lead_harvest l
+        LEFT JOIN {ALIASES_SCHEMA} a ON a.business_name = l.name
+        LEFT JOIN {MASTER_SCHEMA} m ON m.id = a.master_id
+    ),
+    candidates AS (
+        SELECT l.business_name,
+               normalize_phone(l.phone) AS phone_number,
+               l.website,
+               e.email,
+               e.facebook AS facebook_url,
+               e.instagram AS instagram_url,
+               e.linkedin AS linkedin_url,
+               l.address,
+               l.google_maps_url AS source_url,
+               ROW_NUMBER() OVER (PARTITION BY l.business_name ORDER BY e.email IS NULL, l.id) AS survivor_rank
+        FROM resolved l
+        LEFT JOIN latest_enrichment e ON e.lead_id = l.id AND e.rn = 1
+    )
+    INSERT INTO {MASTER_SCHEMA} ({MASTER_COLUMNS})
+    SELECT {MASTER_COLUMNS}
+    FROM candidates
+    WHERE survivor_rank = 1
+    {MASTER_CONFLICT_SQL}
+'''
+
+# Single-record form of the same merge, for leads arriving one at a time.
+UPSERT_MASTER_SQL = f'''
+    INSERT INTO {MASTER_SCHEMA} ({MASTER_COLUMNS})
+    SELECT COALESCE((
+               SELECT m.business_name FROM {ALIASES_SCHEMA} a JOIN {MASTER_SCHEMA} m ON m.id = a.master_id
+               WHERE a.business_name = ?1
+           ), ?1), ?2, ?3, ?4, ?5, ?6, ?7, ?8, ?9
+    WHERE true
+    {MASTER_CONFLICT_SQL}
+'''
+
+def init_master_db(conn):
+    init_db(conn, MASTER_SCHEMA)
+    init_db(conn, ALIASES_SCHEMA)
+
+def master_row(lead, contacts):
+    """Builds UPSERT_MASTER_SQL parameters from a harvested lead and its contacts."""
+    contacts = contacts or {}
+    return (
+        lead['name'],
+        normalize_phone(lead.get('phone')),
+        lead.get('website'),
+        contacts.get('email'),
+        contacts.get('facebook'),
+        contacts.get('instagram'),
+        contacts.get('linkedin'),
+        lead.get('address'),
+        lead.get('google_maps_url'),
+    )
+
 def aggregate_data():
+    """Merges raw and enriched leads into the master DB. Returns (added, updated, removed), or None on failure."""
     logger.info("Starting Aggregation Phase...")
 
     if not os.path.exists(RAW_DB_PATH) or not os.path.exists(ENRICHED_DB_PATH):
         logger.error("Source databases missing.")
-        return
-
-    # Connect to DBs
-    raw_conn = sqlite3.connect(RAW_DB_PATH)
-    raw_conn.row_factory = sqlite3.Row
-    raw_cursor = raw_conn.cursor()
-
-    enriched_conn = sqlite3.connect(ENRICHED_DB_PATH)
-    enriched_conn.row_factory = sqlite3.Row
-    enriched_cursor = enriched_conn.cursor()
+        return None
 
-    master_factory = DBFactory(MASTER_DB_PATH)
+    master_factory = DBFactory(MASTER_DB_PATH, profile='bulk_load')
     master_conn = master_factory.get_connection()
-    init_db(master_conn, MASTER_SCHEMA)
-    master_cursor = master_conn.cursor()
+    init_master_db(master_conn)
+    master_conn.create_function("normalize_phone", 1, normalize_phone, deterministic=True)
 
     try:
-        # Get all raw leads
-        raw_cursor.execute("SELECT * FROM lead_harvest")
-        raw_leads = raw_cursor.fetchall()
-
-        count_processed = 0
-
-        for lead in raw_leads:
-            lead_id = lead['id']
-
-            # Get enrichment data
-            # We take the LATEST enrichment data if multiple exist (ORDER BY id DESC)
-            enriched_cursor.execute("SELECT * FROM enrichment WHERE lead_id = ? ORDER BY id DESC LIMIT 1", (lead_id,))
-            enrichment = enriched_cursor.fetchone()
-
-            # Prepare Master Record
-            business_name = lead['name']
-            phone_number = normalize_phone(lead['phone'])
-            website = lead['website']
-            address = lead['address']
-            source_url = lead['google_maps_url']
-
-            email = enrichment['email'] if enrichment else None
-            facebook_url = enrichment['facebook'] if enrichment else None
-            instagram_url = enrichment['instagram'] if enrichment else None
-            linkedin_url = enrichment['linkedin'] if enrichment else None
-
-            # Deduplication Check
-            # We check if a record with the same business name and (phone OR website) already exists
-            # Actually, the requirement says "Deduplicate (Priority: Keep entries with Email)"
-            # Since we are iterating and inserting, we can check if it exists.
-
-            # Simple deduplication: Check by Business Name for now (safest unique identifier usually, though imperfect)
-            # Or Google Maps URL if we want strictly unique locations.
-
-            master_cursor.execute("SELECT id, email FROM master_leads WHERE business_name = ?", (business_name,))
-            existing = master_cursor.fetchone()
-
-            if existing:
-                # If existing has no email but new one does, update it
-                if not existing[1] and email:
-                    logger.info(f"Updating existing record {business_name} with email.")
-                    master_cursor.execute('''
-                        UPDATE master_leads SET
-                            phone_number = ?, website = ?, email = ?, facebook_url = ?, instagram_url = ?, linkedin_url = ?, address = ?, source_url = ?
-                        WHERE id = ?
-                    ''', (phone_number, website, email, facebook_url, instagram_url, linkedin_url, address, source_url, existing[0]))
-                else:
-                    logger.info(f"Skipping duplicate: {business_name}")
-            else:
-                master_cursor.execute('''
-                    INSERT INTO master_leads (business_name, phone_number, website, email, facebook_url, instagram_url, linkedin_url, address, source_url)
-                    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
-                ''', (business_name, phone_number, website, email, facebook_url, instagram_url, linkedin_url, address, source_url))
-                count_processed += 1
-
-        master_conn.commit()
-        logger.info(f"Aggregation complete. Processed {len(raw_leads)} raw leads. Added {count_processed} new records.")
+        master_conn.execute("ATTACH DATABASE ? AS raw", (RAW_DB_PATH,))
+        master_conn.execute("ATTACH DATABASE ? AS enriched", (ENRICHED_DB_PATH,))
+
+        raw_count = master_conn.execute("SELECT COUNT(*) FROM raw.lead_harvest").fetchone()[0]
+        before = master_conn.execute(f"SELECT COUNT(*) FROM {MASTER_SCHEMA}").fetchone()[0]
+        changes_before = master_conn.total_changes
+
+        # One transaction for the whole merge, including fuzzy dedup.
+        with master_conn:
+            with METRICS.timer('aggregator_phase_seconds', phase='merge'):
+                master_conn.execute(MERGE_SQL)
+            after = master_conn.execute(f"SELECT COUNT(*) FROM {MASTER_SCHEMA}").fetchone()[0]
+            added = after - before
+            updated = master_conn.total_changes - changes_before - added
+            with METRICS.timer('aggregator_phase_seconds', phase='dedup'):
+                removed = dedupe_master(master_conn, MASTER_SCHEMA, ALIASES_SCHEMA)
+        METRICS.inc('aggregator_raw_leads_total', raw_count)
+        METRICS.inc('aggregator_records_total', added, change='added')
+        METRICS.inc('aggregator_records_total', updated, change='updated')
+        METRICS.inc('aggregator_records_total', removed, change='deduplicated')
+
+        logger.info(f"Aggregation complete. Processed {raw_count} raw leads. Added {added} new records, updated {updated} with email, merged away {removed} duplicates.")
+        return added, updated, removed
 
     except Exception as e:
         logger.error(f"Aggregation failed: {e}")
+        return None
     finally:
-        raw_conn.close()
-        enriched_conn.close()
         master_conn.close()
 
 if __name__ == "__main__":
-    aggregate_data()
+    with METRICS.timer('aggregator_run_seconds'):
+        aggregate_data()
+    METRICS.report()
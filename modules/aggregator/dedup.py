@@ -0,0 +1,245 @@
+import re
+import sys
+import os
+import unicodedata
+from collections import defaultdict, namedtuple
+from urllib.parse import parse_qs, urlparse
+
+# Add project root to path
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '../../')))
+
+from common.batch_writer import executemany_in_batches
+from common.logging_config import setup_logger
+from common.place_index import place_id
+
+logger = setup_logger('dedup', 'modules/aggregator/aggregator.log')
+
+# Blocks bigger than this are chains or junk keys ("pizza", a shared switchboard
+# number); comparing inside them is quadratic and rarely finds true duplicates.
+MAX_BLOCK_SIZE = 100
+
+NAME_STOPWORDS = frozenset({
+    "the", "and", "of", "inc", "llc", "ltd", "co", "corp", "corporation",
+    "company", "limited", "plc", "gmbh", "pllc", "lp", "llp",
+})
+
+# Hosts shared by many unrelated businesses. Their registrable domain says
+# nothing, so the full host (plus first path segment) is used instead.
+SHARED_HOSTS = frozenset({
+    "wixsite.com", "squarespace.com", "business.site", "wordpress.com",
+    "blogspot.com", "godaddysites.com", "square.site", "weebly.com",
+    "facebook.com", "instagram.com", "linktr.ee", "google.com", "sites.google.com",
+})
+
+# Second-level labels under which registrations happen (example.co.uk).
+SECOND_LEVEL_SUFFIXES = frozenset({"co", "com", "net", "org", "gov", "ac", "edu"})
+
+NON_ALNUM_REGEX = re.compile(r'[^a-z0-9]+')
+
+DedupRecord = namedtuple('DedupRecord', 'id name phone website source_url has_email')
+Features = namedtuple('Features', 'tokens phone domain place_id')
+
+
+def name_tokens(name):
+    if not name:
+        return frozenset()
+    text = unicodedata.normalize('NFKD', name).encode('ascii', 'ignore').decode('ascii').lower()
+    text = text.replace("&", " and ").replace("'", "")
+    return frozenset(t for t in NON_ALNUM_REGEX.split(text) if t and t not in NAME_STOPWORDS)
+
+
+def normalize_phone_key(phone):
+    digits = re.sub(r'\D', '', phone or '')
+    if len(digits) < 7:
+        return None
+    return digits[-10:]
+
+
+def registrable_domain(website):
+    if not website:
+        return None
+    if "/url?q=" in website:
+        website = parse_qs(urlparse(website).query).get('q', [website])[0]
+    if "://" not in website:
+        website = "http://" + website
+    parsed = urlparse(website)
+    host = (parsed.hostname or "").lower()
+    if host.startswith("www."):
+        host = host[4:]
+    if not host or "." not in host:
+        return None
+
+    labels = host.split(".")
+    keep = 3 if len(labels) >= 3 and labels[-2] in SECOND_LEVEL_SUFFIXES and len(labels[-1]) == 2 else 2
+    domain = ".".join(labels[-keep:])
+
+    if domain in SHARED_HOSTS or host in SHARED_HOSTS:
+        first_segment = parsed.path.strip("/").split("/")[0].lower()
+        return f"{host}/{first_segment}" if first_segment else host
+    return domain
+
+
+def features(record):
+    return Features(
+        tokens=name_tokens(record.name),
+        phone=normalize_phone_key(record.phone),
+        domain=registrable_domain(record.website),
+        place_id=place_id(record.source_url),
+    )
+
+
+def blocking_keys(feat):
+    keys = []
+    if feat.place_id:
+        keys.append(("g", feat.place_id))
+    if feat.phone:
+        keys.append(("p", feat.phone))
+    if feat.domain:
+        keys.append(("d", feat.domain))
+    if feat.tokens:
+        keys.append(("n", " ".join(sorted(feat.tokens))))
+    return keys
+
+
+def _jaccard(a, b):
+    if not a or not b:
+        return 0.0
+    return len(a & b) / len(a | b)
+
+
+def _conflicts(a, b):
+    return a is not None and b is not None and a != b
+
+
+def is_match(a, b):
+    """Pairwise rule applied to records that share at least one block."""
+    if a.place_id and a.place_id == b.place_id:
+        return True
+
+    similarity = _jaccard(a.tokens, b.tokens)
+    same_phone = a.phone is not None and a.phone == b.phone
+    same_domain = a.domain is not None and a.domain == b.domain
+
+    if same_phone:
+        return same_domain or similarity >= 0.3
+    if same_domain:
+        # Chains share a domain across locations; different phones mean different places.
+        return similarity >= 0.5 and not _conflicts(a.phone, b.phone)
+    if a.tokens and a.tokens == b.tokens:
+        return not _conflicts(a.phone, b.phone) and not _conflicts(a.domain, b.domain)
+    return False
+
+
+class UnionFind:
+    def __init__(self):
+        self.parent = {}
+
+    def find(self, x):
+        parent = self.parent.setdefault(x, x)
+        if parent != x:
+            # Path halving keeps trees shallow without recursion.
+            while self.parent[x] != x:
+                self.parent[x] = self.parent[self.parent[x]]
+                x = self.parent[x]
+        return x
+
+    def union(self, a, b):
+        root_a, root_b = self.find(a), self.find(b)
+        if root_a != root_b:
+            self.parent[max(root_a, root_b)] = min(root_a, root_b)
+
+
+def find_clusters(records, max_block_size=MAX_BLOCK_SIZE):
+    """Groups records describing the same business.
+
+    Returns a list of id lists, one per cluster with more than one record.
+    Work is linear in the number of records plus the (bounded) pairwise
+    comparisons inside each block.
+    """
+    feats = {}
+    blocks = defaultdict(list)
+    for record in records:
+        feat = features(record)
+        feats[record.id] = feat
+        for key in blocking_keys(feat):
+            blocks[key].append(record.id)
+
+    uf = UnionFind()
+    skipped = 0
+    for key, ids in blocks.items():
+        if len(ids) < 2:
+            continue
+        if len(ids) > max_block_size:
+            skipped += 1
+            continue
+        for i, a in enumerate(ids):
+            for b in ids[i + 1:]:
+                if uf.find(a) != uf.find(b) and is_match(feats[a], feats[b]):
+                    uf.union(a, b)
+
+    if skipped:
+        logger.info(f"Skipped {skipped} oversized blocks (> {max_block_size} records).")
+
+    clusters = defaultdict(list)
+    for record_id in uf.parent:
+        clusters[uf.find(record_id)].append(record_id)
+    return [sorted(ids) for ids in clusters.values() if len(ids) > 1]
+
+
+def choose_survivor(records):
+    """Prefer the record with an email; ties go to the oldest (lowest id)."""
+    return min(records, key=lambda r: (not r.has_email, r.id))
+
+
+MERGE_COLUMNS = ("phone_number", "website", "email", "facebook_url", "instagram_url", "linkedin_url", "address", "source_url")
+
+
+def _fetch_rows(conn, schema, ids, chunk_size=500):
+    columns = ", ".join(("id",) + MERGE_COLUMNS)
+    rows = {}
+    for start in range(0, len(ids), chunk_size):
+        chunk = ids[start:start + chunk_size]
+        placeholders = ", ".join("?" * len(chunk))
+        for row in conn.execute(f"SELECT {columns} FROM {schema} WHERE id IN ({placeholders})", chunk):
+            rows[row[0]] = row[1:]
+    return rows
+
+
+def dedupe_master(conn, schema='master_leads', aliases='master_aliases'):
+    """Collapses duplicate businesses in the master table. The caller commits.
+
+    The survivor keeps its own values and borrows any field it is missing from
+    the other members of its cluster (lowest id first). Each removed row's
+    business_name is recorded in `aliases` against the survivor's id, so later
+    merges of that name update the survivor instead of inserting it again.
+    Returns the number of rows removed.
+    """
+    cursor = conn.execute(f"SELECT id, business_name, phone_number, website, source_url, email IS NOT NULL FROM {schema}")
+    records = {row[0]: DedupRecord(*row) for row in cursor}
+    clusters = find_clusters(records.values())
+
+    rows = _fetch_rows(conn, schema, [i for ids in clusters for i in ids])
+    updates, deletions, alias_rows = [], [], []
+    for ids in clusters:
+        survivor = choose_survivor([records[i] for i in ids])
+        others = [i for i in ids if i != survivor.id]
+        merged = list(rows[survivor.id])
+        for other in others:
+            merged = [value if value is not None else rows[other][k] for k, value in enumerate(merged)]
+        updates.append(tuple(merged) + (survivor.id,))
+        deletions.extend((i,) for i in others)
+        alias_rows.extend((records[i].name, survivor.id) for i in others)
+
+    assignments = ", ".join(f"{col} = ?" for col in MERGE_COLUMNS)
+    executemany_in_batches(conn, f"UPDATE {schema} SET {assignments} WHERE id = ?", updates)
+    executemany_in_batches(conn, f"DELETE FROM {schema} WHERE id = ?", deletions)
+    # Names that pointed at a row removed just now follow it to its survivor.
+    executemany_in_batches(conn, f"UPDATE {aliases} SET master_id = ? WHERE master_id = ?",
+                           [(survivor_id, row[0]) for row, (_, survivor_id) in zip(deletions, alias_rows)])
+    executemany_in_batches(conn, f'''
+        INSERT INTO {aliases} (business_name, master_id) VALUES (?, ?)
+        ON CONFLICT(business_name) DO UPDATE SET master_id = excluded.master_id
+    ''', alias_rows)
+
+    logger.info(f"Dedup: {len(clusters)} duplicate clusters, removed {len(deletions)} rows.")
+    return len(deletions)
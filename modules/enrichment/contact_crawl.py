@@ -0,0 +1,106 @@
+import asyncio
+import sys
+import os
+import time
+from urllib.parse import urldefrag, urlparse
+
+# Add project root to path
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '../../')))
+
+from common.logging_config import setup_logger
+
+logger = setup_logger('contact_crawl', 'modules/enrichment/enrichment.log')
+
+# Per-site budget: extra pages fetched after the landing page, and total seconds
+# (landing page included) before whatever is still in flight is abandoned.
+MAX_PAGES = 4
+BUDGET_SECONDS = 12.0
+
+# Path fragments that suggest contact details, with their weight. Links that
+# match none of them are not crawled.
+LINK_HINTS = (
+    ("contact", 10), ("kontakt", 10), ("contacto", 10), ("contatti", 10),
+    ("impressum", 9), ("imprint", 8), ("mentions-legales", 8),
+    ("about", 6), ("uber-uns", 6), ("ueber-uns", 6), ("quienes-somos", 6),
+    ("team", 4), ("staff", 4), ("people", 3), ("location", 3), ("find-us", 3),
+    ("support", 2), ("legal", 2), ("privacy", 1),
+)
+
+ASSET_EXTENSIONS = (
+    ".pdf", ".jpg", ".jpeg", ".png", ".gif", ".svg", ".webp", ".ico", ".css", ".js",
+    ".zip", ".mp4", ".mp3", ".doc", ".docx", ".xls", ".xlsx",
+)
+
+
+def _host(url):
+    host = (urlparse(url).hostname or "").lower()
+    return host[4:] if host.startswith("www.") else host
+
+
+def link_score(url):
+    path = urlparse(url).path.lower()
+    if path.endswith(ASSET_EXTENSIONS):
+        return 0
+    return max((weight for hint, weight in LINK_HINTS if hint in path), default=0)
+
+
+def rank_links(links, base_url, limit=MAX_PAGES):
+    """Same-site links most likely to carry contact details, best first."""
+    base_host = _host(base_url)
+    base_page = urldefrag(base_url)[0].rstrip("/")
+    scored = {}
+    for link in links:
+        if not link or not link.startswith(("http://", "https://")):
+            continue
+        link = urldefrag(link)[0]
+        if _host(link) != base_host or link.rstrip("/") == base_page:
+            continue
+        score = link_score(link)
+        if score:
+            # Shallow pages first among equals: /contact beats /blog/2019/contact-us-day.
+            depth = urlparse(link).path.strip("/").count("/")
+            scored[link] = max(scored.get(link, (0, 0)), (score, -depth))
+    ranked = sorted(scored, key=lambda link: scored[link], reverse=True)
+    return ranked[:limit]
+
+
+async def crawl_site(contacts, base_url, links, fetch_page, find, is_complete, deadline, max_pages=MAX_PAGES):
+    """Fetches the best-ranked contact pages concurrently until the site is complete or out of budget.
+
+    `fetch_page(url)` returns (final_url, content); `await find(contacts,
+    content, source)` merges what a page holds into `contacts`. Crawled pages'
+    own links are not followed, so fetchers don't collect them.
+    Returns the number of extra pages that were read.
+    """
+    if is_complete(contacts):
+        return 0
+    targets = rank_links(links, base_url, max_pages)
+    if not targets:
+        return 0
+
+    tasks = {asyncio.ensure_future(fetch_page(url)): url for url in targets}
+    pages_read = 0
+    try:
+        pending = set(tasks)
+        while pending:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                logger.info(f"Crawl budget spent on {base_url}; dropping {len(pending)} pages.", extra={"sample": "crawl_budget"})
+                break
+            done, pending = await asyncio.wait(pending, timeout=remaining, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                try:
+                    final_url, content = task.result()
+                except Exception as e:
+                    logger.debug(f"Crawl fetch of {tasks[task]} failed: {e}")
+                    continue
+                pages_read += 1
+                await find(contacts, content, final_url)
+            if is_complete(contacts):
+                break
+    finally:
+        for task in tasks:
+            if not task.done():
+                task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+    return pages_read
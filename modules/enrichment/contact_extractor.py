@@ -0,0 +1,234 @@
+"""Single-pass contact extraction from raw HTML.
+
+One compiled pattern walks the document once and yields mailto links, plain
+and obfuscated emails ("info [at] shop [dot] com", "&#64;") and social
+profile URLs, in text and href attributes alike. Candidates are then
+filtered for asset names, placeholders and tracking ids. Large documents can
+be handed to a process pool so regex work doesn't stall the event loop.
+"""
+import asyncio
+import atexit
+import multiprocessing
+import re
+import sys
+import os
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor
+from urllib.parse import unquote
+
+# Add project root to path
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '../../')))
+
+from common.logging_config import setup_logger
+
+logger = setup_logger('contact_extractor', 'modules/enrichment/enrichment.log')
+
+# Documents at least this long (in characters) are scanned in the process pool.
+OFFLOAD_CHARS = 256 * 1024
+EXTRACT_WORKERS = max(1, (os.cpu_count() or 2) // 2)
+
+# One scan of the document stops only where a contact can be: an @ (or its
+# entity / URL-encoded / "[at]" forms), a mailto: or a ".com/" path. The
+# candidate around each hit is then read with small anchored patterns, so the
+# cost is one pass plus work proportional to the hits, not to the page size.
+ANCHOR_PATTERN = re.compile(r'@|&#(?:0*64|[xX]0*40);|%40|[\[\(\{] ?(?:at|AT|At) ?[\]\)\}]|mailto:|\.com/')
+
+_DOT = r'(?:\.|\s?[\[\(\{] ?(?:dot|DOT|Dot) ?[\]\)\}]\s?)'
+MAILTO_VALUE = re.compile(r'[^"\'<>\s?&]+')
+EMAIL_DOMAIN = re.compile(rf' ?((?:[A-Za-z0-9-]+{_DOT})+[A-Za-z]{{2,24}})\b')
+SOCIAL_PREFIX = re.compile(r'(?:https?:)?//(?:[A-Za-z0-9-]+\.)*(facebook|fb|instagram|linkedin)$', re.IGNORECASE)
+SOCIAL_PATH = re.compile(r'[^\s"\'<>\\)]*')
+
+LOCAL_CHARS = frozenset("abcdefghijklmnopqrstuvwxyzABCDEFGHIJKLMNOPQRSTUVWXYZ0123456789._%+-")
+MAX_LOCAL_CHARS = 64
+MAX_SOCIAL_PREFIX_CHARS = 80
+
+AT_SEPARATOR = re.compile(r'&#(?:0*64|[xX]0*40);|%40| ?[\[\(\{] ?(?:at|AT|At) ?[\]\)\}] ?')
+DOT_SEPARATOR = re.compile(_DOT)
+SOCIAL_URL = re.compile(r'(?:https?:)?//(?:[A-Za-z0-9-]+\.)*(facebook|fb|instagram|linkedin)\.com/', re.IGNORECASE)
+VALID_EMAIL = re.compile(r'^[a-z0-9._%+-]+@(?:[a-z0-9-]+\.)+[a-z]{2,24}$', re.IGNORECASE)
+# JSON-escaped markup (">info@shop.com") leaves the escape glued to the local part.
+ESCAPE_PREFIX = re.compile(r'^(?:u00[0-9a-f]{2})+', re.IGNORECASE)
+HEX_ID = re.compile(r'^[0-9a-f]{16,}$', re.IGNORECASE)
+
+# "logo@2x.png" and friends: the final label is a file extension, not a TLD.
+ASSET_SUFFIXES = frozenset({
+    "png", "jpg", "jpeg", "gif", "svg", "webp", "bmp", "ico", "avif", "css", "js", "mjs",
+    "map", "json", "woff", "woff2", "ttf", "eot", "otf", "mp4", "webm", "mp3", "pdf",
+})
+PLACEHOLDER_DOMAINS = frozenset({
+    "example.com", "example.org", "example.net", "domain.com", "yourdomain.com", "yoursite.com",
+    "email.com", "mysite.com", "company.com", "sentry.io", "wixpress.com", "sentry-next.wixpress.com",
+})
+PLACEHOLDER_LOCALS = frozenset({"name", "email", "your-email", "youremail", "user", "username", "test"})
+
+# Share buttons, pixels and namespaces rather than a business's own profile.
+SOCIAL_NOISE = {
+    "facebook": ("sharer", "share", "plugins", "dialog", "tr", "2008", "login", "events", "groups", "watch", "hashtag"),
+    "instagram": ("explore", "accounts", "p", "reel", "developer"),
+    "linkedin": ("sharearticle", "sharing", "feed", "login", "jobs"),
+}
+
+Candidates = namedtuple('Candidates', 'emails facebook instagram linkedin')
+
+
+def clean_email(raw):
+    email = AT_SEPARATOR.sub("@", raw, count=1) if "@" not in raw else raw
+    email = DOT_SEPARATOR.sub(".", email).strip(" .").lower()
+    email = ESCAPE_PREFIX.sub("", email)
+    if not VALID_EMAIL.match(email):
+        return None
+    local, domain = email.rsplit("@", 1)
+    if domain.rsplit(".", 1)[-1] in ASSET_SUFFIXES:
+        return None
+    if local in PLACEHOLDER_LOCALS or HEX_ID.match(local):
+        return None
+    if any(domain == d or domain.endswith("." + d) for d in PLACEHOLDER_DOMAINS):
+        return None
+    return email
+
+
+def _local_part(html, end):
+    """The run of local-part characters ending at `end` (one space before an "[at]" allowed)."""
+    if end > 0 and html[end - 1] == " ":
+        end -= 1
+    start = end
+    limit = max(0, end - MAX_LOCAL_CHARS)
+    while start > limit and html[start - 1] in LOCAL_CHARS:
+        start -= 1
+    return html[start:end]
+
+
+def clean_social(url, network):
+    network = "facebook" if network.lower() == "fb" else network.lower()
+    url = url.rstrip(".,;:'\"")
+    if url.startswith("//"):
+        url = "https:" + url
+    path = url.split(".com/", 1)[1] if ".com/" in url else ""
+    first_segment = path.split("/")[0].split("?")[0].lower()
+    if not first_segment or first_segment.endswith(".php") or first_segment in SOCIAL_NOISE[network]:
+        return None, network
+    return url, network
+
+
+def extract_candidates(html):
+    """Scans `html` once. Returns Candidates with deduplicated values in document order."""
+    found = {"emails": {}, "facebook": {}, "instagram": {}, "linkedin": {}}
+    consumed = 0
+    for match in ANCHOR_PATTERN.finditer(html):
+        start, end = match.span()
+        if start < consumed:
+            continue
+        anchor = match.group()
+
+        if anchor == "mailto:":
+            value = MAILTO_VALUE.match(html, end)
+            if value:
+                consumed = value.end()
+                email = clean_email(unquote(value.group()))
+                if email:
+                    found["emails"].setdefault(email, None)
+
+        elif anchor == ".com/":
+            prefix = SOCIAL_PREFIX.search(html, max(0, start - MAX_SOCIAL_PREFIX_CHARS), start)
+            if prefix:
+                path = SOCIAL_PATH.match(html, end)
+                consumed = path.end()
+                url, network = clean_social(prefix.group() + ".com/" + path.group(), prefix.group(1))
+                if url:
+                    found[network].setdefault(url, None)
+
+        else:
+            local = _local_part(html, start)
+            domain = EMAIL_DOMAIN.match(html, end)
+            if local and domain:
+                consumed = domain.end()
+                email = clean_email(f"{local}@{domain.group(1)}")
+                if email:
+                    found["emails"].setdefault(email, None)
+
+    return Candidates(*(list(found[key]) for key in Candidates._fields))
+
+
+def filter_candidates(emails, socials):
+    """Applies the same cleaning as extract_candidates to raw matches found elsewhere (in the page)."""
+    found = {"emails": {}, "facebook": {}, "instagram": {}, "linkedin": {}}
+    for raw in emails:
+        email = clean_email(unquote(raw))
+        if email:
+            found["emails"].setdefault(email, None)
+    for raw in socials:
+        match = SOCIAL_URL.match(raw)
+        if match:
+            url, network = clean_social(raw, match.group(1))
+            if url:
+                found[network].setdefault(url, None)
+    return Candidates(*(list(found[key]) for key in Candidates._fields))
+
+
+# Runs the matching inside the page so only a handful of raw candidates cross
+# CDP instead of the serialized DOM and every href. Links come back only if
+# they are same-site and their path contains one of `hints`.
+IN_PAGE_EXTRACT_JS = r"""([hints, limit]) => {
+    const html = document.documentElement.outerHTML;
+    const EMAIL = /(?<![A-Za-z0-9._%+-])[A-Za-z0-9._%+-]+(?:@|&#0*64;|&#x0*40;|%40| ?[\[\(\{] ?at ?[\]\)\}] ?)(?:[A-Za-z0-9-]+(?:\.| ?[\[\(\{] ?dot ?[\]\)\}] ?))+[A-Za-z]{2,24}/gi;
+    const SOCIAL = /(?:https?:)?\/\/(?:[A-Za-z0-9-]+\.)*(?:facebook|fb|instagram|linkedin)\.com\/[^\s"'<>\)]*/gi;
+    const emails = new Set();
+    const socials = new Set();
+    const links = new Set();
+    for (const m of html.matchAll(EMAIL)) {
+        if (emails.size >= limit) break;
+        emails.add(m[0]);
+    }
+    for (const m of html.matchAll(SOCIAL)) {
+        if (socials.size >= limit) break;
+        socials.add(m[0]);
+    }
+    const host = location.hostname.replace(/^www\./, '');
+    const anchors = document.querySelectorAll('a[href]');
+    for (const a of anchors) {
+        if (a.protocol === 'mailto:') {
+            if (emails.size < limit) emails.add(a.href.slice(7).split('?')[0]);
+        } else if (links.size < limit && a.hostname.replace(/^www\./, '') === host) {
+            const path = a.pathname.toLowerCase();
+            if (hints.some(h => path.includes(h))) links.add(a.href.split('#')[0]);
+        }
+    }
+    return {
+        emails: [...emails], socials: [...socials], links: [...links],
+        bytes_scanned: html.length, anchors_seen: anchors.length,
+    };
+}"""
+IN_PAGE_LIMIT = 50
+
+
+async def extract_in_page(page, link_hints=(), limit=IN_PAGE_LIMIT):
+    """Matches contacts inside `page`. Returns (candidates, links, counters).
+
+    `links` holds only same-site hrefs whose path contains one of `link_hints`;
+    counters has bytes_scanned and anchors_seen.
+    """
+    found = await page.evaluate(IN_PAGE_EXTRACT_JS, [list(link_hints), limit])
+    candidates = filter_candidates(found["emails"], found["socials"])
+    counters = {"bytes_scanned": found["bytes_scanned"], "anchors_seen": found["anchors_seen"]}
+    return candidates, found["links"], counters
+
+
+_executor = None
+
+
+def _get_executor():
+    global _executor
+    if _executor is None:
+        # spawn: forking a process that runs writer threads and an event loop is unsafe.
+        _executor = ProcessPoolExecutor(max_workers=EXTRACT_WORKERS, mp_context=multiprocessing.get_context('spawn'))
+        atexit.register(_executor.shutdown, wait=False, cancel_futures=True)
+    return _executor
+
+
+async def extract_candidates_async(html, offload_chars=OFFLOAD_CHARS):
+    """extract_candidates, run in the process pool for documents of `offload_chars` or more."""
+    if len(html) < offload_chars:
+        return extract_candidates(html)
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_get_executor(), extract_candidates, html)
@@ -0,0 +1,215 @@
+"""Dead-domain pre-screen for lead websites.
+
+Many Maps listings point at expired or parked domains. Before a site gets an
+HTTP fetch or a browser page, its hostname is resolved and its port probed
+(TCP, plus a TLS handshake for https) with short timeouts, many hosts at a
+time. Hosts that fail are kept in a negative cache with a per-reason expiry,
+so later runs skip them without probing again.
+
+The resolver and probe are plain coroutines passed to DomainScreen, so tests
+and benchmarks can swap in stubs:
+
+    resolver(host, timeout) -> (addresses, reason)   # reason None when resolved
+    probe(host, address, port, use_tls, timeout) -> reason or None
+"""
+import asyncio
+import socket
+import ssl
+import sys
+import os
+import time
+from urllib.parse import urlparse
+
+# Add project root to path
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '../../')))
+
+from common.db_factory import DBFactory
+from common.db_utils import init_db
+from common.logging_config import setup_logger
+
+logger = setup_logger('domain_screen', 'modules/enrichment/enrichment.log')
+
+DEAD_SCHEMA = 'dead_domains'
+
+DNS_TIMEOUT = 3.0
+CONNECT_TIMEOUT = 4.0
+SCREEN_CONCURRENCY = 200
+# Addresses tried per host before it counts as unreachable.
+MAX_ADDRESSES = 2
+# New dead hosts are written to the negative cache this many at a time.
+FLUSH_EVERY = 50
+
+REASON_NXDOMAIN = 'nxdomain'
+REASON_DNS = 'dns'
+REASON_REFUSED = 'refused'
+REASON_TIMEOUT = 'timeout'
+REASON_TLS = 'tls'
+
+# How long a dead verdict is trusted. A missing domain rarely comes back; a
+# timeout may be our own network, so it is re-checked soon.
+DEAD_TTL_DAYS = {
+    REASON_NXDOMAIN: 30,
+    REASON_DNS: 1,
+    REASON_REFUSED: 7,
+    REASON_TIMEOUT: 1,
+    REASON_TLS: 7,
+}
+
+NXDOMAIN_ERRORS = {getattr(socket, name) for name in ('EAI_NONAME', 'EAI_NODATA') if hasattr(socket, name)}
+
+
+def site_address(url):
+    """(host, port, use_tls) for a website URL, or None if it has no host."""
+    if "://" not in url:
+        url = "http://" + url
+    parsed = urlparse(url.strip())
+    host = (parsed.hostname or "").lower().rstrip(".")
+    if not host:
+        return None
+    use_tls = parsed.scheme == "https"
+    try:
+        port = parsed.port or (443 if use_tls else 80)
+    except ValueError:
+        return None
+    return host, port, use_tls
+
+
+async def resolve_host(host, timeout=DNS_TIMEOUT):
+    """Default resolver: the system's getaddrinfo, bounded by `timeout`."""
+    loop = asyncio.get_running_loop()
+    try:
+        infos = await asyncio.wait_for(loop.getaddrinfo(host, None, type=socket.SOCK_STREAM), timeout)
+    except asyncio.TimeoutError:
+        return [], REASON_TIMEOUT
+    except socket.gaierror as e:
+        return [], REASON_NXDOMAIN if e.errno in NXDOMAIN_ERRORS else REASON_DNS
+    except (OSError, UnicodeError):
+        return [], REASON_DNS
+    addresses = list(dict.fromkeys(info[4][0] for info in infos))
+    return addresses, None if addresses else REASON_NXDOMAIN
+
+
+def _probe_ssl_context():
+    # Only the handshake matters here; certificate problems are for the fetchers to judge.
+    context = ssl.create_default_context()
+    context.check_hostname = False
+    context.verify_mode = ssl.CERT_NONE
+    return context
+
+
+_SSL_CONTEXT = _probe_ssl_context()
+
+
+async def probe_host(host, address, port, use_tls, timeout=CONNECT_TIMEOUT):
+    """Default probe: opens a TCP connection (and TLS session) and closes it again."""
+    try:
+        _, writer = await asyncio.wait_for(asyncio.open_connection(
+            address, port,
+            ssl=_SSL_CONTEXT if use_tls else None,
+            server_hostname=host if use_tls else None,
+        ), timeout)
+    except asyncio.TimeoutError:
+        return REASON_TIMEOUT
+    except ssl.SSLError:
+        return REASON_TLS
+    except OSError:
+        return REASON_REFUSED
+    writer.close()
+    try:
+        await writer.wait_closed()
+    except (OSError, ssl.SSLError):
+        pass
+    return None
+
+
+class DomainScreen:
+    """Decides which lead websites are worth a fetch, backed by a negative cache in `db_path`.
+
+    Verdicts are memoized for the life of the object, and an endpoint is
+    probed at most once even when several leads ask for it at the same time.
+    DNS failures are cached under the bare host, connect and TLS failures
+    under "host:port", so one closed port doesn't condemn the whole host.
+    """
+
+    def __init__(self, db_path, resolver=resolve_host, probe=probe_host, concurrency=SCREEN_CONCURRENCY,
+                 dns_timeout=DNS_TIMEOUT, connect_timeout=CONNECT_TIMEOUT):
+        self.resolver = resolver
+        self.probe = probe
+        self.dns_timeout = dns_timeout
+        self.connect_timeout = connect_timeout
+        self.stats = {"cached": 0, "probed": 0, "dead": 0}
+        self._concurrency = concurrency
+        self._semaphore = None
+        self._factory = DBFactory(db_path)
+        self._verdicts = {}
+        self._pending_writes = []
+        with self._factory.connection() as conn:
+            init_db(conn, DEAD_SCHEMA)
+            now = time.time()
+            conn.execute(f"DELETE FROM {DEAD_SCHEMA} WHERE expires_at <= ?", (now,))
+            self._dead = dict(conn.execute(f"SELECT host, reason FROM {DEAD_SCHEMA}").fetchall())
+        logger.info(f"Negative cache holds {len(self._dead)} dead hosts.")
+
+    async def _probe(self, host, port, use_tls):
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self._concurrency)
+        async with self._semaphore:
+            self.stats["probed"] += 1
+            addresses, reason = await self.resolver(host, self.dns_timeout)
+            key = host
+            for address in addresses[:MAX_ADDRESSES]:
+                reason = await self.probe(host, address, port, use_tls, self.connect_timeout)
+                key = f"{host}:{port}"
+                if reason is None:
+                    return None
+        if reason is not None:
+            self.stats["dead"] += 1
+            self._dead[key] = reason
+            now = time.time()
+            self._pending_writes.append((key, reason, now, now + DEAD_TTL_DAYS[reason] * 86400))
+            if len(self._pending_writes) >= FLUSH_EVERY:
+                await self.flush_async()
+        return reason
+
+    async def check(self, url):
+        """Returns why `url`'s host is dead, or None if it looks alive (or can't be parsed)."""
+        address = site_address(url) if url else None
+        if address is None:
+            return None
+        host, port, use_tls = address
+        cached = self._dead.get(host) or self._dead.get(f"{host}:{port}")
+        if cached:
+            self.stats["cached"] += 1
+            return cached
+        key = (host, port, use_tls)
+        if key not in self._verdicts:
+            self._verdicts[key] = asyncio.ensure_future(self._probe(host, port, use_tls))
+        return await self._verdicts[key]
+
+    async def screen(self, urls):
+        """Checks many websites at once. Returns {url: reason} for the dead ones."""
+        unique = list(dict.fromkeys(url for url in urls if url))
+        started = time.monotonic()
+        reasons = await asyncio.gather(*[self.check(url) for url in unique])
+        await self.flush_async()
+        dead = {url: reason for url, reason in zip(unique, reasons) if reason}
+        logger.info(f"Screened {len(unique)} websites in {time.monotonic() - started:.1f}s: {len(dead)} dead "
+                    f"({self.stats['cached']} from the negative cache, {self.stats['probed']} hosts probed).")
+        return dead
+
+    async def flush_async(self):
+        """Persists dead verdicts found since the last flush. The SQLite transaction runs off the event loop."""
+        if not self._pending_writes:
+            return
+        rows, self._pending_writes = self._pending_writes, []
+        await asyncio.to_thread(self._write, rows)
+
+    def _write(self, rows):
+        with self._factory.connection() as conn:
+            conn.executemany(f'''
+                INSERT INTO {DEAD_SCHEMA} (host, reason, checked_at, expires_at) VALUES (?, ?, ?, ?)
+                ON CONFLICT(host) DO UPDATE SET
+                    reason = excluded.reason,
+                    checked_at = excluded.checked_at,
+                    expires_at = excluded.expires_at
+            ''', rows)
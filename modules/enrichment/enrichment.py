@@ -1,17 +1,32 @@
 import asyncio
-import re
+import json
 import sqlite3
 import sys
 import os
-from playwright.async_api import async_playwright
+import time
+from functools import partial
 
 # Add project root to path
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '../../')))
 
+from common.browser_pool import BrowserPool
+from common.batch_writer import BatchWriter
 from common.db_factory import DBFactory
 from common.db_utils import init_db
-from common.logging_config import setup_logger
+from common.host_scheduler import load_scheduler, retry_after_seconds
+from common.logging_config import configure_logging, setup_logger
+from common.metrics import METRICS
+from common.page_cache import PageCache
+from common.request_policy import load_policy
 from urllib.parse import unquote, parse_qs, urlparse
+from modules.enrichment.contact_crawl import BUDGET_SECONDS, LINK_HINTS, crawl_site
+from modules.enrichment.contact_extractor import Candidates, extract_candidates_async, extract_in_page
+from modules.enrichment.domain_screen import DomainScreen
+from modules.enrichment.freshness import (
+    OUTCOME_FAILED, STATUS_UPSERT_SQL, WATERMARK_UPDATE_SQL, Watermark, finish_run, init_freshness_tables,
+    outcome_for, select_pending_leads, start_run, status_params,
+)
+from modules.enrichment.http_fetcher import FetchError, create_http_session, extract_links, fetch_html, looks_js_rendered
 
 logger = setup_logger('enrichment', 'modules/enrichment/enrichment.log')
 
@@ -20,10 +35,40 @@ ENRICHED_DB_PATH = 'modules/enrichment/enriched_data.db'
 RAW_SCHEMA = 'lead_harvest'
 ENRICHED_SCHEMA = 'enrichment'
 
-EMAIL_REGEX = r'[a-zA-Z0-9._%+-]+@[a-zA-Z0-9.-]+\.[a-zA-Z]{2,}'
-FACEBOOK_REGEX = r'facebook\.com\/[a-zA-Z0-9\._-]+'
-INSTAGRAM_REGEX = r'instagram\.com\/[a-zA-Z0-9\._-]+'
-LINKEDIN_REGEX = r'linkedin\.com\/in\/[a-zA-Z0-9\._-]+'
+USER_AGENT = "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36"
+
+# Worker pool: number of pages fetched in parallel, and how many sites a
+# context visits before it is thrown away and recreated.
+CONCURRENCY = 8
+PAGES_PER_CONTEXT = 50
+# A worker that can't get a browser page serves leads with the HTTP tier alone
+# for this long before asking the pool again.
+PAGE_RETRY_SECONDS = 30
+
+# Incremental mode re-crawls a lead only if it is new, failed last time, its
+# website changed, or it was last enriched more than this many days ago.
+ENRICHMENT_TTL_DAYS = 30
+
+# Fetch tiers reported per lead: plain HTTP, full Chromium, neither worked, or
+# skipped because the pre-screen found the domain dead (saved as failed).
+TIER_HTTP = 'http'
+TIER_BROWSER = 'browser'
+TIER_FAILED = 'failed'
+TIER_DEAD = 'dead'
+CONTACT_FIELDS = ("email", "facebook", "instagram", "linkedin")
+
+REQUEST_POLICY = load_policy('enrichment')
+# Per-site rate for both tiers, so a site's landing and contact pages don't all land at once.
+SCHEDULER = load_scheduler('enrichment')
+
+# Browser tier: match contacts inside the page and return only the candidates,
+# instead of pulling the serialized DOM and every href over CDP.
+IN_PAGE_EXTRACTION = True
+LINK_HINT_WORDS = [hint for hint, _ in LINK_HINTS]
+
+ANCHOR_HREFS_JS = '''() => {
+    return Array.from(document.querySelectorAll('a')).map(a => a.href);
+}'''
 
 def clean_url(url):
     """Cleans Google Maps redirection URLs to get the actual target URL."""
@@ -40,106 +85,384 @@ def clean_url(url):
             return url
     return url
 
-async def extract_contacts(page, url):
-    contacts = {
+def empty_contacts():
+    return {
         "email": None,
         "facebook": None,
         "instagram": None,
-        "linkedin": None
+        "linkedin": None,
+        "tier": None,
+        "sources": {}
     }
 
+def contacts_complete(contacts):
+    return all(contacts[field] for field in CONTACT_FIELDS)
+
+async def find_contacts(contacts, found, source=None):
+    """Fills the still-empty fields of `contacts` from one page.
+
+    `found` is the page's HTML, or the Candidates already extracted inside
+    the page. `source` is recorded as the page that produced each newly
+    filled field. Returns True if anything was found so far.
+    """
+    if isinstance(found, Candidates):
+        candidates = found
+    else:
+        METRICS.inc('enrichment_bytes_scanned_total', len(found), mode='html')
+        with METRICS.timer('enrichment_extract_seconds', mode='html'):
+            candidates = await extract_candidates_async(found)
+    for field, values in zip(CONTACT_FIELDS, candidates):
+        if values and not contacts[field]:
+            contacts[field] = values[0] # First in document order
+            if source:
+                contacts["sources"][field] = source
+
+    return any(contacts[field] for field in CONTACT_FIELDS)
+
+async def fetch_page_http(session, url, cache=None):
+    final_url, content = await fetch_html(session, url, cache=cache, scheduler=SCHEDULER)
+    METRICS.inc('enrichment_pages_total', tier=TIER_HTTP)
+    return final_url, content
+
+async def goto(page, url):
+    """page.goto under a SCHEDULER lease for the site's host."""
+    async with SCHEDULER.lease(url) as lease:
+        # 15s timeout as per requirements
+        with METRICS.timer('enrichment_navigate_seconds'):
+            response = await page.goto(url, timeout=15000, wait_until="domcontentloaded")
+        METRICS.inc('enrichment_pages_total', tier=TIER_BROWSER)
+        if response is not None:
+            lease.report(response.status, retry_after=retry_after_seconds(response.headers.get("retry-after")))
+        return response
+
+async def fetch_page_browser(context, url):
+    """Loads `url` in a throwaway page of `context` so crawled pages can load side by side."""
+    page = await context.new_page()
+    try:
+        await REQUEST_POLICY.install(page)
+        await goto(page, url)
+        if IN_PAGE_EXTRACTION:
+            candidates, _, counters = await extract_in_page(page, LINK_HINT_WORDS)
+            METRICS.inc('enrichment_bytes_scanned_total', counters['bytes_scanned'], mode='in_page')
+            return page.url, candidates
+        return page.url, await page.content()
+    finally:
+        await page.close()
+
+async def extract_contacts_http(session, url, contacts, deadline, cache=None):
+    """Fast tier: plain HTTP GET + regex parse of the landing page and its best contact pages.
+
+    Returns True if the lead is settled (contacts found, or the site is
+    unreachable), False if it should be escalated to the browser.
+    """
+    try:
+        final_url, content = await fetch_html(session, url, cache=cache, scheduler=SCHEDULER)
+        METRICS.inc('enrichment_pages_total', tier=TIER_HTTP)
+    except FetchError as e:
+        logger.info(f"HTTP tier missed {url}: {e}", extra={"sample": "http_miss"})
+        if not e.retry_in_browser:
+            contacts["tier"] = TIER_FAILED
+            return True
+        return False
+
+    if looks_js_rendered(content):
+        logger.info(f"{url} looks JS-rendered, escalating to browser.", extra={"sample": "escalate"})
+        return False
+
+    # The site was read, so unless the browser tier takes over, finding nothing is an empty result rather than a failure.
+    contacts["tier"] = TIER_HTTP
+    links = extract_links(content, final_url)
+    await find_contacts(contacts, content, final_url)
+    await crawl_site(contacts, final_url, links, partial(fetch_page_http, session, cache=cache), find_contacts,
+                     contacts_complete, deadline)
+    return any(contacts[field] for field in CONTACT_FIELDS)
+
+async def extract_contacts(page, url, session=None, cache=None):
+    """Finds contact details on the lead's site: the landing page plus up to
+    MAX_PAGES likely contact pages, within BUDGET_SECONDS for the whole site.
+
+    HTTP-tier pages go through `cache` when given. Without a browser `page`
+    (offline replay, HTTP-only runs) a site the HTTP tier read keeps the http
+    tier even with no contacts (saved as empty); one it couldn't read fails."""
+    started = time.perf_counter()
+    contacts = await _extract_contacts(page, url, session, cache)
+    METRICS.observe('enrichment_site_seconds', time.perf_counter() - started, tier=contacts['tier'])
+    return contacts
+
+async def _extract_contacts(page, url, session, cache):
+    contacts = empty_contacts()
+
     clean_target_url = clean_url(url)
     if not clean_target_url:
         return contacts
 
+    deadline = time.monotonic() + BUDGET_SECONDS
+    if session is not None and await extract_contacts_http(session, clean_target_url, contacts, deadline, cache):
+        return contacts
+    if page is None:
+        contacts["tier"] = contacts["tier"] or TIER_FAILED
+        return contacts
+
     try:
-        logger.info(f"Visiting {clean_target_url}")
-        # 15s timeout as per requirements
-        await page.goto(clean_target_url, timeout=15000, wait_until="domcontentloaded")
-
-        # Get all text and hrefs
-        content = await page.content()
-        links = await page.evaluate('''() => {
-            return Array.from(document.querySelectorAll('a')).map(a => a.href);
-        }''')
-
-        # Extract Email (simple regex on content)
-        emails = re.findall(EMAIL_REGEX, content)
-        # Filter out common false positives (like png@, js@ if regex is loose, but this regex is decent)
-        # Also filter out example.com etc.
-        valid_emails = [e for e in emails if not e.endswith('.png') and not e.endswith('.jpg') and 'example.com' not in e]
-        if valid_emails:
-            contacts["email"] = valid_emails[0] # Take first one
-
-        # Extract Socials from links
-        for link in links:
-            if not contacts["facebook"] and "facebook.com" in link:
-                contacts["facebook"] = link
-            if not contacts["instagram"] and "instagram.com" in link:
-                contacts["instagram"] = link
-            if not contacts["linkedin"] and "linkedin.com" in link:
-                contacts["linkedin"] = link
-
-        # If email not found in main page, try "Contact" page?
-        # Keeping it simple for now as per "Zero Touch" constraint (less complexity = less bugs).
-        # We can scan links for "contact" and visit if needed, but strict 15s timeout might be tight.
+        logger.info(f"Visiting {clean_target_url}", extra={"sample": "visit"})
+        await goto(page, clean_target_url)
+
+        if IN_PAGE_EXTRACTION:
+            with METRICS.timer('enrichment_extract_seconds', mode='in_page'):
+                found, links, counters = await extract_in_page(page, LINK_HINT_WORDS)
+            METRICS.inc('enrichment_bytes_scanned_total', counters['bytes_scanned'], mode='in_page')
+            logger.info(f"In-page scan of {page.url}: {counters['bytes_scanned'] // 1024} KB, "
+                        f"{counters['anchors_seen']} anchors, {sum(len(v) for v in found)} candidates", extra={"sample": "in_page_scan"})
+        else:
+            # Get all text and hrefs
+            found = await page.content()
+            links = await page.evaluate(ANCHOR_HREFS_JS)
+
+        await find_contacts(contacts, found, page.url)
+        contacts["tier"] = TIER_BROWSER
+
+        await crawl_site(contacts, page.url, links, partial(fetch_page_browser, page.context), find_contacts,
+                         contacts_complete, deadline)
 
     except Exception as e:
         logger.warning(f"Failed to process {url}: {e}")
+        if "Timeout" in type(e).__name__:
+            METRICS.inc('enrichment_timeouts_total', tier=TIER_BROWSER)
+        contacts["tier"] = TIER_FAILED
         # Dead links should be logged but not crash
 
     return contacts
 
-async def process_leads():
+async def new_worker_page(pool):
+    """Leases a fresh browser context from the pool and opens a page in it."""
+    lease = await pool.acquire(user_agent=USER_AGENT)
+    try:
+        page = await lease.context.new_page()
+        route_stats = await REQUEST_POLICY.install(page)
+    except Exception:
+        await pool.release(lease)
+        raise
+    return lease, page, route_stats
+
+ENRICHMENT_INSERT_SQL = f'''
+    INSERT INTO {ENRICHED_SCHEMA} (lead_id, email, facebook, instagram, linkedin, contact_sources) VALUES (?, ?, ?, ?, ?, ?)
+'''
+
+# Statements run, in this order, for every saved lead; save_contacts fills
+# exactly one of the first two. lead_id is unique, so a successful
+# re-enrichment replaces the lead's row rather than appending another, while
+# a failed one (timeout, dead host) leaves stored contacts alone and only
+# enrichment_status records the failure.
+SAVE_STATEMENTS = [
+    f'''
+    {ENRICHMENT_INSERT_SQL}
+    ON CONFLICT(lead_id) DO UPDATE SET
+        email = excluded.email,
+        facebook = excluded.facebook,
+        instagram = excluded.instagram,
+        linkedin = excluded.linkedin,
+        contact_sources = excluded.contact_sources
+    ''',
+    f"{ENRICHMENT_INSERT_SQL} ON CONFLICT(lead_id) DO NOTHING",
+    STATUS_UPSERT_SQL,
+    WATERMARK_UPDATE_SQL,
+]
+
+def save_contacts(writer, lead_id, website, contacts, run_id=None, watermark=None):
+    """Queues the lead's enrichment row, freshness status and run watermark.
+
+    The writer commits them together, so a persisted watermark never runs
+    ahead of the rows it covers. Without a run (streaming pipeline) the
+    watermark update is skipped.
+    """
+    outcome = OUTCOME_FAILED if contacts['tier'] == TIER_DEAD else outcome_for(contacts, TIER_FAILED, CONTACT_FIELDS)
+    # {field: url of the page it was found on}
+    sources = json.dumps(contacts['sources']) if contacts.get('sources') else None
+    row = (lead_id, contacts['email'], contacts['facebook'], contacts['instagram'], contacts['linkedin'], sources)
+    writer.write(
+        None if outcome == OUTCOME_FAILED else row,
+        row if outcome == OUTCOME_FAILED else None,
+        status_params(lead_id, website, outcome, contacts['tier']),
+        (watermark.completed(lead_id), run_id) if watermark is not None else None,
+    )
+    logger.info(f"Enriched lead {lead_id} via {contacts['tier']} -> Email: {contacts['email']}",
+                extra={"sample": "enriched", "lead_id": lead_id, "tier": contacts['tier']})
+
+async def enrichment_worker(worker_id, pool, session, queue, writer, pages_per_context, tier_counts,
+                            run_id=None, watermark=None, on_result=None, cache=None, screen=None):
+    """Drains (lead_id, website, ...) items from the queue until it sees the None sentinel.
+
+    Each worker leases one context/page and hands it back after `pages_per_context`
+    visits so long runs don't accumulate Chromium memory. `on_result`, if given,
+    is awaited with (item, contacts) after each lead is saved, or with failed
+    contacts if the lead could not be processed. Without a `pool`, or when
+    replaying an offline `cache`, no page is leased; if leasing one fails the
+    worker backs off to the HTTP tier for PAGE_RETRY_SECONDS. Sites the
+    DomainScreen `screen` reports dead are saved as failed without a fetch.
+    """
+    browserless = pool is None or (cache is not None and cache.offline)
+    lease, page, route_stats = None, None, None
+    pages_served = 0
+    page_retry_at = 0.0
+
+    try:
+        while True:
+            item = await queue.get()
+            forwarded = False
+            try:
+                if item is None:
+                    break
+
+                if lease is not None and pages_served >= pages_per_context:
+                    # Cleared first so a failed re-lease below can't leave a released lease behind.
+                    released, lease, page, route_stats = lease, None, None, None
+                    await pool.release(released)
+                if not browserless and lease is None and time.monotonic() >= page_retry_at:
+                    try:
+                        lease, page, route_stats = await new_worker_page(pool)
+                    except Exception as e:
+                        page_retry_at = time.monotonic() + PAGE_RETRY_SECONDS
+                        logger.warning(f"Worker {worker_id} could not open a browser page ({e}); "
+                                       f"using the HTTP tier alone for {PAGE_RETRY_SECONDS}s.")
+                    pages_served = 0
+
+                lead_id, website = item[0], item[1]
+                dead_reason = await screen.check(clean_url(website)) if screen is not None else None
+                if dead_reason:
+                    contacts = empty_contacts()
+                    contacts['tier'] = TIER_DEAD
+                    logger.info(f"Skipping lead {lead_id}: {website} is dead ({dead_reason}).", extra={"sample": "dead_site", "lead_id": lead_id})
+                else:
+                    try:
+                        contacts = await extract_contacts(page, website, session, cache)
+                    except Exception as e:
+                        # Still save a failed status row, or the lead is picked up again on every run.
+                        logger.error(f"Worker {worker_id} failed to enrich lead {lead_id}: {e}")
+                        contacts = empty_contacts()
+                        contacts['tier'] = TIER_FAILED
+                tier_counts[contacts['tier']] = tier_counts.get(contacts['tier'], 0) + 1
+                METRICS.inc('enrichment_leads_total', tier=contacts['tier'])
+                if contacts['tier'] not in (TIER_HTTP, TIER_DEAD) and page is not None:
+                    pages_served += 1
+                    logger.info(f"Lead {lead_id} requests: {route_stats.summary()}", extra={"sample": "lead_requests", "lead_id": lead_id})
+                    route_stats.reset()
+                save_contacts(writer, lead_id, website, contacts, run_id, watermark)
+                if on_result is not None:
+                    forwarded = True
+                    await on_result(item, contacts)
+            except Exception as e:
+                logger.error(f"Worker {worker_id} failed on {item}: {e}")
+                if on_result is not None and item is not None and not forwarded:
+                    contacts = empty_contacts()
+                    contacts['tier'] = TIER_FAILED
+                    await on_result(item, contacts)
+            finally:
+                queue.task_done()
+    finally:
+        if lease is not None:
+            await pool.release(lease)
+
+async def process_leads(concurrency=CONCURRENCY, pages_per_context=PAGES_PER_CONTEXT, http_first=True, pool=None,
+                        incremental=True, ttl_days=ENRICHMENT_TTL_DAYS, cache=None, screen_domains=True, use_browser=True):
     # Read raw leads
     if not os.path.exists(RAW_DB_PATH):
         logger.error("Raw leads DB not found.")
         return
 
-    raw_conn = sqlite3.connect(RAW_DB_PATH)
-    raw_cursor = raw_conn.cursor()
+    # Setup Enriched DB
+    enriched_factory = DBFactory(ENRICHED_DB_PATH)
+    enriched_conn = enriched_factory.get_connection()
+    init_db(enriched_conn, ENRICHED_SCHEMA)
+    init_freshness_tables(enriched_conn)
+
+    run_id, stale_before, start_watermark = start_run(enriched_conn, ttl_days if incremental else None)
 
     try:
-        raw_cursor.execute(f"SELECT id, website FROM {RAW_SCHEMA} WHERE website IS NOT NULL AND website != ''")
-        leads = raw_cursor.fetchall()
+        leads = select_pending_leads(enriched_conn, RAW_DB_PATH, RAW_SCHEMA, stale_before, start_watermark)
     except sqlite3.Error as e:
         logger.error(f"Failed to read raw leads: {e}")
+        enriched_conn.close()
         return
-    finally:
-        raw_conn.close()
 
-    logger.info(f"Found {len(leads)} leads with websites to process.")
+    mode = "incremental" if stale_before is not None else "full"
+    logger.info(f"Found {len(leads)} leads with websites to process ({mode} run {run_id}).")
 
-    # Setup Enriched DB
-    enriched_factory = DBFactory(ENRICHED_DB_PATH)
-    enriched_conn = enriched_factory.get_connection()
-    init_db(enriched_conn, ENRICHED_SCHEMA)
+    watermark = Watermark(start_watermark)
+    if not leads:
+        finish_run(enriched_conn, run_id)
+        enriched_conn.close()
+        return
 
-    async with async_playwright() as p:
-        browser = await p.chromium.launch(headless=True)
-        context = await browser.new_context(
-            user_agent="Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36"
-        )
-        page = await context.new_page()
+    concurrency = max(1, min(concurrency, len(leads) or 1))
+    logger.info(f"Starting {concurrency} enrichment workers.")
 
-        for lead_id, website in leads:
-            contacts = await extract_contacts(page, website)
+    tier_counts = {}
+    offline = cache is not None and cache.offline
+    session = create_http_session(concurrency, USER_AGENT) if http_first or offline else None
 
-            # Save to Enriched DB
-            try:
-                cursor = enriched_conn.cursor()
-                cursor.execute(f'''
-                    INSERT INTO {ENRICHED_SCHEMA} (lead_id, email, facebook, instagram, linkedin)
-                    VALUES (?, ?, ?, ?, ?)
-                ''', (lead_id, contacts['email'], contacts['facebook'], contacts['instagram'], contacts['linkedin']))
-                enriched_conn.commit()
-                logger.info(f"Enriched lead {lead_id} -> Email: {contacts['email']}")
-            except sqlite3.Error as e:
-                logger.error(f"Failed to save enriched data for lead {lead_id}: {e}")
-
-        await browser.close()
+    # Workers only enqueue rows; commits happen on the writer thread.
+    writer = BatchWriter(ENRICHED_DB_PATH, SAVE_STATEMENTS, name='enrichment')
+    writer.start()
+
+    # Resolve and probe every site up front, so workers and browser slots only see live ones.
+    screen = None
+    if screen_domains and not offline:
+        screen = DomainScreen(ENRICHED_DB_PATH)
+        await screen.screen([clean_url(lead[1]) for lead in leads])
+
+    own_pool = pool is None and use_browser and not offline
+    if own_pool:
+        pool = BrowserPool()
+        await pool.start()
 
+    try:
+        # Bounded queue: the producer only stays a few leads ahead of the workers.
+        queue = asyncio.Queue(maxsize=concurrency * 2)
+
+        async def produce():
+            for lead in leads:
+                watermark.dispatched(lead[0])
+                await queue.put(lead)
+                METRICS.gauge('enrichment_queue_depth', queue.qsize())
+            for _ in range(concurrency):
+                await queue.put(None)
+
+        workers = [
+            asyncio.create_task(enrichment_worker(i, pool, session, queue, writer, pages_per_context, tier_counts,
+                                                  run_id, watermark, cache=cache, screen=screen))
+            for i in range(concurrency)
+        ]
+        await asyncio.gather(produce(), *workers)
+    finally:
+        if own_pool:
+            await pool.close()
+        await asyncio.to_thread(writer.close)
+
+    if session is not None:
+        await session.close()
+    if screen is not None:
+        await screen.flush_async()
+    finish_run(enriched_conn, run_id)
     enriched_conn.close()
 
+    served = ", ".join(f"{tier}={count}" for tier, count in sorted(tier_counts.items(), key=lambda kv: str(kv[0])))
+    http_rate = tier_counts.get(TIER_HTTP, 0) / len(leads) if leads else 0.0
+    logger.info(f"Fetch tiers: {served or 'none'} (HTTP hit rate {http_rate:.0%}); scheduler: {SCHEDULER.summary()}")
+
 if __name__ == "__main__":
-    asyncio.run(process_leads())
+    # --full ignores freshness and re-crawls every lead with a website.
+    # --cache stores HTTP-tier pages on disk; --replay serves them from it without touching the network.
+    # --no-screen skips the dead-domain pre-screen; --no-browser settles every site with the HTTP tier alone.
+    # --log-json writes the log files as JSON lines.
+    configure_logging(json_lines="--log-json" in sys.argv)
+    replay = "--replay" in sys.argv
+    cache = PageCache(offline=replay) if replay or "--cache" in sys.argv else None
+    try:
+        with METRICS.timer('enrichment_run_seconds'):
+            asyncio.run(process_leads(incremental="--full" not in sys.argv and not replay, cache=cache,
+                                      screen_domains="--no-screen" not in sys.argv,
+                                      use_browser="--no-browser" not in sys.argv))
+    finally:
+        if cache is not None:
+            cache.close()
+        METRICS.report()
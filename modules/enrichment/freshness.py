@@ -0,0 +1,139 @@
+import heapq
+import sys
+import os
+from datetime import datetime, timedelta, timezone
+
+# Add project root to path
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '../../')))
+
+from common.db_utils import init_db
+from common.logging_config import setup_logger
+
+logger = setup_logger('freshness', 'modules/enrichment/enrichment.log')
+
+STATUS_SCHEMA = 'enrichment_status'
+RUNS_SCHEMA = 'enrichment_runs'
+
+OUTCOME_FOUND = 'found'
+OUTCOME_EMPTY = 'empty'
+OUTCOME_FAILED = 'failed'
+
+# Same layout as SQLite's CURRENT_TIMESTAMP so stored values compare as strings.
+TIMESTAMP_FORMAT = '%Y-%m-%d %H:%M:%S'
+
+
+def utc_now():
+    return datetime.now(timezone.utc).strftime(TIMESTAMP_FORMAT)
+
+
+def init_freshness_tables(conn):
+    init_db(conn, STATUS_SCHEMA)
+    init_db(conn, RUNS_SCHEMA)
+
+
+def start_run(conn, ttl_days=None):
+    """Resumes the last unfinished run, or opens a new one.
+
+    Returns (run_id, stale_before, watermark). ttl_days=None starts a full
+    re-crawl (stale_before is None) and never resumes: unfinished runs are
+    closed, since their watermark would skip leads the full run must revisit.
+    A resumed run keeps its original cutoff, so leads it already refreshed
+    don't age out mid-run.
+    """
+    cursor = conn.cursor()
+    if ttl_days is None:
+        cursor.execute(f"UPDATE {RUNS_SCHEMA} SET finished_at = ? WHERE finished_at IS NULL", (utc_now(),))
+        if cursor.rowcount:
+            logger.info(f"Full re-crawl: closed {cursor.rowcount} unfinished enrichment run(s) instead of resuming.")
+    else:
+        cursor.execute(f"SELECT id, stale_before, watermark_lead_id FROM {RUNS_SCHEMA} WHERE finished_at IS NULL ORDER BY id DESC LIMIT 1")
+        row = cursor.fetchone()
+        if row:
+            logger.info(f"Resuming enrichment run {row[0]} after lead {row[2]}.")
+            return row[0], row[1], row[2]
+
+    stale_before = None
+    if ttl_days is not None:
+        stale_before = (datetime.now(timezone.utc) - timedelta(days=ttl_days)).strftime(TIMESTAMP_FORMAT)
+    cursor.execute(f"INSERT INTO {RUNS_SCHEMA} (started_at, stale_before) VALUES (?, ?)", (utc_now(), stale_before))
+    conn.commit()
+    return cursor.lastrowid, stale_before, 0
+
+
+def finish_run(conn, run_id):
+    conn.execute(f"UPDATE {RUNS_SCHEMA} SET finished_at = ? WHERE id = ?", (utc_now(), run_id))
+    conn.commit()
+
+
+def select_pending_leads(conn, raw_db_path, raw_schema, stale_before=None, watermark=0):
+    """Returns (id, website) for leads that are new, failed, stale or whose website changed.
+
+    With stale_before=None every lead with a website is returned (full re-crawl).
+    """
+    conn.execute("ATTACH DATABASE ? AS raw", (raw_db_path,))
+    try:
+        query = f'''
+            SELECT l.id, l.website FROM raw.{raw_schema} l
+            LEFT JOIN {STATUS_SCHEMA} s ON s.lead_id = l.id
+            WHERE l.website IS NOT NULL AND l.website != '' AND l.id > ?
+        '''
+        params = [watermark]
+        if stale_before is not None:
+            query += '''
+              AND (s.lead_id IS NULL OR s.outcome = ? OR s.last_enriched_at < ? OR s.website IS NOT l.website)
+            '''
+            params += [OUTCOME_FAILED, stale_before]
+        query += " ORDER BY l.id"
+        return conn.execute(query, params).fetchall()
+    finally:
+        conn.execute("DETACH DATABASE raw")
+
+
+def outcome_for(contacts, failed_tier, fields):
+    if contacts.get('tier') == failed_tier:
+        return OUTCOME_FAILED
+    if any(contacts.get(field) for field in fields):
+        return OUTCOME_FOUND
+    return OUTCOME_EMPTY
+
+
+STATUS_UPSERT_SQL = f'''
+    INSERT INTO {STATUS_SCHEMA} (lead_id, website, outcome, tier, attempts, last_enriched_at)
+    VALUES (?, ?, ?, ?, 1, ?)
+    ON CONFLICT(lead_id) DO UPDATE SET
+        website = excluded.website,
+        outcome = excluded.outcome,
+        tier = excluded.tier,
+        attempts = {STATUS_SCHEMA}.attempts + 1,
+        last_enriched_at = excluded.last_enriched_at
+'''
+
+WATERMARK_UPDATE_SQL = f"UPDATE {RUNS_SCHEMA} SET watermark_lead_id = ? WHERE id = ?"
+
+
+def status_params(lead_id, website, outcome, tier):
+    return (lead_id, website, outcome, tier, utc_now())
+
+
+class Watermark:
+    """Highest lead id below which every dispatched lead has been settled.
+
+    Workers finish out of order, so the watermark only advances over a
+    contiguous prefix of completed leads.
+    """
+
+    def __init__(self, start=0):
+        self.value = start
+        self._pending = []
+        self._done = set()
+
+    def dispatched(self, lead_id):
+        heapq.heappush(self._pending, lead_id)
+
+    def completed(self, lead_id):
+        self._done.add(lead_id)
+        while self._pending and self._pending[0] in self._done:
+            settled = heapq.heappop(self._pending)
+            self._done.discard(settled)
+            self.value = max(self.value, settled)
+        return self.value
@@ -0,0 +1,169 @@
+import asyncio
+import re
+import sys
+import os
+import aiohttp
+from urllib.parse import urljoin
+
+# Add project root to path
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '../../')))
+
+from common.host_scheduler import retry_after_seconds
+from common.logging_config import setup_logger
+from common.metrics import METRICS
+from common.page_cache import is_fresh, validators
+
+logger = setup_logger('http_fetcher', 'modules/enrichment/enrichment.log')
+
+HTTP_TIMEOUT = 10
+MAX_RESPONSE_BYTES = 2 * 1024 * 1024
+READ_CHUNK_BYTES = 64 * 1024
+DEAD_STATUSES = (404, 410)
+
+HREF_REGEX = re.compile(r'''<a\s[^>]*?href\s*=\s*["']([^"'#][^"']*)["']''', re.IGNORECASE)
+SCRIPT_REGEX = re.compile(r'<script\b', re.IGNORECASE)
+TAG_REGEX = re.compile(r'<script\b.*?</script>|<style\b.*?</style>|<[^>]+>', re.IGNORECASE | re.DOTALL)
+SPA_ROOT_REGEX = re.compile(r'''<div[^>]+id=["'](root|app|__next|__nuxt)["'][^>]*>\s*</div>''', re.IGNORECASE)
+NOSCRIPT_JS_REGEX = re.compile(r'<noscript[^>]*>[^<]*(enable|requires?)\s+javascript', re.IGNORECASE)
+
+# Below this much visible text a page with scripts is assumed to be client-side rendered.
+MIN_VISIBLE_TEXT_CHARS = 200
+
+
+class FetchError(Exception):
+    """Raised when the HTTP tier cannot get a usable HTML document."""
+
+    def __init__(self, message, retry_in_browser=True):
+        super().__init__(message)
+        self.retry_in_browser = retry_in_browser
+
+
+def create_http_session(concurrency, user_agent, resolver=None):
+    """Builds a pooled keep-alive client shared by all enrichment workers.
+
+    `resolver` (an aiohttp AbstractResolver) replaces the system resolver, e.g. for fixture hosts."""
+    connector = aiohttp.TCPConnector(
+        limit=concurrency * 2,
+        limit_per_host=2,
+        ttl_dns_cache=300,
+        enable_cleanup_closed=True,
+        resolver=resolver,
+    )
+    return aiohttp.ClientSession(
+        connector=connector,
+        timeout=aiohttp.ClientTimeout(total=HTTP_TIMEOUT),
+        headers={
+            "User-Agent": user_agent,
+            "Accept": "text/html,application/xhtml+xml;q=0.9,*/*;q=0.5",
+            "Accept-Encoding": "gzip, deflate",
+        },
+    )
+
+
+def decode_body(body, charset):
+    """Decodes with the declared charset, falling back to UTF-8 for unknown ones (e.g. charset=bogus-enc)."""
+    try:
+        return body.decode(charset or "utf-8", errors="replace")
+    except LookupError:
+        return body.decode("utf-8", errors="replace")
+
+
+def _cached_result(page):
+    if page.status >= 400:
+        raise FetchError(f"HTTP {page.status} (cached)", retry_in_browser=False)
+    return page.final_url, page.body.decode("utf-8", errors="replace")
+
+
+async def fetch_html(session, url, max_bytes=MAX_RESPONSE_BYTES, cache=None, scheduler=None):
+    """GETs `url` and returns (final_url, html), reading at most `max_bytes`.
+
+    Raises FetchError. Connection-level failures (DNS, refused) are flagged as
+    not worth retrying in the browser, since Chromium would fail the same way.
+
+    With a PageCache, fresh entries are served without a request, stale ones
+    are revalidated with ETag/Last-Modified, and HTML and dead (404/410)
+    responses are stored. In offline mode only the cache is consulted.
+    With a HostScheduler, requests that reach the network wait for a lease
+    on the host and report its status back.
+    """
+    cached = await cache.get_async(url) if cache is not None else None
+    if cached is not None and (cache.offline or is_fresh(cached, cache.ttl)):
+        METRICS.inc('page_cache_requests_total', result='hit')
+        return _cached_result(cached)
+    if cache is not None:
+        METRICS.inc('page_cache_requests_total', result='stale' if cached is not None else 'miss')
+    if cache is not None and cache.offline:
+        raise FetchError("Not in page cache (offline replay)", retry_in_browser=False)
+
+    if scheduler is None:
+        with METRICS.timer('http_fetch_seconds'):
+            return await _get(session, url, max_bytes, cache, cached)
+    async with scheduler.lease(url) as lease:
+        with METRICS.timer('http_fetch_seconds'):
+            return await _get(session, url, max_bytes, cache, cached, lease)
+
+
+async def _get(session, url, max_bytes, cache, cached, lease=None):
+    try:
+        async with session.get(url, allow_redirects=True, headers=validators(cached) if cached else None) as resp:
+            METRICS.inc('http_responses_total', status=resp.status)
+            if lease is not None:
+                lease.report(resp.status, retry_after=retry_after_seconds(resp.headers.get("Retry-After")))
+            if resp.status == 304 and cached is not None:
+                await cache.refresh_async(url)
+                return _cached_result(cached)
+            if resp.status >= 400:
+                if cache is not None and resp.status in DEAD_STATUSES:
+                    await cache.put_async(url, str(resp.url), resp.status, b"")
+                # Bot walls (403/429/503) may let a real browser through; a 404 won't.
+                raise FetchError(f"HTTP {resp.status}", retry_in_browser=resp.status not in DEAD_STATUSES)
+
+            content_type = resp.headers.get("Content-Type", "")
+            if content_type and "html" not in content_type:
+                raise FetchError(f"Non-HTML content type: {content_type}", retry_in_browser=False)
+
+            chunks = []
+            size = 0
+            async for chunk in resp.content.iter_chunked(READ_CHUNK_BYTES):
+                chunks.append(chunk)
+                size += len(chunk)
+                if size >= max_bytes:
+                    logger.info(f"Truncated {url} at {size} bytes", extra={"sample": "truncated"})
+                    break
+
+            body = b"".join(chunks)[:max_bytes]
+            METRICS.inc('http_bytes_total', len(body))
+            html = decode_body(body, resp.charset)
+            if cache is not None:
+                await cache.put_async(url, str(resp.url), resp.status, html.encode("utf-8"),
+                                      resp.headers.get("ETag"), resp.headers.get("Last-Modified"))
+            return str(resp.url), html
+
+    except aiohttp.ClientConnectorError as e:
+        raise FetchError(f"Connection failed: {e}", retry_in_browser=False)
+    except asyncio.TimeoutError as e:
+        METRICS.inc('http_timeouts_total')
+        raise FetchError(f"HTTP fetch failed: {e!r}")
+    except aiohttp.ClientError as e:
+        raise FetchError(f"HTTP fetch failed: {e!r}")
+    except FetchError:
+        raise
+    except Exception as e:
+        # Anything else (bad headers, decoding, cache errors) still settles the lead through the normal path.
+        logger.warning(f"Unexpected HTTP tier error on {url}: {e!r}")
+        raise FetchError(f"HTTP fetch failed: {e!r}")
+
+
+def extract_links(html, base_url):
+    """Returns absolute hrefs of all anchors in `html`."""
+    return [urljoin(base_url, href.strip()) for href in HREF_REGEX.findall(html)]
+
+
+def looks_js_rendered(html):
+    """Heuristic: does this document need a browser to show its real content?"""
+    if SPA_ROOT_REGEX.search(html) or NOSCRIPT_JS_REGEX.search(html):
+        return True
+    if not SCRIPT_REGEX.search(html):
+        return False
+    visible_text = TAG_REGEX.sub(" ", html)
+    return len(" ".join(visible_text.split())) < MIN_VISIBLE_TEXT_CHARS
@@ -0,0 +1,245 @@
+"""Batch harvesting: runs many Google Maps queries in parallel with per-query checkpoints.
+
+Queries come from a file (one per line) or a category x city grid. Each
+process runs `contexts` queries at once, one browser context per query, over
+a shared browser pool. Every finished query is recorded in the
+harvest_queries table of raw_leads.db, so an interrupted batch resumes where
+it stopped; a query cut off midway resumes from its card checkpoint.
+
+    python modules/harvester/batch.py --queries-file queries.txt --contexts 4
+    python modules/harvester/batch.py --categories cats.txt --cities cities.txt --processes 4
+"""
+import argparse
+import asyncio
+import itertools
+import multiprocessing
+import sys
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timezone
+
+# Add project root to path
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '../../')))
+
+from common.batch_writer import BatchWriter
+from common.browser_pool import BrowserPool
+from common.db_factory import DBFactory
+from common.db_utils import init_db
+from common.logging_config import configure_logging, setup_logger
+from common.metrics import METRICS, METRICS_PATH
+from common.place_index import load_known_places
+from modules.harvester.checkpoint import load_checkpoint
+from modules.harvester.harvester import DB_PATH, HARVEST_STATEMENTS, SCHEMA_NAME, init_harvest_db, scrape_google_maps
+
+logger = setup_logger('harvest_batch', 'modules/harvester/harvester.log')
+
+QUERIES_SCHEMA = 'harvest_queries'
+
+STATUS_DONE = 'done'
+STATUS_EMPTY = 'empty'
+# Every attempt errored; unlike 'empty', the query stays pending for the next run.
+STATUS_FAILED = 'failed'
+
+CONTEXTS = 4
+MAX_LEADS = 100
+ATTEMPTS = 3
+
+QUERY_UPSERT_SQL = f'''
+    INSERT INTO {QUERIES_SCHEMA} (query, status, leads_found, with_website, with_phone, skipped_known, attempts, duration_s, error, updated_at)
+    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+    ON CONFLICT(query) DO UPDATE SET
+        status = excluded.status,
+        leads_found = excluded.leads_found,
+        with_website = excluded.with_website,
+        with_phone = excluded.with_phone,
+        skipped_known = excluded.skipped_known,
+        attempts = {QUERIES_SCHEMA}.attempts + excluded.attempts,
+        duration_s = excluded.duration_s,
+        error = excluded.error,
+        updated_at = excluded.updated_at
+'''
+
+
+def utc_now():
+    return datetime.now(timezone.utc).strftime('%Y-%m-%d %H:%M:%S')
+
+
+def read_lines(path):
+    """Non-empty lines of a text file, skipping '#' comments."""
+    with open(path, 'r', encoding='utf-8') as f:
+        return [line.strip() for line in f if line.strip() and not line.lstrip().startswith('#')]
+
+
+def query_grid(categories, cities):
+    return [f"{category} in {city}" for category, city in itertools.product(categories, cities)]
+
+
+def init_batch_db(conn):
+    init_harvest_db(conn)
+    init_db(conn, QUERIES_SCHEMA)
+
+
+def pending_queries(queries, retry_empty=False):
+    """Drops duplicates and queries an earlier run finished; failed queries stay pending."""
+    skip = (STATUS_DONE,) if retry_empty else (STATUS_DONE, STATUS_EMPTY)
+    with DBFactory(DB_PATH).connection() as conn:
+        init_batch_db(conn)
+        placeholders = ", ".join("?" * len(skip))
+        finished = {row[0] for row in conn.execute(f"SELECT query FROM {QUERIES_SCHEMA} WHERE status IN ({placeholders})", skip)}
+    unique = list(dict.fromkeys(queries))
+    pending = [q for q in unique if q not in finished]
+    logger.info(f"{len(unique)} queries, {len(unique) - len(pending)} already harvested, {len(pending)} pending.")
+    return pending
+
+
+def query_stats(query, leads, skipped, attempts, duration, error=None, resumed=0):
+    if error:
+        # Includes queries cut short by a captcha: partial leads are kept, but the query isn't finished.
+        status = STATUS_FAILED
+    else:
+        status = STATUS_DONE if leads or skipped or resumed else STATUS_EMPTY
+    return (
+        query,
+        status,
+        len(leads),
+        sum(1 for lead in leads if lead.get('website')),
+        sum(1 for lead in leads if lead.get('phone')),
+        skipped,
+        attempts,
+        round(duration, 2),
+        error,
+        utc_now(),
+    )
+
+
+async def harvest_query(query, pool, writer, max_leads, known=None):
+    """Scrapes one query with retries and queues its leads plus its checkpoint rows.
+
+    Everything goes through the same writer, which commits a batch's leads
+    before their card checkpoints and those before the query row, so neither
+    a card nor a query is marked done without its leads. Each lead is queued
+    as soon as it is extracted; a retry resumes from the card checkpoint.
+    """
+    started = time.monotonic()
+    leads, error, scrape_stats = [], None, {}
+    checkpoint = load_checkpoint(DB_PATH, query, lambda lead, card, progress: writer.write(lead, card, progress, None))
+    for attempt in range(ATTEMPTS):
+        scrape_stats = {}
+        try:
+            # Leads from an attempt stopped by a captcha count too; the next attempt resumes after them.
+            leads += await scrape_google_maps(query, max_leads, pool, known=known, stats=scrape_stats, checkpoint=checkpoint)
+            # scrape_google_maps reports a failed or blocked query through stats rather than raising.
+            error = scrape_stats.get('error')
+        except Exception as e:
+            error = str(e)
+            logger.error(f"Query '{query}' attempt {attempt + 1} failed: {e}")
+        if error is None and (leads or scrape_stats.get('skipped') or scrape_stats.get('resumed')):
+            break
+
+    stats = query_stats(query, leads, scrape_stats.get('skipped', 0), attempt + 1, time.monotonic() - started, error,
+                        scrape_stats.get('resumed', 0))
+    writer.write(None, None, None, stats)
+    if stats[1] == STATUS_FAILED:
+        logger.error(f"Query '{query}' failed after {stats[6]} attempt(s): {error}")
+    logger.info(f"Query '{query}': {stats[2]} leads ({stats[3]} with website, {stats[4]} with phone), "
+                f"{stats[5]} already harvested, in {stats[7]}s after {stats[6]} attempt(s).")
+    return stats
+
+
+async def run_batch(queries, contexts=CONTEXTS, max_leads=MAX_LEADS, browsers=1):
+    """Harvests `queries` with `contexts` concurrent browser contexts. Returns per-query stats."""
+    queue = asyncio.Queue()
+    for query in queries:
+        queue.put_nowait(query)
+    for _ in range(contexts):
+        queue.put_nowait(None)
+
+    results = []
+    # Shared by every context in this process, so overlapping queries in one batch skip each other's places too.
+    known = load_known_places(DB_PATH, SCHEMA_NAME)
+
+    async def worker(pool, writer):
+        while True:
+            query = await queue.get()
+            if query is None:
+                break
+            results.append(await harvest_query(query, pool, writer, max_leads, known))
+
+    writer = BatchWriter(DB_PATH, HARVEST_STATEMENTS + [QUERY_UPSERT_SQL], setup=init_batch_db, name='harvest_batch')
+    writer.start()
+    try:
+        async with BrowserPool(size=browsers) as pool:
+            await asyncio.gather(*[worker(pool, writer) for _ in range(contexts)])
+    finally:
+        await asyncio.to_thread(writer.close)
+    return results
+
+
+def _run_shard(queries, contexts, max_leads, browsers, metrics_path=None, log_json=False):
+    configure_logging(json_lines=log_json)
+    try:
+        return asyncio.run(run_batch(queries, contexts, max_leads, browsers))
+    finally:
+        # Each spawned process has its own METRICS, so every shard writes its own snapshot.
+        if metrics_path:
+            METRICS.report(metrics_path)
+
+
+def harvest(queries, contexts=CONTEXTS, max_leads=MAX_LEADS, processes=1, browsers=1, retry_empty=False, log_json=False):
+    """Runs the pending subset of `queries`, split across `processes` processes."""
+    queries = pending_queries(queries, retry_empty)
+    if not queries:
+        return []
+
+    started = time.monotonic()
+    if processes <= 1:
+        results = _run_shard(queries, contexts, max_leads, browsers, METRICS_PATH, log_json)
+    else:
+        shards = [queries[i::processes] for i in range(processes)]
+        # spawn: each process gets a clean interpreter (own event loop, browsers, writer thread).
+        with ProcessPoolExecutor(max_workers=processes, mp_context=multiprocessing.get_context('spawn')) as executor:
+            root, ext = os.path.splitext(METRICS_PATH)
+            futures = [executor.submit(_run_shard, shard, contexts, max_leads, browsers, f"{root}_shard{i}{ext}", log_json)
+                       for i, shard in enumerate(shards) if shard]
+            results = [stats for future in futures for stats in future.result()]
+
+    elapsed = time.monotonic() - started
+    total = sum(stats[2] for stats in results)
+    skipped = sum(stats[5] for stats in results)
+    empty = sum(1 for stats in results if stats[1] == STATUS_EMPTY)
+    failed = sum(1 for stats in results if stats[1] == STATUS_FAILED)
+    logger.info(f"Batch finished: {len(results)} queries ({empty} empty, {failed} failed), {total} leads, {skipped} known places skipped, in {elapsed:.1f}s "
+                f"({len(results) / elapsed * 60 if elapsed else 0:.1f} queries/min).")
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Harvest many Google Maps queries in parallel.")
+    parser.add_argument("--queries-file", help="One query per line.")
+    parser.add_argument("--categories", help="File of categories, combined with --cities into a grid.")
+    parser.add_argument("--cities", help="File of cities, combined with --categories into a grid.")
+    parser.add_argument("--contexts", type=int, default=CONTEXTS, help="Concurrent browser contexts per process.")
+    parser.add_argument("--processes", type=int, default=1)
+    parser.add_argument("--browsers", type=int, default=1, help="Browsers per process.")
+    parser.add_argument("--max-leads", type=int, default=MAX_LEADS)
+    parser.add_argument("--retry-empty", action="store_true", help="Re-run queries that previously returned nothing.")
+    parser.add_argument("--log-json", action="store_true", help="Write log files as JSON lines.")
+    args = parser.parse_args()
+    configure_logging(json_lines=args.log_json)
+
+    queries = []
+    if args.queries_file:
+        queries += read_lines(args.queries_file)
+    if args.categories or args.cities:
+        if not (args.categories and args.cities):
+            parser.error("--categories and --cities must be given together.")
+        queries += query_grid(read_lines(args.categories), read_lines(args.cities))
+    if not queries:
+        parser.error("Give --queries-file and/or --categories with --cities.")
+
+    harvest(queries, args.contexts, args.max_leads, args.processes, args.browsers, args.retry_empty, args.log_json)
+
+
+if __name__ == "__main__":
+    main()
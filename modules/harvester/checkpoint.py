@@ -0,0 +1,120 @@
+"""Per-query harvest checkpoints: which result cards are done or failing, and how far the feed was scrolled.
+
+Rows are written through the harvester's BatchWriter in the same batch as
+the lead they belong to (leads first), so a card is never marked done
+without its lead. A restarted query scrolls back to where it stopped,
+skips finished cards without clicking them, and retries only the cards
+that failed.
+"""
+import sys
+import os
+from datetime import datetime, timezone
+
+# Add project root to path
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '../../')))
+
+from common.db_factory import DBFactory
+from common.db_utils import init_db
+from common.logging_config import setup_logger
+from common.place_index import place_key
+
+logger = setup_logger('harvest_checkpoint', 'modules/harvester/harvester.log')
+
+CARDS_SCHEMA = 'harvest_cards'
+PROGRESS_SCHEMA = 'harvest_progress'
+
+CARD_DONE = 'done'
+CARD_FAILED = 'failed'
+
+# Tries per card within one run, and in total across runs before it is given up.
+CARD_TRIES_PER_RUN = 3
+MAX_CARD_ATTEMPTS = 6
+
+CARD_UPSERT_SQL = f'''
+    INSERT INTO {CARDS_SCHEMA} (query, place_key, status, attempts, error, updated_at)
+    VALUES (?, ?, ?, ?, ?, ?)
+    ON CONFLICT(query, place_key) DO UPDATE SET
+        status = excluded.status,
+        attempts = {CARDS_SCHEMA}.attempts + excluded.attempts,
+        error = excluded.error,
+        updated_at = excluded.updated_at
+'''
+
+PROGRESS_UPSERT_SQL = f'''
+    INSERT INTO {PROGRESS_SCHEMA} (query, results_loaded, scrolls, end_reached, updated_at)
+    VALUES (?, ?, ?, ?, ?)
+    ON CONFLICT(query) DO UPDATE SET
+        results_loaded = MAX({PROGRESS_SCHEMA}.results_loaded, excluded.results_loaded),
+        scrolls = MAX({PROGRESS_SCHEMA}.scrolls, excluded.scrolls),
+        end_reached = MAX({PROGRESS_SCHEMA}.end_reached, excluded.end_reached),
+        updated_at = excluded.updated_at
+'''
+
+
+def utc_now():
+    return datetime.now(timezone.utc).strftime('%Y-%m-%d %H:%M:%S')
+
+
+def init_checkpoint_tables(conn):
+    init_db(conn, CARDS_SCHEMA)
+    init_db(conn, PROGRESS_SCHEMA)
+
+
+class QueryCheckpoint:
+    """Progress of one query. `write(lead, card, progress)` queues one parameter tuple (or None) per table."""
+
+    def __init__(self, query, write, done=(), attempts=None, results_loaded=0, scrolls=0, end_reached=False):
+        self.query = query
+        self.write = write
+        self.done = set(done)
+        self.attempts = dict(attempts or {})
+        self.results_loaded = results_loaded
+        self.scrolls = scrolls
+        self.end_reached = end_reached
+
+    def is_done(self, url):
+        return bool(url) and place_key(url) in self.done
+
+    def given_up(self, url):
+        return bool(url) and self.attempts.get(place_key(url), 0) >= MAX_CARD_ATTEMPTS
+
+    def lead_done(self, lead_row, url, attempts=1):
+        """Queues the lead together with its card's done mark."""
+        key = place_key(url) if url else None
+        card = (self.query, key, CARD_DONE, attempts, None, utc_now()) if key else None
+        self.write(lead_row, card, None)
+        if key:
+            self.done.add(key)
+
+    def card_failed(self, url, error, attempts=1):
+        if not url:
+            return
+        key = place_key(url)
+        self.attempts[key] = self.attempts.get(key, 0) + attempts
+        self.write(None, (self.query, key, CARD_FAILED, attempts, error[:500], utc_now()), None)
+
+    def scrolled(self, results_loaded, scrolls, end_reached=False):
+        self.results_loaded = max(self.results_loaded, results_loaded)
+        self.scrolls = max(self.scrolls, scrolls)
+        self.end_reached = self.end_reached or end_reached
+        self.write(None, None, (self.query, results_loaded, scrolls, int(end_reached), utc_now()))
+
+
+def load_checkpoint(db_path, query, write):
+    """Reads the stored progress of `query` (empty for a new query)."""
+    with DBFactory(db_path).connection() as conn:
+        init_checkpoint_tables(conn)
+        done, attempts = set(), {}
+        for key, status, tries in conn.execute(
+                f"SELECT place_key, status, attempts FROM {CARDS_SCHEMA} WHERE query = ?", (query,)):
+            if status == CARD_DONE:
+                done.add(key)
+            else:
+                attempts[key] = tries
+        row = conn.execute(f"SELECT results_loaded, scrolls, end_reached FROM {PROGRESS_SCHEMA} WHERE query = ?",
+                           (query,)).fetchone()
+    checkpoint = QueryCheckpoint(query, write, done, attempts, *(row or (0, 0, 0)))
+    if row:
+        logger.info(f"Resuming '{query}': {len(done)} cards done, {len(attempts)} failing, "
+                    f"feed previously scrolled to {checkpoint.results_loaded} results.")
+    return checkpoint
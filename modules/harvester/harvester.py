@@ -1,183 +1,422 @@
 import asyncio
-import random
-from playwright.async_api import async_playwright
 import sys
 import os
+import time
 
 # Add project root to path
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '../../')))
 
+from common.browser_pool import BrowserPool
+from common.batch_writer import BatchWriter
 from common.db_factory import DBFactory
 from common.db_utils import init_db
+from common.host_scheduler import load_scheduler
 from common.logging_config import setup_logger
+from common.metrics import METRICS
+from common.place_index import load_known_places
+from common.request_policy import load_policy
+from modules.harvester.checkpoint import (
+    CARD_TRIES_PER_RUN, CARD_UPSERT_SQL, PROGRESS_UPSERT_SQL, init_checkpoint_tables, load_checkpoint,
+)
 
 logger = setup_logger('harvester', 'modules/harvester/harvester.log')
 
 DB_PATH = 'modules/harvester/raw_leads.db'
 SCHEMA_NAME = 'lead_harvest'
 
-async def exponential_backoff(attempt):
-    delay = 2 ** attempt
-    logger.info(f"Backoff: Sleeping for {delay} seconds...")
-    await asyncio.sleep(delay)
-
-async def scrape_google_maps(query, max_leads=10):
-    async with async_playwright() as p:
-        browser = await p.chromium.launch(headless=True)
-        context = await browser.new_context(
-            user_agent="Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36"
+REQUEST_POLICY = load_policy('harvester')
+
+USER_AGENT = "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36"
+
+# Every Maps navigation, scroll and details click takes a lease for Google's host.
+SCHEDULER = load_scheduler('harvester')
+MAPS_URL = "https://www.google.com/maps"
+# Google's "unusual traffic" interstitial.
+CAPTCHA_URL_MARKER = "/sorry/"
+
+# Upper bound on feed scrolls per query; the feed loads roughly 10-20 results per scroll.
+MAX_SCROLLS = 30
+# How long to wait for a scroll to load more results, and for a clicked result's details.
+SCROLL_TIMEOUT_MS = 5000
+DETAILS_TIMEOUT_MS = 8000
+
+RESULT_SELECTOR = "a[href*='/maps/place/']"
+FEED_SELECTOR = "div[role='feed']"
+# "You've reached the end of the list."
+END_OF_LIST_SELECTOR = "span.HlvSq"
+DETAILS_HEADING_SELECTOR = "h1.DUwDvf"
+
+FEED_GREW_JS = """([results, endMarker, previous]) =>
+    document.querySelectorAll(results).length > previous || document.querySelector(endMarker) !== null"""
+
+# The details panel is ready once it shows the clicked place: the URL moved on,
+# the heading is no longer the previous place's, and the data-item-id buttons exist.
+DETAILS_READY_JS = """([heading, previousUrl, previousHeading, name]) => {
+    const h = document.querySelector(heading);
+    const text = h ? h.innerText.trim() : '';
+    if (location.href === previousUrl || !text) return false;
+    if (text === previousHeading && text !== name) return false;
+    return document.querySelector('[data-item-id]') !== null;
+}"""
+
+# Reads every result card in the feed with one round-trip. Cards show the
+# name, rating, category and an address snippet, and often the phone and
+# website too, which then saves the click into the details panel.
+EXTRACT_CARDS_JS = """(selector) => Array.from(document.querySelectorAll(selector)).map((link, index) => {
+    const card = link.closest('div.Nv2PK') || link.parentElement || link;
+    const text = (sel) => {
+        const el = card.querySelector(sel);
+        return el ? el.textContent.trim() || null : null;
+    };
+    const label = link.getAttribute('aria-label') || '';
+    const rating = parseFloat((text('span.MW4etd') || '').replace(',', '.'));
+    const info = Array.from(card.querySelectorAll('.W4Efsd .W4Efsd'))
+        .map(el => el.textContent.trim())
+        .find(t => t.includes('·'));
+    const parts = info ? info.split('·').map(s => s.trim()).filter(Boolean) : [];
+    const site = card.querySelector("a[data-value='Website']");
+    return {
+        index: index,
+        name: label.split(' · ')[0] || text('.fontHeadlineSmall'),
+        rating: isNaN(rating) ? null : rating,
+        category: parts.length ? parts[0] : null,
+        address: parts.length > 1 ? parts[parts.length - 1] : null,
+        phone: text('span.UsdlK'),
+        website: site ? site.href : null,
+        google_maps_url: link.href,
+    };
+})"""
+
+class BlockedError(Exception):
+    """Google answered with its captcha page instead of results."""
+
+def _blocked(page, lease):
+    if CAPTCHA_URL_MARKER in page.url:
+        METRICS.inc('harvester_captchas_total')
+        lease.report(captcha=True)
+        return True
+    return False
+
+async def on_maps(page, action):
+    """Runs `action()`, one request's worth of interaction with `page`, under a Maps lease.
+
+    Reports the outcome to SCHEDULER so it can back off, and raises
+    BlockedError if Google switched the page to its captcha.
+    """
+    async with SCHEDULER.lease(MAPS_URL) as lease:
+        try:
+            result = await action()
+        except Exception as e:
+            if "Timeout" in type(e).__name__:
+                METRICS.inc('harvester_timeouts_total')
+            if _blocked(page, lease):
+                raise BlockedError(f"Captcha at {page.url}")
+            raise
+        if _blocked(page, lease):
+            raise BlockedError(f"Captcha at {page.url}")
+        # page.goto returns a Response; clicks and scrolls have no status.
+        lease.report(getattr(result, "status", None))
+        return result
+
+async def extract_cards(page):
+    """Returns one dict per result card currently in the feed (index, name, rating,
+    category, address snippet, phone, website, google_maps_url)."""
+    return await page.evaluate(EXTRACT_CARDS_JS, RESULT_SELECTOR)
+
+async def read_details(page, index, name, previous_heading=None):
+    """Clicks result `index` and reads its details panel.
+
+    Returns (details, heading); pass heading back as `previous_heading` on the
+    next call so a stale panel isn't mistaken for the new one.
+    """
+    result = page.locator(RESULT_SELECTOR).nth(index)
+
+    # Click and wait until the details panel shows this place
+    previous_url = page.url
+    await result.click()
+    try:
+        await page.wait_for_function(
+            DETAILS_READY_JS,
+            arg=[DETAILS_HEADING_SELECTOR, previous_url, previous_heading, name],
+            timeout=DETAILS_TIMEOUT_MS,
         )
+    except Exception:
+        logger.warning(f"Details for '{name}' not ready after {DETAILS_TIMEOUT_MS} ms; reading what is there.")
+
+    try:
+        heading = await page.locator(DETAILS_HEADING_SELECTOR).first.inner_text(timeout=1000)
+    except Exception:
+        heading = None
+
+    # Phone
+    phone = None
+    phone_loc = page.locator("button[data-item-id^='phone:']")
+    if await phone_loc.count() > 0:
+         phone = await phone_loc.get_attribute("aria-label")
+         if phone:
+             phone = phone.replace("Phone: ", "").strip()
+
+    # Website
+    website = None
+    website_loc = page.locator("a[data-item-id='authority']")
+    if await website_loc.count() > 0:
+        website = await website_loc.get_attribute("href")
+
+    # Address
+    address = None
+    address_loc = page.locator("button[data-item-id='address']")
+    if await address_loc.count() > 0:
+        address = await address_loc.get_attribute("aria-label")
+        if address:
+            address = address.replace("Address: ", "").strip()
+
+    details = {"name": heading, "phone": phone, "website": website, "address": address, "google_maps_url": page.url}
+    return details, heading
+
+async def scrape_google_maps(query, max_leads=10, pool=None, on_lead=None, bulk=True, known=None, stats=None,
+                             checkpoint=None):
+    """Scrapes up to `max_leads` new results for `query` and returns them.
+
+    With `bulk` (the default) every card is read in one in-page pass and only
+    leads missing a phone or website are clicked through to the details
+    panel. Otherwise every result is clicked.
+
+    Cards whose place URL is in `known` (a KnownPlaces) are skipped before
+    any click; new leads are added to it. If `stats` is a dict it receives
+    the cards, skipped, resumed, failed and clicks counts. If the query
+    itself fails, [] is returned and `stats` gets the error text under
+    'error', so callers can tell a failed query from one with no results.
+    A query cut short by a captcha returns the leads read so far and also
+    sets 'error', so it is retried (resuming from its checkpoint).
+
+    If `on_lead` is given it is awaited with each lead as soon as it is
+    extracted, so downstream stages don't have to wait for the whole query.
+
+    With a QueryCheckpoint each lead is queued for saving as soon as it is
+    extracted, the feed is scrolled back to where an earlier run stopped,
+    cards done before count towards `max_leads` without a click, and a card
+    that fails is retried on its own (CARD_TRIES_PER_RUN times) rather than
+    failing the query.
+    """
+    if pool is None:
+        async with BrowserPool() as own_pool:
+            return await scrape_google_maps(query, max_leads, own_pool, on_lead, bulk, known, stats, checkpoint)
+
+    query_started = time.perf_counter()
+    async with pool.lease(user_agent=USER_AGENT) as context:
         page = await context.new_page()
+        route_stats = await REQUEST_POLICY.install(page)
 
         try:
             logger.info(f"Navigating to Google Maps for query: {query}")
-            await page.goto("https://www.google.com/maps", timeout=60000)
-
-            # Wait for search box
-            await page.wait_for_selector("input#searchboxinput", timeout=10000)
-            await page.fill("input#searchboxinput", query)
-            await page.press("input#searchboxinput", "Enter")
-
-            logger.info("Search submitted. Waiting for results...")
+            with METRICS.timer('harvester_phase_seconds', phase='navigate'):
+                await on_maps(page, lambda: page.goto(MAPS_URL, timeout=60000))
 
-            # Wait for the feed
-            try:
-                await page.wait_for_selector("div[role='feed']", timeout=15000)
-            except:
-                logger.warning("Feed selector not found directly, trying to find result links.")
+                # Wait for search box
+                await page.wait_for_selector("input#searchboxinput", timeout=10000)
+                await page.fill("input#searchboxinput", query)
 
-            # Scroll the feed
-            feed = page.locator("div[role='feed']")
-            if await feed.count() > 0:
-                for _ in range(3):
-                    await feed.evaluate("node => node.scrollTop = node.scrollHeight")
-                    await asyncio.sleep(2)
-
-            # Get result elements
-            results = page.locator("a[href*='/maps/place/']")
-            count = await results.count()
-            logger.info(f"Found {count} potential results initially.")
-
-            leads = []
+            async def search():
+                await page.press("input#searchboxinput", "Enter")
+                logger.info("Search submitted. Waiting for results...")
 
-            for i in range(min(count, max_leads)):
+                # Wait for the feed
                 try:
-                    # Re-query results
-                    results = page.locator("a[href*='/maps/place/']")
-                    if i >= await results.count():
+                    await page.wait_for_selector("div[role='feed']", timeout=15000)
+                except:
+                    logger.warning("Feed selector not found directly, trying to find result links.")
+            with METRICS.timer('harvester_phase_seconds', phase='search'):
+                await on_maps(page, search)
+
+            # Scroll the feed until it holds max_leads results (or as many as an
+            # earlier run had loaded), hits the end marker or stops growing
+            target = max(max_leads, checkpoint.results_loaded) if checkpoint is not None else max_leads
+            results = page.locator(RESULT_SELECTOR)
+            feed = page.locator(FEED_SELECTOR)
+            if await feed.count() > 0:
+                count = await results.count()
+                for scrolls in range(MAX_SCROLLS):
+                    end_reached = await page.locator(END_OF_LIST_SELECTOR).count() > 0
+                    if checkpoint is not None:
+                        checkpoint.scrolled(count, scrolls, end_reached)
+                    if count >= target or end_reached:
+                        break
+                    async def scroll():
+                        await feed.evaluate("node => node.scrollTop = node.scrollHeight")
+                        await page.wait_for_function(FEED_GREW_JS, arg=[RESULT_SELECTOR, END_OF_LIST_SELECTOR, count],
+                                                     timeout=SCROLL_TIMEOUT_MS)
+                    try:
+                        with METRICS.timer('harvester_phase_seconds', phase='scroll'):
+                            await on_maps(page, scroll)
+                    except BlockedError:
+                        raise
+                    except Exception:
+                        logger.info(f"Feed stopped growing at {count} results.")
                         break
+                    count = await results.count()
 
-                    result = results.nth(i)
+            # Read the result cards
+            with METRICS.timer('harvester_phase_seconds', phase='extract_cards'):
+                if bulk:
+                    cards = await extract_cards(page)
+                else:
+                    cards = [{"index": i} for i in range(await results.count())]
+            logger.info(f"Found {len(cards)} potential results initially.")
+            METRICS.inc('harvester_cards_total', len(cards))
 
+            leads = []
+            counts = {"clicks": 0, "skipped": 0, "resumed": 0}
+            previous_heading = None
+
+            async def read_card(card):
+                """Builds the card's lead, clicking through to details if needed. None if it was harvested before."""
+                nonlocal previous_heading
+                lead = {
+                    "name": card.get("name") or "Unknown",
+                    "phone": card.get("phone"),
+                    "website": card.get("website"),
+                    "address": card.get("address"),
+                    "google_maps_url": card.get("google_maps_url"),
+                    "rating": card.get("rating"),
+                    "category": card.get("category"),
+                }
+
+                if not bulk:
                     # Extract Name from list item first (safer)
+                    result = results.nth(card["index"])
+                    lead["google_maps_url"] = card["google_maps_url"] = await result.get_attribute("href")
                     aria_label = await result.get_attribute("aria-label")
-                    name = aria_label.split(" · ")[0] if aria_label else "Unknown"
-                    # If aria-label is missing or weird, try inner_text of the first child div which often has the title
-                    if name == "Unknown" or not name:
-                         # Try fallback
-                         try:
-                             name = await result.locator(".fontHeadlineSmall").first.inner_text()
-                         except:
-                             pass
-
-                    # Click
-                    await result.click()
-
-                    # Wait for URL change
-                    try:
-                        await page.wait_for_url("**/maps/place/**", timeout=5000)
-                    except:
-                        logger.warning("URL didn't change, might be already there or failed.")
-
-                    # Wait for details to settle (generic wait)
-                    await asyncio.sleep(2)
-
-                    # Try to refine name from details if possible, but don't crash
+                    lead["name"] = aria_label.split(" · ")[0] if aria_label else "Unknown"
+                    if lead["name"] == "Unknown" or not lead["name"]:
+                        try:
+                            lead["name"] = await result.locator(".fontHeadlineSmall").first.inner_text()
+                        except:
+                            lead["name"] = "Unknown"
+
+                if checkpoint is not None and checkpoint.is_done(lead["google_maps_url"]):
+                    counts["resumed"] += 1
+                    return None
+                if known is not None and lead["google_maps_url"] in known:
+                    counts["skipped"] += 1
+                    return None
+
+                if not (lead["phone"] and lead["website"]):
+                    with METRICS.timer('harvester_phase_seconds', phase='details'):
+                        details, previous_heading = await on_maps(
+                            page, lambda: read_details(page, card["index"], lead["name"], previous_heading))
+                    counts["clicks"] += 1
+                    if lead["name"] == "Unknown" and details["name"]:
+                        lead["name"] = details["name"]
+                    # The panel has the full address; the card only a snippet.
+                    for field in ("phone", "website", "address"):
+                        lead[field] = details[field] or lead[field]
+                    lead["google_maps_url"] = lead["google_maps_url"] or details["google_maps_url"]
+                return lead
+
+            # A failed card is retried on its own after the others, while the feed is still loaded.
+            pending = [card for card in cards
+                       if checkpoint is None or not checkpoint.given_up(card.get("google_maps_url"))]
+            failures = {}
+            blocked = None
+            for attempt in range(1, CARD_TRIES_PER_RUN + 1):
+                retry = []
+                for card in pending:
+                    if len(leads) + counts["resumed"] >= max_leads:
+                        break
                     try:
-                         # Try finding the specific H1 again, but don't fail if not found
-                         # We skip strict checks here and just try to find something plausible if we have "Unknown"
-                         if name == "Unknown":
-                             details_name = await page.locator("h1.DUwDvf").first.inner_text(timeout=1000)
-                             if details_name:
-                                 name = details_name
-                    except:
-                        pass
-
-                    # Phone
-                    phone = None
-                    phone_loc = page.locator("button[data-item-id^='phone:']")
-                    if await phone_loc.count() > 0:
-                         phone = await phone_loc.get_attribute("aria-label")
-                         if phone:
-                             phone = phone.replace("Phone: ", "").strip()
-
-                    # Website
-                    website = None
-                    website_loc = page.locator("a[data-item-id='authority']")
-                    if await website_loc.count() > 0:
-                        website = await website_loc.get_attribute("href")
-
-                    # Address
-                    address = None
-                    address_loc = page.locator("button[data-item-id='address']")
-                    if await address_loc.count() > 0:
-                        address = await address_loc.get_attribute("aria-label")
-                        if address:
-                            address = address.replace("Address: ", "").strip()
-
-                    # Google Maps URL
-                    google_maps_url = page.url
-
-                    lead = {
-                        "name": name,
-                        "phone": phone,
-                        "website": website,
-                        "address": address,
-                        "google_maps_url": google_maps_url
-                    }
-
-                    logger.info(f"Extracted: {name}")
-                    leads.append(lead)
-
-                    # Random delay
-                    await asyncio.sleep(random.uniform(1, 2))
-
-                except Exception as e:
-                    logger.error(f"Error extracting lead {i}: {e}")
-                    continue
-
+                        started = time.monotonic()
+                        lead = await read_card(card)
+                        if lead is None:
+                            continue
+                        logger.info(f"Extracted: {lead['name']} ({time.monotonic() - started:.2f}s)", extra={"sample": "extracted"})
+                        METRICS.observe('harvester_lead_seconds', time.monotonic() - started)
+                        METRICS.inc('harvester_leads_total')
+                        leads.append(lead)
+                        failures.pop(card["index"], None)
+                        if checkpoint is not None:
+                            # Queued on the checkpoint's BatchWriter; its db_batch_seconds covers the write time.
+                            checkpoint.lead_done(lead_params(lead), lead["google_maps_url"], attempt)
+                            METRICS.inc('harvester_leads_saved_total')
+                        if known is not None:
+                            known.add(lead["google_maps_url"])
+                        if on_lead is not None:
+                            await on_lead(lead)
+
+                    except BlockedError as e:
+                        # Keep what was read; the scheduler has already slowed Maps down for the retry.
+                        logger.warning(f"Stopping '{query}' after {len(leads)} leads: {e}")
+                        blocked = str(e)
+                        break
+                    except Exception as e:
+                        logger.error(f"Error extracting lead {card.get('index')} (try {attempt}): {e}")
+                        failures[card["index"]] = (card, str(e), attempt)
+                        METRICS.inc('harvester_card_errors_total')
+                        retry.append(card)
+                if blocked or not retry:
+                    break
+                pending = retry
+
+            if checkpoint is not None:
+                for card, error, tries in failures.values():
+                    checkpoint.card_failed(card.get("google_maps_url"), error, tries)
+
+            logger.info(f"Query '{query}': {len(leads)} leads, {counts['skipped']} already harvested and skipped, "
+                        f"{counts['resumed']} done in an earlier run, {len(failures)} failed, "
+                        f"{counts['clicks']} clicked through to details.")
+            METRICS.inc('harvester_clicks_total', counts["clicks"])
+            METRICS.inc('harvester_cards_skipped_total', counts["skipped"], reason='known')
+            METRICS.inc('harvester_cards_skipped_total', counts["resumed"], reason='resumed')
+            METRICS.inc('harvester_cards_failed_total', len(failures))
+            METRICS.observe('harvester_query_seconds', time.perf_counter() - query_started)
+            if stats is not None:
+                stats.update(cards=len(cards), failed=len(failures), **counts)
+                if blocked:
+                    stats['error'] = blocked
+            logger.info(f"Requests for '{query}': {route_stats.summary()}; scheduler: {SCHEDULER.summary()}")
             return leads
 
         except Exception as e:
             logger.error(f"Scraping failed: {e}")
+            METRICS.inc('harvester_queries_failed_total')
+            if stats is not None:
+                stats['error'] = str(e)
             return []
-        finally:
-            await browser.close()
 
-def save_leads(leads):
-    db_factory = DBFactory(DB_PATH)
-    conn = db_factory.get_connection()
+INSERT_LEAD_SQL = f'''
+    INSERT OR IGNORE INTO {SCHEMA_NAME} (name, phone, website, address, google_maps_url, rating, category)
+    VALUES (?, ?, ?, ?, ?, ?, ?)
+'''
 
-    try:
+# Lead, card checkpoint and scroll checkpoint, in the order each batch commits them.
+HARVEST_STATEMENTS = [INSERT_LEAD_SQL, CARD_UPSERT_SQL, PROGRESS_UPSERT_SQL]
+
+def init_harvest_db(conn):
+    init_db(conn, SCHEMA_NAME)
+    init_checkpoint_tables(conn)
+
+def open_lead_writer():
+    """Starts a background writer that batches lead inserts and query checkpoints into raw_leads.db."""
+    writer = BatchWriter(DB_PATH, HARVEST_STATEMENTS, setup=init_harvest_db, name='harvester')
+    writer.start()
+    return writer
+
+def lead_params(lead):
+    return (lead['name'], lead['phone'], lead['website'], lead['address'], lead['google_maps_url'],
+            lead.get('rating'), lead.get('category'))
+
+def store_lead(lead):
+    """Writes one lead right away and returns its row id (the existing id if already harvested).
+
+    Uses this thread's cached connection; call it from a single dedicated thread.
+    """
+    started = time.perf_counter()
+    with DBFactory(DB_PATH).connection() as conn:
         init_db(conn, SCHEMA_NAME)
-        cursor = conn.cursor()
-
-        for lead in leads:
-            try:
-                cursor.execute(f'''
-                    INSERT OR IGNORE INTO {SCHEMA_NAME} (name, phone, website, address, google_maps_url)
-                    VALUES (?, ?, ?, ?, ?)
-                ''', (lead['name'], lead['phone'], lead['website'], lead['address'], lead['google_maps_url']))
-            except sqlite3.Error as e:
-                logger.error(f"Failed to insert lead {lead.get('name')}: {e}")
-
-        conn.commit()
-        logger.info(f"Saved {len(leads)} leads to database.")
-
-    except Exception as e:
-        logger.error(f"Database operation failed: {e}")
-    finally:
-        conn.close()
+        conn.execute(INSERT_LEAD_SQL, lead_params(lead))
+        row = conn.execute(f"SELECT id FROM {SCHEMA_NAME} WHERE google_maps_url = ?", (lead['google_maps_url'],)).fetchone()
+    METRICS.inc('harvester_leads_saved_total')
+    METRICS.observe('harvester_save_seconds', time.perf_counter() - started)
+    return row[0] if row else None
 
 async def main():
     if len(sys.argv) > 1:
@@ -187,14 +426,28 @@ async def main():
 
     logger.info(f"Starting harvest for: {query}")
 
-    for attempt in range(3):
-        leads = await scrape_google_maps(query)
-        if leads:
-            save_leads(leads)
-            break
-        else:
-            logger.warning("No leads found or scraping failed. Retrying...")
-            await exponential_backoff(attempt)
+    writer = open_lead_writer()
+    known = load_known_places(DB_PATH, SCHEMA_NAME)
+    # Leads are saved as they are extracted; a rerun of the same query picks up where this one stops.
+    checkpoint = load_checkpoint(DB_PATH, query, writer.write)
+
+    # One warm browser serves every retry instead of a cold launch per attempt.
+    try:
+        async with BrowserPool() as pool:
+            for _ in range(3):
+                stats = {}
+                leads = await scrape_google_maps(query, pool=pool, known=known, stats=stats, checkpoint=checkpoint)
+                if not stats.get('error') and (leads or stats.get('skipped') or stats.get('resumed')):
+                    logger.info(f"Saved {len(leads)} leads; skipped {stats['skipped']} places already in {DB_PATH}.")
+                    break
+                else:
+                    # Only a query that produced nothing at all is retried, resuming from the checkpoint.
+                    # No fixed backoff: the retry waits on SCHEDULER, which only slows down if Google pushed back.
+                    logger.warning("No leads found or scraping failed. Retrying...")
+    finally:
+        # Final flush happens off the event loop.
+        await asyncio.to_thread(writer.close)
+        METRICS.report()
 
 if __name__ == "__main__":
     asyncio.run(main())
@@ -0,0 +1,70 @@
+import os
+import sqlite3
+import sys
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '../')))
+
+from common.db_utils import init_db
+from modules.aggregator import aggregator
+
+LEADS = [
+    ("Joe's Pizza", '(555) 010-2000', 'https://joespizza.com', '1 Main St', 'https://maps.example/joe-1'),
+    ("Joe's Pizza Downtown", '555-010-2000', 'https://www.joespizza.com/menu', '1 Main St', 'https://maps.example/joe-2'),
+    ('Blue Door Cafe', '555-010-3000', 'https://bluedoor.cafe', '9 Elm St', 'https://maps.example/blue'),
+]
+
+
+def _seed(tmp_path, monkeypatch):
+    raw_path = str(tmp_path / 'raw_leads.db')
+    enriched_path = str(tmp_path / 'enriched_data.db')
+    with sqlite3.connect(raw_path) as conn:
+        init_db(conn, 'lead_harvest')
+        conn.executemany(
+            "INSERT INTO lead_harvest (name, phone, website, address, google_maps_url) VALUES (?, ?, ?, ?, ?)", LEADS)
+    with sqlite3.connect(enriched_path) as conn:
+        init_db(conn, 'enrichment')
+        conn.execute("INSERT INTO enrichment (lead_id, email) VALUES (2, 'hello@joespizza.com')")
+    monkeypatch.setattr(aggregator, 'RAW_DB_PATH', raw_path)
+    monkeypatch.setattr(aggregator, 'ENRICHED_DB_PATH', enriched_path)
+    monkeypatch.setattr(aggregator, 'MASTER_DB_PATH', str(tmp_path / 'master_leads.db'))
+
+
+def _master(tmp_path):
+    with sqlite3.connect(str(tmp_path / 'master_leads.db')) as conn:
+        return conn.execute("SELECT id, business_name, email FROM master_leads ORDER BY id").fetchall()
+
+
+def test_merged_duplicates_are_not_reinserted(tmp_path, monkeypatch):
+    _seed(tmp_path, monkeypatch)
+
+    added, _, removed = aggregator.aggregate_data()
+    assert (added, removed) == (3, 1)
+    first = _master(tmp_path)
+    assert len(first) == 2
+    assert ("Joe's Pizza Downtown", 'hello@joespizza.com') in [(name, email) for _, name, email in first]
+
+    assert aggregator.aggregate_data() == (0, 0, 0)
+    assert _master(tmp_path) == first
+
+
+def test_later_enrichment_of_merged_name_reaches_survivor(tmp_path, monkeypatch):
+    _seed(tmp_path, monkeypatch)
+    with sqlite3.connect(aggregator.ENRICHED_DB_PATH) as conn:
+        conn.execute("DELETE FROM enrichment")
+    aggregator.aggregate_data()
+    with sqlite3.connect(aggregator.MASTER_DB_PATH) as conn:
+        (alias, survivor_id), = conn.execute("SELECT business_name, master_id FROM master_aliases").fetchall()
+    with sqlite3.connect(aggregator.RAW_DB_PATH) as conn:
+        lead_id = conn.execute("SELECT id FROM lead_harvest WHERE name = ?", (alias,)).fetchone()[0]
+    with sqlite3.connect(aggregator.ENRICHED_DB_PATH) as conn:
+        conn.execute("INSERT INTO enrichment (lead_id, email) VALUES (?, 'late@joespizza.com')", (lead_id,))
+
+    assert aggregator.aggregate_data() == (0, 1, 0)
+    with sqlite3.connect(aggregator.MASTER_DB_PATH) as conn:
+        assert conn.execute("SELECT email FROM master_leads WHERE id = ?", (survivor_id,)).fetchone() == ('late@joespizza.com',)
+
+        # The streaming upsert resolves the alias the same way.
+        conn.execute("UPDATE master_leads SET email = NULL WHERE id = ?", (survivor_id,))
+        conn.execute(aggregator.UPSERT_MASTER_SQL, (alias, None, None, 'stream@joespizza.com', None, None, None, None, None))
+        assert conn.execute("SELECT COUNT(*) FROM master_leads").fetchone() == (2,)
+        assert conn.execute("SELECT email FROM master_leads WHERE id = ?", (survivor_id,)).fetchone() == ('stream@joespizza.com',)
@@ -0,0 +1,42 @@
+import os
+import sqlite3
+import sys
+
+import pytest
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '../')))
+
+from common.batch_writer import BatchWriter
+
+STATEMENTS = ["INSERT INTO t (id, v) VALUES (?, ?)", "UPDATE t SET v = v || '!' WHERE id = ?"]
+
+
+def _setup(conn):
+    conn.execute("CREATE TABLE IF NOT EXISTS t (id INTEGER PRIMARY KEY, v TEXT)")
+
+
+def test_rows_commit_in_statement_order_and_none_skips(tmp_path):
+    path = str(tmp_path / 'w.db')
+    with BatchWriter(path, STATEMENTS, setup=_setup, name='test') as writer:
+        writer.write((1, 'a'), (1,))
+        writer.write((2, 'b'), None)
+        writer.write((1, 'dup'), None)  # constraint failure: only this row is dropped
+        writer.flush()
+        assert sqlite3.connect(path).execute("SELECT id, v FROM t ORDER BY id").fetchall() == [(1, 'a!'), (2, 'b')]
+    assert (writer.rows_written, writer.rows_failed) == (2, 1)
+
+
+def test_flush_raises_when_the_writer_thread_died(tmp_path):
+    writer = BatchWriter(str(tmp_path / 'w.db'), STATEMENTS, setup=_setup, name='test', flush_interval=60)
+
+    def broken(conn, rows):
+        if rows:
+            raise MemoryError("disk full of surprises")
+    writer._write_batch = broken
+    writer.start()
+    writer.write((1, 'a'), None)
+    with pytest.raises(MemoryError):
+        writer.flush()
+    with pytest.raises(MemoryError):
+        writer.flush()
+    writer.close()
@@ -0,0 +1,64 @@
+import asyncio
+import os
+import sys
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '../')))
+
+from modules.enrichment.contact_extractor import (
+    clean_email, extract_candidates, extract_candidates_async, filter_candidates,
+)
+
+
+def test_plain_mailto_and_obfuscated_emails_in_document_order():
+    html = '''
+        <a href="mailto:Sales@Shop.com?subject=Hi">Write us</a>
+        <p>Support: help [at] shop [dot] com, or info&#64;shop.com.</p>
+        <p>Again: sales@shop.com</p>
+        <span>billing%40shop.com</span>
+    '''
+    assert extract_candidates(html).emails == ['sales@shop.com', 'help@shop.com', 'info@shop.com', 'billing@shop.com']
+
+
+def test_assets_placeholders_and_tracking_ids_are_not_emails():
+    html = '''
+        <img src="/img/logo@2x.png"> <img srcset="hero@3x.webp 3x">
+        <p>you@example.com name@domain.com email@mysite.com</p>
+        <script>dsn = "https://0123456789abcdef0123@o1.ingest.sentry.io/1"</script>
+        <p>real@bakery.ca</p>
+    '''
+    assert extract_candidates(html).emails == ['real@bakery.ca']
+
+
+def test_json_escaped_markup_drops_the_escape_prefix():
+    assert extract_candidates(r'{"html": ">info@shop.com</p>"}').emails == ['info@shop.com']
+
+
+def test_social_profiles_skip_share_buttons_and_namespaces():
+    html = '''
+        <a href="https://www.facebook.com/sharer/sharer.php?u=x">Share</a>
+        <a href="https://www.facebook.com/JoesPizza/">Facebook</a>
+        <a href="//instagram.com/p/Cx12/">post</a>
+        <a href="https://instagram.com/joespizza">Instagram</a>
+        <a href="https://www.linkedin.com/company/joes-pizza">LinkedIn</a>
+        <a href="https://fb.com/JoesPizza">fb</a>
+    '''
+    found = extract_candidates(html)
+    assert found.facebook == ['https://www.facebook.com/JoesPizza/', 'https://fb.com/JoesPizza']
+    assert found.instagram == ['https://instagram.com/joespizza']
+    assert found.linkedin == ['https://www.linkedin.com/company/joes-pizza']
+
+
+def test_clean_email():
+    assert clean_email('Info (at) Shop (dot) Co (dot) UK') == 'info@shop.co.uk'
+    assert clean_email('not an email') is None
+    assert clean_email('test@shop.com') is None
+
+
+def test_filter_candidates_matches_extract_candidates():
+    html = '<a href="mailto:a@shop.com">a</a> <a href="https://facebook.com/shop">f</a>'
+    assert filter_candidates(['a%40shop.com'], ['https://facebook.com/shop', 'https://example.org/x']) == extract_candidates(html)
+
+
+def test_offloaded_scan_gives_the_same_result():
+    html = ('<p>filler text</p>' * 200) + '<p>team@shop.com</p>'
+    assert asyncio.run(extract_candidates_async(html, offload_chars=1)) == extract_candidates(html)
@@ -0,0 +1,61 @@
+import os
+import sqlite3
+import sys
+
+import pytest
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '../')))
+
+from common.db_utils import init_db
+
+
+def _tables(conn):
+    return {row[0] for row in conn.execute("SELECT name FROM sqlite_master WHERE type IN ('table', 'index')")}
+
+
+def test_recreated_database_is_initialized_again(tmp_path):
+    path = str(tmp_path / 'master_leads.db')
+    conn = sqlite3.connect(path)
+    init_db(conn, 'master_leads')
+    conn.close()
+    os.remove(path)
+
+    conn = sqlite3.connect(path)
+    init_db(conn, 'master_leads')
+    assert {'master_leads', 'schema_versions'} <= _tables(conn)
+    conn.execute("INSERT INTO master_leads (business_name) VALUES ('Acme')")
+    conn.close()
+
+
+def test_old_table_is_migrated_to_the_registry_version(tmp_path):
+    conn = sqlite3.connect(str(tmp_path / 'enriched_data.db'))
+    # The version 1 layout: no contact_sources, a plain lead_id index, duplicate rows per lead.
+    conn.execute("CREATE TABLE enrichment (id INTEGER PRIMARY KEY AUTOINCREMENT, lead_id INTEGER, email TEXT, "
+                 "facebook TEXT, instagram TEXT, linkedin TEXT)")
+    conn.execute("CREATE INDEX idx_enrichment_lead_id ON enrichment (lead_id)")
+    conn.executemany("INSERT INTO enrichment (lead_id, email) VALUES (?, ?)", [(1, 'old@a.com'), (2, 'b@b.com'), (1, 'new@a.com')])
+    conn.commit()
+
+    init_db(conn, 'enrichment')
+    assert conn.execute("SELECT lead_id, email, contact_sources FROM enrichment ORDER BY lead_id").fetchall() == [
+        (1, 'new@a.com', None), (2, 'b@b.com', None)]
+    assert conn.execute("SELECT version FROM schema_versions WHERE table_name = 'enrichment'").fetchone() == (2,)
+    indexes = _tables(conn)
+    assert 'uq_enrichment_lead_id' in indexes and 'idx_enrichment_lead_id' not in indexes
+    with pytest.raises(sqlite3.IntegrityError):
+        conn.execute("INSERT INTO enrichment (lead_id) VALUES (1)")
+
+
+def test_new_table_starts_at_the_latest_version_without_migrating(tmp_path):
+    conn = sqlite3.connect(str(tmp_path / 'enriched_data.db'))
+    init_db(conn, 'enrichment')
+    conn.execute("INSERT INTO enrichment (lead_id, email) VALUES (1, 'a@a.com')")
+    conn.commit()
+    init_db(conn, 'enrichment')
+    assert conn.execute("SELECT version FROM schema_versions WHERE table_name = 'enrichment'").fetchone() == (2,)
+    assert conn.execute("SELECT COUNT(*) FROM enrichment").fetchone() == (1,)
+
+
+def test_unknown_schema_is_rejected(tmp_path):
+    with pytest.raises(ValueError):
+        init_db(sqlite3.connect(str(tmp_path / 'x.db')), 'no_such_table')
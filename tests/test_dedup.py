@@ -0,0 +1,80 @@
+import os
+import sqlite3
+import sys
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '../')))
+
+from common.db_utils import init_db
+from modules.aggregator.dedup import (
+    DedupRecord, choose_survivor, dedupe_master, features, find_clusters, is_match, name_tokens,
+    normalize_phone_key, registrable_domain,
+)
+
+
+def _feat(name, phone=None, website=None, source_url=None):
+    return features(DedupRecord(0, name, phone, website, source_url, False))
+
+
+def test_name_tokens_ignore_case_accents_punctuation_and_legal_suffixes():
+    assert name_tokens("Café Olé & Co., LLC") == name_tokens("cafe ole and") == frozenset({"cafe", "ole"})
+
+
+def test_phone_key_keeps_the_last_ten_digits():
+    assert normalize_phone_key("+1 (512) 555-0100") == normalize_phone_key("512.555.0100") == "5125550100"
+    assert normalize_phone_key("555-01") is None
+
+
+def test_registrable_domain():
+    assert registrable_domain("https://www.shop.com/contact") == "shop.com"
+    assert registrable_domain("blog.shop.co.uk") == "shop.co.uk"
+    assert registrable_domain("https://www.google.com/url?q=https://shop.com/&sa=U") == "shop.com"
+    # Shared hosts keep the path segment that identifies the business.
+    assert registrable_domain("https://www.facebook.com/JoesPizza/about") == "facebook.com/joespizza"
+    assert registrable_domain("not a url") is None
+
+
+def test_is_match():
+    place = "https://www.google.com/maps/place/X/data=!19sChIJabc123"
+    # Same Maps place, whatever else differs.
+    assert is_match(_feat("Joe's", source_url=place), _feat("Other name", source_url=place))
+    # Same phone and a similar name.
+    assert is_match(_feat("Joe's Pizza", "512-555-0100"), _feat("Joes Pizza Downtown", "(512) 555 0100"))
+    # Same phone, unrelated names, no shared domain: a shared switchboard.
+    assert not is_match(_feat("Joe's Pizza", "512-555-0100"), _feat("Austin Dental", "512-555-0100"))
+    # Chain locations share a domain but have different phones.
+    assert not is_match(_feat("Joe's Pizza North", "512-555-0100", "joespizza.com"),
+                        _feat("Joe's Pizza South", "512-555-0199", "joespizza.com"))
+    # Identical names with conflicting websites are different businesses.
+    assert not is_match(_feat("Main Street Cafe", website="mainstcafe.com"), _feat("Main Street Cafe", website="msc.net"))
+    assert is_match(_feat("Main Street Cafe", website="mainstcafe.com"), _feat("Main Street Cafe"))
+
+
+def test_find_clusters_is_transitive_and_skips_oversized_blocks():
+    records = [
+        DedupRecord(1, "Joe's Pizza", "512-555-0100", None, None, False),
+        DedupRecord(2, "Joes Pizza", "512-555-0100", "joespizza.com", None, False),
+        DedupRecord(3, "Joe's Pizza Austin", None, "https://www.joespizza.com/", None, True),
+        DedupRecord(4, "Austin Dental", "512-555-0200", None, None, False),
+    ]
+    assert find_clusters(records) == [[1, 2, 3]]
+    assert find_clusters(records, max_block_size=1) == []
+    assert choose_survivor([r for r in records if r.id in (1, 2, 3)]).id == 3
+
+
+def test_dedupe_master_fills_the_survivor_and_records_aliases(tmp_path):
+    conn = sqlite3.connect(str(tmp_path / 'master_leads.db'))
+    init_db(conn, 'master_leads')
+    init_db(conn, 'master_aliases')
+    conn.executemany("INSERT INTO master_leads (business_name, phone_number, website, email, address) VALUES (?, ?, ?, ?, ?)", [
+        ("Joe's Pizza", "5125550100", "joespizza.com", None, "1 Main St"),
+        ("Joes Pizza LLC", "5125550100", None, "hi@joespizza.com", None),
+        ("Austin Dental", "5125550200", None, None, None),
+    ])
+
+    assert dedupe_master(conn) == 1
+    assert conn.execute("SELECT business_name, website, email, address FROM master_leads ORDER BY id").fetchall() == [
+        ("Joes Pizza LLC", "joespizza.com", "hi@joespizza.com", "1 Main St"),
+        ("Austin Dental", None, None, None),
+    ]
+    assert conn.execute("SELECT business_name, master_id FROM master_aliases").fetchall() == [("Joe's Pizza", 2)]
+    assert dedupe_master(conn) == 0
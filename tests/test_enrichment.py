@@ -0,0 +1,144 @@
+import asyncio
+import os
+import socket
+import sqlite3
+import sys
+
+from aiohttp import web
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '../')))
+
+from common.batch_writer import BatchWriter
+from common.db_utils import init_db
+from modules.enrichment import enrichment
+from modules.enrichment.freshness import (
+    OUTCOME_EMPTY, OUTCOME_FAILED, OUTCOME_FOUND, STATUS_UPSERT_SQL, Watermark, init_freshness_tables, outcome_for,
+    select_pending_leads, start_run,
+)
+from modules.enrichment.http_fetcher import create_http_session
+
+PAGES = {
+    '/quiet': '<html><body><h1>Quiet Co</h1><p>We make things. No contact details here.</p></body></html>',
+    '/loud': '<html><body><h1>Loud Co</h1><p>Write to hello@loud.example any time.</p></body></html>',
+}
+
+
+def _closed_port():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def _outcomes(paths):
+    async def page(request):
+        return web.Response(text=PAGES[request.path], content_type='text/html')
+
+    async def run():
+        app = web.Application()
+        for path in PAGES:
+            app.router.add_get(path, page)
+        runner = web.AppRunner(app)
+        await runner.setup()
+        site = web.TCPSite(runner, '127.0.0.1', 0)
+        await site.start()
+        base = f"http://127.0.0.1:{site._server.sockets[0].getsockname()[1]}"
+        try:
+            async with create_http_session(1, 'test') as session:
+                results = {}
+                for path in paths:
+                    url = f"http://127.0.0.1:{_closed_port()}/" if path is None else base + path
+                    contacts = await enrichment.extract_contacts(None, url, session)
+                    results[path] = outcome_for(contacts, enrichment.TIER_FAILED, enrichment.CONTACT_FIELDS)
+                return results
+        finally:
+            await runner.cleanup()
+
+    return asyncio.run(run())
+
+
+def test_http_only_outcomes():
+    assert _outcomes(['/quiet', '/loud', None]) == {
+        '/quiet': OUTCOME_EMPTY,
+        '/loud': OUTCOME_FOUND,
+        None: OUTCOME_FAILED,
+    }
+
+
+def test_full_run_does_not_resume(tmp_path):
+    conn = sqlite3.connect(str(tmp_path / 'enriched_data.db'))
+    init_freshness_tables(conn)
+    run_id, cutoff, _ = start_run(conn, ttl_days=30)
+    conn.execute("UPDATE enrichment_runs SET watermark_lead_id = 50 WHERE id = ?", (run_id,))
+    conn.commit()
+
+    assert start_run(conn, ttl_days=30) == (run_id, cutoff, 50)
+
+    full_id, stale_before, watermark = start_run(conn, ttl_days=None)
+    assert full_id != run_id
+    assert (stale_before, watermark) == (None, 0)
+    assert conn.execute("SELECT finished_at IS NOT NULL FROM enrichment_runs WHERE id = ?", (run_id,)).fetchone()[0]
+
+
+def test_failed_recrawl_keeps_stored_contacts(tmp_path):
+    path = str(tmp_path / 'enriched_data.db')
+
+    def setup(conn):
+        init_db(conn, enrichment.ENRICHED_SCHEMA)
+        init_freshness_tables(conn)
+
+    found = enrichment.empty_contacts()
+    found.update(tier=enrichment.TIER_HTTP, email='a@shop.com')
+    timed_out = enrichment.empty_contacts()
+    timed_out['tier'] = enrichment.TIER_FAILED
+    never_reached = enrichment.empty_contacts()
+    never_reached['tier'] = enrichment.TIER_DEAD
+
+    writer = BatchWriter(path, enrichment.SAVE_STATEMENTS, setup=setup, name='test')
+    writer.start()
+    enrichment.save_contacts(writer, 1, 'https://shop.com', found)
+    enrichment.save_contacts(writer, 1, 'https://shop.com', timed_out)
+    enrichment.save_contacts(writer, 2, 'https://gone.com', never_reached)
+    writer.close()
+
+    conn = sqlite3.connect(path)
+    assert conn.execute("SELECT lead_id, email FROM enrichment ORDER BY lead_id").fetchall() == [(1, 'a@shop.com'), (2, None)]
+    assert conn.execute("SELECT outcome, attempts FROM enrichment_status WHERE lead_id = 1").fetchone() == (OUTCOME_FAILED, 2)
+
+
+def test_watermark_advances_only_over_settled_prefix():
+    watermark = Watermark(10)
+    for lead_id in (11, 12, 15, 20):
+        watermark.dispatched(lead_id)
+    assert watermark.completed(15) == 10
+    assert watermark.completed(11) == 11
+    assert watermark.completed(20) == 11
+    assert watermark.completed(12) == 20
+
+
+def test_select_pending_leads_skips_fresh_and_settled_leads(tmp_path):
+    raw_path = str(tmp_path / 'raw_leads.db')
+    with sqlite3.connect(raw_path) as raw:
+        init_db(raw, 'lead_harvest')
+        raw.executemany("INSERT INTO lead_harvest (id, name, website) VALUES (?, ?, ?)", [
+            (1, 'Fresh', 'https://fresh.com'),
+            (2, 'Failed', 'https://failed.com'),
+            (3, 'Stale', 'https://stale.com'),
+            (4, 'Moved', 'https://moved.com/new'),
+            (5, 'New', 'https://new.com'),
+            (6, 'No site', None),
+        ])
+    raw.close()
+    conn = sqlite3.connect(str(tmp_path / 'enriched_data.db'))
+    init_freshness_tables(conn)
+    conn.executemany(STATUS_UPSERT_SQL, [
+        (1, 'https://fresh.com', OUTCOME_FOUND, 1, '2026-10-01 00:00:00'),
+        (2, 'https://failed.com', OUTCOME_FAILED, 0, '2026-10-01 00:00:00'),
+        (3, 'https://stale.com', OUTCOME_EMPTY, 1, '2026-01-01 00:00:00'),
+        (4, 'https://moved.com/old', OUTCOME_FOUND, 1, '2026-10-01 00:00:00'),
+    ])
+    conn.commit()
+
+    pending = select_pending_leads(conn, raw_path, 'lead_harvest', stale_before='2026-06-01 00:00:00')
+    assert [lead_id for lead_id, _ in pending] == [2, 3, 4, 5]
+    assert [lead_id for lead_id, _ in select_pending_leads(conn, raw_path, 'lead_harvest', '2026-06-01 00:00:00', watermark=3)] == [4, 5]
+    assert [lead_id for lead_id, _ in select_pending_leads(conn, raw_path, 'lead_harvest')] == [1, 2, 3, 4, 5]
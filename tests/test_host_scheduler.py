@@ -0,0 +1,65 @@
+import asyncio
+import os
+import sys
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '../')))
+
+from common.host_scheduler import BASE_COOLDOWN_S, HostBucket, HostScheduler, host_of, retry_after_seconds
+
+
+def test_host_of_and_retry_after():
+    assert host_of("https://WWW.Shop.com:8443/contact") == host_of("shop.com") == "shop.com"
+    assert retry_after_seconds("12") == 12.0
+    assert retry_after_seconds("Wed, 21 Oct 2015 07:28:00 GMT") is None
+
+
+def test_bucket_spends_the_burst_then_queues_reservations():
+    bucket = HostBucket(rate=2.0, burst=2, min_rate=0.1)
+    now = bucket.updated
+    assert [bucket.reserve(now) for _ in range(4)] == [0.0, 0.0, 0.5, 1.0]
+    # Refilled tokens first pay off the queued reservations.
+    assert bucket.reserve(now + 1.0) == 0.5
+    assert not bucket.idle(now + 1.0)
+    assert bucket.idle(now + 2.5)
+
+
+def test_throttling_halves_the_rate_and_pushes_back_later_reservations():
+    bucket = HostBucket(rate=2.0, burst=2, min_rate=0.5)
+    now = bucket.updated
+    assert bucket.throttled(now) == BASE_COOLDOWN_S
+    assert bucket.rate == 1.0
+    assert bucket.reserve(now) == BASE_COOLDOWN_S + 1.0
+    # Retry-After wins over the growing cooldown; the rate never drops below min_rate.
+    assert bucket.throttled(now, retry_after=7) == 7
+    assert bucket.throttled(now) == BASE_COOLDOWN_S * 4
+    assert bucket.rate == 0.5
+
+    bucket.succeeded()
+    assert (bucket.strikes, bucket.rate) == (0, 0.7)
+    for _ in range(20):
+        bucket.succeeded()
+    assert bucket.rate == bucket.base_rate
+
+
+def test_scheduler_report_only_slows_the_throttling_host():
+    scheduler = HostScheduler(rate=10.0, burst=5, name='test')
+    scheduler.report("https://slow.com/a", status=429, retry_after=3)
+    scheduler.report("https://fast.com/a", status=404)
+    scheduler.report("https://fast.com/b")
+    assert scheduler._bucket("slow.com").rate == 5.0
+    assert scheduler._bucket("fast.com").rate == 10.0
+    assert scheduler.stats["throttled"] == 1
+
+
+def test_scheduler_lease_waits_for_the_host_token():
+    scheduler = HostScheduler(rate=20.0, burst=1, name='test')
+
+    async def run():
+        for url in ("https://shop.com/a", "https://shop.com/b", "https://other.com/"):
+            async with scheduler.lease(url) as lease:
+                lease.report(200)
+
+    asyncio.run(run())
+    assert scheduler.stats["leases"] == 3
+    # Only the second shop.com request had to wait for a token.
+    assert 0.0 < scheduler.stats["waited_s"] <= 0.05
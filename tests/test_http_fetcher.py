@@ -0,0 +1,37 @@
+import asyncio
+import os
+import sys
+
+from aiohttp import web
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '../')))
+
+from modules.enrichment.http_fetcher import create_http_session, decode_body, fetch_html
+
+
+def test_unknown_charset_falls_back_to_utf8():
+    assert decode_body('café'.encode('utf-8'), 'bogus-enc') == 'café'
+    assert decode_body('café'.encode('latin-1'), 'latin-1') == 'café'
+
+
+def test_fetch_html_with_unknown_charset():
+    async def page(request):
+        return web.Response(body='<p>hi@example.com</p>'.encode('utf-8'),
+                            headers={'Content-Type': 'text/html; charset=bogus-enc'})
+
+    async def run():
+        app = web.Application()
+        app.router.add_get('/', page)
+        runner = web.AppRunner(app)
+        await runner.setup()
+        site = web.TCPSite(runner, '127.0.0.1', 0)
+        await site.start()
+        port = site._server.sockets[0].getsockname()[1]
+        try:
+            async with create_http_session(1, 'test') as session:
+                return await fetch_html(session, f'http://127.0.0.1:{port}/')
+        finally:
+            await runner.cleanup()
+
+    _, html = asyncio.run(run())
+    assert html == '<p>hi@example.com</p>'
@@ -0,0 +1,43 @@
+import json
+import os
+import sys
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '../')))
+
+from common.logging_config import configure_logging, setup_logger, stop_logging
+
+
+def _log_failure(name, path):
+    logger = setup_logger(name, path)
+    try:
+        1 / 0
+    except ZeroDivisionError:
+        logger.exception("Lead %s failed", 7)
+    # Stopping the listener writes out everything still queued.
+    stop_logging()
+    with open(path, encoding='utf-8') as f:
+        return f.read()
+
+
+def test_json_lines_keep_the_traceback(tmp_path):
+    configure_logging(json_lines=True, console=False)
+    try:
+        text = _log_failure('test_json_traceback', str(tmp_path / 'json.log'))
+    finally:
+        configure_logging(json_lines=False, console=True)
+
+    entry = json.loads(text.splitlines()[-1])
+    assert entry["message"] == "Lead 7 failed"
+    assert entry["level"] == "ERROR"
+    assert "ZeroDivisionError" in entry["exception"]
+
+
+def test_text_lines_show_the_traceback_once(tmp_path):
+    configure_logging(console=False)
+    try:
+        text = _log_failure('test_text_traceback', str(tmp_path / 'text.log'))
+    finally:
+        configure_logging(console=True)
+
+    assert "ERROR Lead 7 failed" in text
+    assert text.count("ZeroDivisionError") == 1
@@ -0,0 +1,52 @@
+import os
+import sqlite3
+import sys
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '../')))
+
+from common.db_utils import init_db
+from common.place_index import BloomFilter, KnownPlaces, load_known_places, place_key
+
+
+def test_place_key_ignores_viewport_and_query():
+    with_id = "https://www.google.com/maps/place/Joe's/@30.2,-97.7,17z/data=!4m6!19sChIJAbC123?hl=en"
+    assert place_key(with_id) == place_key("https://www.google.com/maps/place/Other/data=!19sChIJabc123") == "chijabc123"
+    assert place_key("https://www.google.com/maps/place/Joe's/@30.2,-97.7,17z?entry=ttu") == \
+        place_key("https://www.google.com/maps/place/Joe's/@30.3,-97.8,15z") == "/maps/place/joe's"
+    assert place_key(None) is None
+
+
+def test_bloom_filter_has_no_false_negatives_and_few_false_positives():
+    bloom = BloomFilter(2000, error_rate=0.01)
+    for i in range(2000):
+        bloom.add(f"place-{i}")
+    assert all(f"place-{i}" in bloom for i in range(2000))
+    false_positives = sum(f"other-{i}" in bloom for i in range(10000))
+    assert false_positives < 300
+
+
+def test_known_places_switches_to_bloom_past_the_threshold():
+    url = "https://www.google.com/maps/place/X/data=!19sChIJabc123"
+    exact, approximate = KnownPlaces(10, bloom_threshold=100), KnownPlaces(101, bloom_threshold=100)
+    assert exact.exact and not approximate.exact
+    for known in (exact, approximate):
+        known.add(url)
+        known.add(None)
+        assert url in known and len(known) == 1
+        assert "https://www.google.com/maps/place/Y/data=!19sChIJzzz999" not in known
+
+
+def test_load_known_places(tmp_path):
+    path = str(tmp_path / 'raw_leads.db')
+    assert len(load_known_places(path, 'lead_harvest')) == 0
+    with sqlite3.connect(path) as conn:
+        init_db(conn, 'lead_harvest')
+        conn.executemany("INSERT INTO lead_harvest (name, google_maps_url) VALUES (?, ?)", [
+            ("Joe's", "https://www.google.com/maps/place/X/data=!19sChIJabc123"),
+            ("No URL", None),
+        ])
+    conn.close()
+
+    known = load_known_places(path, 'lead_harvest')
+    assert known.exact and len(known) == 1
+    assert "https://www.google.com/maps/place/X/@1,2,3z/data=!19sChIJabc123" in known